@@ -0,0 +1,29 @@
+"""add post_history status/posted_at index
+
+Revision ID: 5b1e2c7d9a40
+Revises: 020ec9663957
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1e2c7d9a40'
+down_revision: Union[str, Sequence[str], None] = '020ec9663957'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 予約投稿スケジューラの期限到来行検索用（status = 'pending' AND posted_at <= now）
+    op.create_index('ix_post_history_status_posted_at', 'post_history', ['status', 'posted_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_post_history_status_posted_at', table_name='post_history')
@@ -0,0 +1,45 @@
+"""add post_history keyset pagination indexes
+
+Revision ID: 8c3f1a6e2b57
+Revises: 5b1e2c7d9a40
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c3f1a6e2b57'
+down_revision: Union[str, Sequence[str], None] = '5b1e2c7d9a40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# ステータス絞り込みが多い posted / failed は部分インデックスにする
+PARTIAL_STATUSES = ('posted', 'failed')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 投稿履歴APIのキーセットページング用（ORDER BY created_at DESC, id DESC）
+    op.create_index('ix_post_history_user_created_id', 'post_history', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_post_history_user_repository_created_id', 'post_history',
+                    ['user_id', 'repository', 'created_at', 'id'], unique=False)
+    op.create_index('ix_post_history_user_language_created_id', 'post_history',
+                    ['user_id', 'language', 'created_at', 'id'], unique=False)
+    for status in PARTIAL_STATUSES:
+        where = sa.text(f"status = '{status}'")
+        op.create_index(f'ix_post_history_user_created_id_{status}', 'post_history',
+                        ['user_id', 'created_at', 'id'], unique=False,
+                        postgresql_where=where, sqlite_where=where)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for status in PARTIAL_STATUSES:
+        op.drop_index(f'ix_post_history_user_created_id_{status}', table_name='post_history')
+    op.drop_index('ix_post_history_user_language_created_id', table_name='post_history')
+    op.drop_index('ix_post_history_user_repository_created_id', table_name='post_history')
+    op.drop_index('ix_post_history_user_created_id', table_name='post_history')
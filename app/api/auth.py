@@ -10,18 +10,16 @@ from sqlalchemy.orm import Session
 from typing import Optional
 import tweepy
 import json
-import redis
 import urllib.parse
 
 from app.config import settings
+from app.services.redis_pool import redis_pools, REDIS_DB_OAUTH
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-# Redisクライアント（OAuth状態管理用）
-# OAuth用Redis接続（本番環境対応）
+# Redisクライアント（OAuth状態管理用・共有プール）
 def get_oauth_redis():
-    redis_url = settings.get_redis_url()
-    return redis.from_url(redis_url, db=1, decode_responses=True)
+    return redis_pools.get_client(REDIS_DB_OAUTH)
 
 oauth_redis = get_oauth_redis()
 OAUTH_STATE_PREFIX = "oauth_state:"
@@ -269,6 +267,28 @@ def twitter_callback(
             oauth_redis.delete(f"{OAUTH_STATE_PREFIX}{req.state}")
         raise HTTPException(status_code=400, detail=f"認証処理エラー: {str(e)}")
 
+def _user_from_session(session_id: Optional[str], session_service, db: Session) -> Optional[User]:
+    """セッションIDに対応するユーザー（未ログイン・無効なセッション・不正な値・ユーザー削除済みならNone）"""
+    import logging
+    logger = logging.getLogger(__name__)
+
+    if not session_id:
+        return None
+    user_id = session_service.get_user_id(session_id)
+    if not user_id:
+        logger.warning(f"無効なセッション: {session_id}")
+        return None
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        logger.warning(f"セッションのuser_idが不正です: {user_id!r}")
+        return None
+
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        logger.warning(f"ユーザーが見つかりません: user_id={user_id}")
+    return user
+
 # Dependsでセッションからユーザー取得
 def get_current_user(
     session_id: str = Cookie(None),
@@ -284,22 +304,21 @@ def get_current_user(
         logger.warning("セッションIDが見つかりません")
         raise HTTPException(status_code=401, detail="未認証")
     
-    user_id = session_service.get_user_id(session_id)
-    logger.info(f"セッションから取得したuser_id: {user_id}")
-    
-    if not user_id:
-        logger.warning(f"無効なセッション: {session_id}")
-        raise HTTPException(status_code=401, detail="セッション無効")
-    
-    # データベースからユーザー情報を取得
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    user = _user_from_session(session_id, session_service, db)
     if not user:
-        logger.warning(f"ユーザーが見つかりません: user_id={user_id}")
-        raise HTTPException(status_code=401, detail="ユーザーが見つかりません")
+        raise HTTPException(status_code=401, detail="セッション無効")
     
     logger.info(f"認証成功: user_id={user.id}, username={user.username}")
     return user
 
+def get_optional_user(
+    session_id: str = Cookie(None),
+    session_service=Depends(get_session_service),
+    db: Session = Depends(get_db)
+) -> Optional[User]:
+    """ログイン中ならユーザー、未ログイン・無効なセッションならNone"""
+    return _user_from_session(session_id, session_service, db)
+
 @router.get("/me")
 def get_me(user: User = Depends(get_current_user)):
     return {
@@ -1,5 +1,102 @@
-from fastapi import APIRouter
+"""
+GitHub Webhook受信エンドポイント
 
+pushイベントのコミットをキャッシュへ直接書き込み、生成・自動投稿時のGitHub API呼び出し（ポーリング）を不要にする。
+署名検証までをリクエスト内で行い、ペイロードの解析とキャッシュ書き込みはレスポンス返却後に実行する。
+GITHUB_WEBHOOK_AUTO_POST が有効なら、登録ユーザーの自動投稿ジョブもキューに追加する。
+"""
+import hashlib
+import hmac
+import json
+import logging
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from app.api.auth import get_current_user
+from app.config import settings
+from app.models import User
+from app.schemas.github import AutoPostSubscriptionRequest
+from app.services.github_service import (
+    store_push_commits, get_auto_post_subscribers,
+    set_auto_post_subscription, remove_auto_post_subscription
+)
+from app.services.job_queue import enqueue_auto_post
+
+logger = logging.getLogger(__name__)
 router = APIRouter()
- 
-# ここにGitHub関連のAPIエンドポイントを追加 
\ No newline at end of file
+
+
+async def _read_and_verify(request: Request) -> bytes:
+    """本文を受信しながらHMAC-SHA256を計算し、署名を定数時間で比較"""
+    secret = settings.GITHUB_WEBHOOK_SECRET
+    if not secret:
+        raise HTTPException(status_code=503, detail="GitHub Webhookシークレットが設定されていません")
+
+    signature = request.headers.get("X-Hub-Signature-256", "")
+    if not signature.startswith("sha256="):
+        raise HTTPException(status_code=401, detail="Webhook署名がありません")
+
+    mac = hmac.new(secret.encode(), digestmod=hashlib.sha256)
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > settings.GITHUB_WEBHOOK_MAX_BODY_BYTES:
+            raise HTTPException(status_code=413, detail="Webhookペイロードが大きすぎます")
+        mac.update(chunk)
+
+    if not hmac.compare_digest(mac.hexdigest(), signature[len("sha256="):]):
+        raise HTTPException(status_code=401, detail="Webhook署名が一致しません")
+    return bytes(body)
+
+
+def process_push_event(body: bytes, delivery_id: str):
+    """pushペイロードを解析してキャッシュへ保存（BackgroundTasksからスレッドプールで実行）"""
+    try:
+        payload = json.loads(body)
+        if store_push_commits(payload) and settings.GITHUB_WEBHOOK_AUTO_POST:
+            _enqueue_subscribed_auto_posts(payload)
+    except Exception as e:
+        logger.error(f"GitHub Webhook処理エラー: delivery={delivery_id}, {e}")
+
+
+def _enqueue_subscribed_auto_posts(payload: dict):
+    """既定ブランチへのpushなら、登録ユーザーごとに自動投稿ジョブを追加"""
+    repository = payload["repository"]
+    if payload.get("ref") != f"refs/heads/{repository.get('default_branch')}":
+        return
+    for user_id, language in get_auto_post_subscribers(repository["full_name"]).items():
+        enqueue_auto_post(user_id, repository["full_name"], language, source="webhook")
+
+
+@router.post("/github/webhook", status_code=202)
+async def github_webhook(request: Request, background_tasks: BackgroundTasks):
+    """GitHub Webhook（push）を受信"""
+    body = await _read_and_verify(request)
+    event = request.headers.get("X-GitHub-Event", "")
+    delivery_id = request.headers.get("X-GitHub-Delivery", "")
+
+    if event == "ping":
+        return JSONResponse(status_code=200, content={"status": "pong"})
+    if event != "push":
+        return {"status": "ignored", "event": event}
+
+    # 解析・書き込みは応答後に実行（大きなpushでも即時に202を返す）
+    background_tasks.add_task(process_push_event, body, delivery_id)
+    return {"status": "accepted", "delivery": delivery_id}
+
+
+@router.put("/github/auto_post_subscriptions")
+def subscribe_auto_post(req: AutoPostSubscriptionRequest, user: User = Depends(get_current_user)):
+    """push Webhook受信時の自動投稿を登録"""
+    set_auto_post_subscription(req.repository, user.id, req.language)
+    return {"status": "subscribed", "repository": req.repository, "language": req.language}
+
+
+@router.delete("/github/auto_post_subscriptions/{owner}/{repo}")
+def unsubscribe_auto_post(owner: str, repo: str, user: User = Depends(get_current_user)):
+    """push Webhook受信時の自動投稿を解除"""
+    repository = f"{owner}/{repo}"
+    if not remove_auto_post_subscription(repository, user.id):
+        raise HTTPException(status_code=404, detail="登録が見つかりません")
+    return {"status": "unsubscribed", "repository": repository}
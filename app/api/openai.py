@@ -1,27 +1,53 @@
-from fastapi import APIRouter, Depends
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from app.api.auth import get_current_user, get_optional_user
+from app.db import get_db
+from app.middleware.rate_limiter import user_limiter
+from app.models import User
 from app.schemas.github import GenerateTweetRequest
-from app.schemas.openai import GenerateTweetResponse
+from app.schemas.openai import GenerateTweetResponse, BatchGenerateTweetsRequest
+from app.utils.tweet_length import fit_to_limit
 
 def get_fetch_latest_commit_message():
     from app.services.github_service import fetch_latest_commit_message
     return fetch_latest_commit_message
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 def get_generate_tweet_with_openai():
     from app.services.openai_service import generate_tweet_with_openai
     return generate_tweet_with_openai
 
+def get_generate_tweet_candidates():
+    from app.services.openai_service import generate_tweet_candidates
+    return generate_tweet_candidates
+
 router = APIRouter()
 
 @router.post("/generate_tweet", response_model=GenerateTweetResponse)
 def generate_tweet(
     req: GenerateTweetRequest,
     fetch_latest_commit_message=Depends(get_fetch_latest_commit_message),
-    generate_tweet_with_openai=Depends(get_generate_tweet_with_openai)
+    generate_tweet_with_openai=Depends(get_generate_tweet_with_openai),
+    generate_tweet_candidates=Depends(get_generate_tweet_candidates),
+    user: Optional[User] = Depends(get_optional_user),
+    db: Session = Depends(get_db)
 ):
     try:
         # 安全にlanguageにアクセス
         language = getattr(req, 'language', 'ja')
-        commit_message = fetch_latest_commit_message(req.repository)
+        if req.fresh:
+            commit_message = fetch_latest_commit_message(req.repository, fresh=True)
+        else:
+            commit_message = fetch_latest_commit_message(req.repository)
+        if req.candidates > 1:
+            return _generate_ranked_candidates(
+                req, commit_message, language, generate_tweet_candidates, user, db
+            )
         tweet_draft = generate_tweet_with_openai(commit_message, req.repository, language)
         response = GenerateTweetResponse(
             tweet_draft=tweet_draft,
@@ -31,4 +57,80 @@ def generate_tweet(
         return response
     except Exception as e:
         import traceback
-        raise 
+        raise
+
+def _generate_ranked_candidates(req, commit_message, language, generate_tweet_candidates, user, db) -> GenerateTweetResponse:
+    """候補を1回のリクエストで生成し、ローカルでスコア順に並べる（ログイン中は最近の投稿との重なりも考慮）"""
+    from app.services.post_history_service import recent_tweet_texts
+    from app.services.tweet_ranking import rank_candidates
+
+    candidates = generate_tweet_candidates(commit_message, req.repository, language, req.candidates)
+    recent_posts = recent_tweet_texts(db, user.id) if user else []
+    ranked = rank_candidates(candidates, recent_posts)
+    return GenerateTweetResponse(
+        tweet_draft=ranked[0]["tweet"],
+        commit_message=commit_message,
+        repository=req.repository,
+        candidates=ranked
+    )
+
+@router.post("/generate_tweets/batch")
+@user_limiter.limit("5/minute")
+async def generate_tweets_batch(
+    request: Request,
+    req: BatchGenerateTweetsRequest,
+    user: User = Depends(get_current_user)
+):
+    """複数コミットのツイート案を並行生成し、完了順にNDJSONで返す（1行1件、indexは入力順）"""
+    from app.services.openai_service import batch_generate_tweets_stream, get_openai_api_key
+
+    get_openai_api_key()  # APIキー未設定はストリーム開始前に500で返す
+    items = [item.model_dump() for item in req.items]
+
+    async def ndjson():
+        async for result in batch_generate_tweets_stream(items, req.language):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@router.get("/generate_tweet/stream")
+@user_limiter.limit("10/minute")
+async def generate_tweet_stream(
+    request: Request,
+    repository: str = Query(..., pattern=r'^[a-zA-Z0-9_.-]+/[a-zA-Z0-9_.-]+$'),
+    language: str = Query('ja', pattern=r'^(ja|en|es|fr|de|it|pt|ru|zh|ko)$'),
+    fresh: bool = False,
+    user: User = Depends(get_current_user)
+):
+    """ツイート案をServer-Sent Eventsで配信（token イベントを逐次送信し、最後に done で全文）
+
+    キャッシュヒット時は done イベント1件だけを即時に返す。
+    """
+    from app.services.github_service import fetch_latest_commit_message_async
+    from app.services.openai_service import generate_tweet_stream_async, get_cached_tweet_async
+
+    commit_message = await fetch_latest_commit_message_async(repository, fresh=fresh)
+    cached_tweet = await get_cached_tweet_async(commit_message, repository, language)
+
+    async def events():
+        if cached_tweet is not None:
+            yield _sse("done", {"tweet": cached_tweet, "commit_message": commit_message, "cached": True})
+            return
+        parts = []
+        try:
+            async for token in generate_tweet_stream_async(commit_message, repository, language):
+                parts.append(token)
+                yield _sse("token", {"text": token})
+        except Exception as e:
+            yield _sse("error", {"detail": str(getattr(e, "detail", e))})
+            return
+        # キャッシュに保存された本文と同じく、文字数上限に収めた全文を返す
+        tweet = fit_to_limit("".join(parts).strip())
+        yield _sse("done", {"tweet": tweet, "commit_message": commit_message, "cached": False})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # プロキシ（nginx等）のバッファリングを無効化して逐次配信
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
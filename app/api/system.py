@@ -3,12 +3,20 @@
 """
 from fastapi import APIRouter, Depends, HTTPException
 from app.utils.error_handler import get_error_statistics
+from app.services.http_clients import http_clients
+from app.services.redis_pool import redis_pools
+from app.services.github_service import get_github_cache_statistics
+from app.services.openai_service import get_openai_cache_statistics, get_openai_usage_statistics
+from app.utils.single_flight import get_single_flight_statistics
+from app.utils.retry import get_retry_statistics
+from app.utils.circuit_breaker import get_circuit_breaker_statistics
+from app.services.local_cache import get_tier_statistics, publish_invalidation
+from app.services.post_history_writer import post_history_writer
 from app.services.oauth_service import OAuthService
 from app.db import get_db
 from app.api.auth import get_current_user
 from app.models import User
 from sqlalchemy.orm import Session
-import redis
 import time
 import psutil
 import logging
@@ -38,14 +46,7 @@ def health_check():
     
     # Redis接続チェック
     try:
-        from app.config import settings
-        # Redis接続（本番環境対応）
-        redis_url = settings.get_redis_url()
-        if settings.REDIS_URL:
-            redis_client = redis.from_url(redis_url)
-        else:
-            redis_client = redis.from_url(settings.get_redis_url())
-        redis_client.ping()
+        redis_pools.get_client().ping()
         health_data["services"]["redis"] = "healthy"
     except Exception as e:
         health_data["services"]["redis"] = f"unhealthy: {str(e)}"
@@ -83,13 +84,7 @@ def get_system_metrics():
         
         # Redis統計
         try:
-            from app.config import settings
-            # Redis接続（本番環境対応）
-            if settings.REDIS_URL:
-                redis_client = redis.from_url(settings.get_redis_url(), decode_responses=True)
-            else:
-                redis_client = redis.from_url(settings.get_redis_url(), decode_responses=True)
-            redis_info = redis_client.info()
+            redis_info = redis_pools.get_client().info()
             metrics["redis"] = {
                 "used_memory_mb": round(redis_info.get("used_memory", 0) / (1024**2), 2),
                 "connected_clients": redis_info.get("connected_clients", 0),
@@ -103,12 +98,62 @@ def get_system_metrics():
         logger.error(f"メトリクス取得エラー: {e}")
         raise HTTPException(status_code=500, detail=f"メトリクス取得失敗: {str(e)}")
 
+@router.get("/http/stats")
+def get_http_pool_statistics():
+    """外部API用HTTPコネクションプールの利用統計を取得"""
+    return {
+        "timestamp": time.time(),
+        **http_clients.get_stats()
+    }
+
+@router.get("/retry/stats")
+def get_retry_stats():
+    """上流APIごとの再試行統計（試行・再試行・結果の回数、再試行予算の残り）を取得"""
+    return {
+        "timestamp": time.time(),
+        "services": get_retry_statistics()
+    }
+
+@router.get("/circuit/stats")
+def get_circuit_stats():
+    """上流APIごとのサーキットブレーカー状態（全ワーカー共通）を取得"""
+    try:
+        return {
+            "timestamp": time.time(),
+            "breakers": get_circuit_breaker_statistics()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"サーキットブレーカー統計取得エラー: {str(e)}")
+
+@router.get("/redis/stats")
+def get_redis_pool_statistics():
+    """Redisコネクションプールの利用統計を取得"""
+    return {
+        "timestamp": time.time(),
+        **redis_pools.get_stats()
+    }
+
+@router.get("/post_history/stats")
+def get_post_history_writer_statistics():
+    """投稿履歴ライトビハインドの書き込み統計を取得"""
+    return {
+        "timestamp": time.time(),
+        **post_history_writer.get_statistics()
+    }
+
+@router.get("/openai/usage")
+def get_openai_usage(days: int = 7):
+    """OpenAI APIの日別トークン使用量（コスト・レイテンシ監視用）"""
+    return {
+        "timestamp": time.time(),
+        **get_openai_usage_statistics(days)
+    }
+
 @router.get("/cache/stats")
 def get_cache_statistics():
     """キャッシュ統計を取得"""
     try:
-        from app.config import settings
-        redis_client = redis.from_url(settings.get_redis_url(), decode_responses=True)
+        redis_client = redis_pools.get_client()
         
         # キャッシュキー統計
         github_keys = redis_client.keys("github_commit:*")
@@ -119,16 +164,20 @@ def get_cache_statistics():
             "timestamp": time.time(),
             "github_cache": {
                 "total_keys": len(github_keys),
-                "sample_keys": github_keys[:5] if github_keys else []
+                "sample_keys": github_keys[:5] if github_keys else [],
+                "requests": get_github_cache_statistics()
             },
             "openai_cache": {
                 "total_keys": len(openai_keys),
-                "sample_keys": openai_keys[:5] if openai_keys else []
+                "sample_keys": openai_keys[:5] if openai_keys else [],
+                "requests": get_openai_cache_statistics()
             },
             "tweet_history": {
                 "total_keys": len(tweet_history_keys),
                 "sample_keys": tweet_history_keys[:5] if tweet_history_keys else []
             },
+            "single_flight": get_single_flight_statistics(),
+            "tiers": get_tier_statistics(),
             "redis_info": {
                 "keyspace": redis_client.info("keyspace"),
                 "memory": redis_client.info("memory")
@@ -147,8 +196,7 @@ def clear_cache(
 ):
     """キャッシュをクリア（管理者機能）"""
     try:
-        from app.config import settings
-        redis_client = redis.from_url(settings.get_redis_url(), decode_responses=True)
+        redis_client = redis_pools.get_client()
         
         cleared_count = 0
         
@@ -167,6 +215,15 @@ def clear_cache(
             if tweet_keys:
                 cleared_count += redis_client.delete(*tweet_keys)
         
+        # 全ワーカーのL1キャッシュも無効化
+        l1_prefixes = []
+        if cache_type == "all" or cache_type == "github":
+            l1_prefixes.append("github_commit:")
+        if cache_type == "all" or cache_type == "openai":
+            l1_prefixes.append("openai_tweet:")
+        if l1_prefixes:
+            publish_invalidation(l1_prefixes)
+        
         logger.info(f"キャッシュクリア実行: {cache_type}, {cleared_count}個のキーを削除, ユーザー: {user.id}")
         
         return {
@@ -182,8 +239,7 @@ def clear_cache(
 def get_performance_history():
     """パフォーマンス履歴を取得"""
     try:
-        from app.config import settings
-        redis_client = redis.from_url(settings.get_redis_url(), decode_responses=True)
+        redis_client = redis_pools.get_client()
         
         # パフォーマンス履歴データを取得（最新50件）
         performance_data = redis_client.lrange("performance_history", 0, 49)
@@ -210,8 +266,7 @@ def get_performance_history():
 def get_api_usage_stats():
     """API使用統計を取得"""
     try:
-        from app.config import settings
-        redis_client = redis.from_url(settings.get_redis_url(), decode_responses=True)
+        redis_client = redis_pools.get_client()
         
         # API使用回数統計
         api_stats = {}
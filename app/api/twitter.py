@@ -1,20 +1,31 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from app.schemas.twitter import (
     PostTweetRequest, PostTweetResponse,
     TwitterAuthRequest, TwitterAuthResponse,
     TwitterTokenRequest, TwitterTokenResponse,
-    AutoPostTweetRequest, AutoPostTweetResponse
+    AutoPostTweetRequest, AutoPostTweetResponse,
+    AutoPostJobResponse, AutoPostJobStatusResponse,
+    SchedulePostRequest, SchedulePostResponse,
+    PostHistoryItem, PostHistoryPageResponse
 )
-from app.services.twitter_service import post_tweet_v2, post_tweet_v2_async, is_duplicate_tweet
+from app.services.twitter_service import post_tweet_v2, is_duplicate_tweet, is_near_duplicate_tweet
 from app.services.oauth_service import OAuthService
+from app.services.auto_post_service import execute_auto_post_async
+from app.services.job_queue import enqueue_auto_post, enqueue_auto_post_async, get_job_status
+from app.services.scheduler_service import schedule_post
+from app.services.post_history_service import MAX_PAGE_SIZE, list_post_history
 from app.db import get_db
 from app.api.auth import get_current_user
 from app.models import User
 from app.middleware.rate_limiter import user_limiter
 from app.utils.error_handler import (
-    TwitterAPIError, RateLimitError, create_error_response, 
-    twitter_circuit_breaker, log_error
+    GitHubAPIError, OpenAIAPIError,
+    TwitterAPIError, RateLimitError, create_error_response, log_error
 )
+from app.utils.circuit_breaker import twitter_circuit_breaker
 from sqlalchemy.orm import Session
 import time
 import logging
@@ -22,6 +33,11 @@ import logging
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+def _job_accepted_response(job_id: str) -> JSONResponse:
+    """ジョブ登録時のレスポンス（202 Accepted）"""
+    body = AutoPostJobResponse(job_id=job_id, status="queued", status_url=f"/api/auto_post_jobs/{job_id}")
+    return JSONResponse(status_code=202, content=body.model_dump())
+
 @router.post("/post_tweet", response_model=PostTweetResponse)
 @user_limiter.limit("10/minute")  # 1分間に10回まで
 def post_tweet(
@@ -38,7 +54,7 @@ def post_tweet(
         raise HTTPException(status_code=401, detail="Twitter認証が必要です")
     
     try:
-        response = post_tweet_v2(access_token, req.tweet_text)
+        response = post_tweet_v2(access_token, req.tweet_text, user_id=user.id)
         tweet_id = response.get("data", {}).get("id") if response else None
         return PostTweetResponse(
             success=True,
@@ -59,7 +75,6 @@ def auto_post_tweet(
     """認証済みユーザーのトークンを使用して自動投稿（最適化版）"""
     from app.services.github_service import fetch_latest_commit_message
     from app.services.openai_service import generate_tweet_with_openai
-    from app.utils.error_handler import GitHubAPIError, OpenAIAPIError
     
     start_time = time.time()
     context = {
@@ -68,9 +83,16 @@ def auto_post_tweet(
         "language": req.language
     }
     
-    # サーキットブレーカーチェック
-    if not twitter_circuit_breaker.can_execute():
-        raise RateLimitError("Twitter", reset_time=twitter_circuit_breaker.recovery_timeout)
+    # サーキットブレーカーチェック（Twitterが遮断中ならGitHub・OpenAIも呼ばない）
+    open_for = twitter_circuit_breaker.open_for()
+    if open_for:
+        raise RateLimitError("Twitter", reset_time=open_for)
+    
+    # キューモード: ワーカーで実行し、すぐに202を返す
+    if req.enqueue:
+        return _job_accepted_response(
+            enqueue_auto_post(user.id, req.repository, req.language, fresh=req.fresh)
+        )
     
     oauth_service = OAuthService(db)
     access_token = oauth_service.get_decrypted_access_token(user.id, "twitter")
@@ -81,9 +103,8 @@ def auto_post_tweet(
     try:
         # 1. GitHub APIから最新コミットを取得
         try:
-            commit_message = fetch_latest_commit_message(req.repository)
+            commit_message = fetch_latest_commit_message(req.repository, fresh=req.fresh)
         except Exception as e:
-            twitter_circuit_breaker.on_failure()
             raise GitHubAPIError(f"コミット取得失敗: {str(e)}", context=context)
         
         # 2. OpenAIでツイート案を生成（言語指定対応）
@@ -93,16 +114,20 @@ def auto_post_tweet(
             raise OpenAIAPIError(f"ツイート生成失敗: {str(e)}", context=context)
         
         # 3. 重複チェック
-        if is_duplicate_tweet(tweet_text):
+        if is_duplicate_tweet(tweet_text, user_id=user.id):
             logger.warning(f"重複ツイート検出: {tweet_text[:50]}...")
             raise TwitterAPIError("重複する内容のツイートが検出されました", context=context)
+        if is_near_duplicate_tweet(tweet_text, user_id=user.id):
+            logger.warning(f"類似ツイート検出: {tweet_text[:50]}...")
+            raise TwitterAPIError("類似する内容のツイートが最近投稿されています", context=context)
         
         # 4. Xに投稿
         try:
-            response = post_tweet_v2(access_token, tweet_text)
-            twitter_circuit_breaker.on_success()
+            response = post_tweet_v2(
+                access_token, tweet_text, user_id=user.id,
+                history={"repository": req.repository, "commit_message": commit_message, "language": req.language}
+            )
         except Exception as e:
-            twitter_circuit_breaker.on_failure()
             raise TwitterAPIError(f"投稿失敗: {str(e)}", context=context)
         
         # 実行時間ログ
@@ -118,7 +143,6 @@ def auto_post_tweet(
     except (GitHubAPIError, OpenAIAPIError, TwitterAPIError) as service_error:
         return create_error_response(service_error, request=request, context=context)
     except Exception as e:
-        twitter_circuit_breaker.on_failure()
         log_error(e, context=context, request=request)
         raise HTTPException(status_code=500, detail=f"自動投稿エラー: {str(e)}")
 
@@ -131,9 +155,6 @@ async def auto_post_tweet_async(
     db: Session = Depends(get_db)
 ):
     """非同期版自動投稿（推奨）"""
-    from app.services.github_service import fetch_latest_commit_message_async
-    from app.services.openai_service import generate_tweet_with_openai_async
-    
     start_time = time.time()
     context = {
         "user_id": user.id,
@@ -142,40 +163,28 @@ async def auto_post_tweet_async(
         "async_version": True
     }
     
-    if not twitter_circuit_breaker.can_execute():
-        raise RateLimitError("Twitter", reset_time=twitter_circuit_breaker.recovery_timeout)
+    open_for = await twitter_circuit_breaker.open_for_async()
+    if open_for:
+        raise RateLimitError("Twitter", reset_time=open_for)
     
-    oauth_service = OAuthService(db)
-    access_token = oauth_service.get_decrypted_access_token(user.id, "twitter")
+    # キューモード: ワーカーで実行し、すぐに202を返す
+    if req.enqueue:
+        return _job_accepted_response(
+            await enqueue_auto_post_async(user.id, req.repository, req.language, fresh=req.fresh)
+        )
+    
+    # DBアクセス・復号は同期処理のためスレッドプールで実行（イベントループをブロックしない）
+    oauth_service = await run_in_threadpool(OAuthService, db)
+    access_token = await run_in_threadpool(oauth_service.get_decrypted_access_token, user.id, "twitter")
     
     if not access_token:
         raise HTTPException(status_code=401, detail="Twitter認証が必要です")
     
     try:
-        # 1. GitHub APIから最新コミットを取得（非同期）
-        try:
-            commit_message = await fetch_latest_commit_message_async(req.repository)
-        except Exception as e:
-            raise GitHubAPIError(f"コミット取得失敗: {str(e)}", context=context)
-        
-        # 2. OpenAIでツイート案を生成（非同期）
-        try:
-            tweet_text = await generate_tweet_with_openai_async(commit_message, req.repository, req.language)
-        except Exception as e:
-            raise OpenAIAPIError(f"ツイート生成失敗: {str(e)}", context=context)
-        
-        # 3. 重複チェック
-        if is_duplicate_tweet(tweet_text):
-            logger.warning(f"重複ツイート検出: {tweet_text[:50]}...")
-            raise TwitterAPIError("重複する内容のツイートが検出されました", context=context)
-        
-        # 4. Xに投稿（非同期）
-        try:
-            response = await post_tweet_v2_async(access_token, tweet_text)
-            twitter_circuit_breaker.on_success()
-        except Exception as e:
-            twitter_circuit_breaker.on_failure()
-            raise TwitterAPIError(f"投稿失敗: {str(e)}", context=context)
+        # コミット取得 → 生成 → 重複チェック → 投稿（ワーカーと共通の処理）
+        result = await execute_auto_post_async(
+            access_token, user.id, req.repository, req.language, fresh=req.fresh, context=context
+        )
         
         # 実行時間ログ
         execution_time = time.time() - start_time
@@ -183,17 +192,64 @@ async def auto_post_tweet_async(
         
         return AutoPostTweetResponse(
             status="ok", 
-            tweet_text=tweet_text, 
-            tweet_response=response
+            tweet_text=result["tweet_text"], 
+            tweet_response=result["tweet_response"]
         )
         
     except (GitHubAPIError, OpenAIAPIError, TwitterAPIError) as service_error:
         return create_error_response(service_error, request=request, context=context)
     except Exception as e:
-        twitter_circuit_breaker.on_failure()
         log_error(e, context=context, request=request)
         raise HTTPException(status_code=500, detail=f"非同期自動投稿エラー: {str(e)}")
 
+@router.get("/auto_post_jobs/{job_id}", response_model=AutoPostJobStatusResponse)
+def auto_post_job_status(job_id: str, user: User = Depends(get_current_user)):
+    """自動投稿ジョブの状態を取得（本人のジョブのみ）"""
+    job = get_job_status(job_id)
+    if not job or job.get("user_id") != str(user.id):
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    return AutoPostJobStatusResponse(**job)
+
+@router.post("/scheduled_posts", response_model=SchedulePostResponse, status_code=201)
+@user_limiter.limit("30/minute")
+def create_scheduled_post(
+    request: Request,
+    req: SchedulePostRequest,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """予約投稿を登録（予約時刻になるとスケジューラが投稿）"""
+    post = schedule_post(
+        db, user.id, req.tweet_text, req.scheduled_at,
+        repository=req.repository, commit_message=req.commit_message, language=req.language
+    )
+    return SchedulePostResponse(id=post.id, status=post.status, scheduled_at=post.posted_at)
+
+@router.get("/twitter/history", response_model=PostHistoryPageResponse)
+@user_limiter.limit("60/minute")
+def get_post_history(
+    request: Request,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="前ページの next_cursor"),
+    status: Optional[str] = Query(None, pattern=r'^(pending|processing|posted|failed)$'),
+    repository: Optional[str] = Query(None, max_length=200),
+    language: Optional[str] = Query(None, pattern=r'^(ja|en|es|fr|de|it|pt|ru|zh|ko)$'),
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """投稿履歴を新しい順に取得（カーソルページング）"""
+    try:
+        rows, next_cursor = list_post_history(
+            db, user.id, limit=limit, cursor=cursor,
+            status=status, repository=repository, language=language
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return PostHistoryPageResponse(
+        items=[PostHistoryItem.model_validate(row) for row in rows],
+        next_cursor=next_cursor
+    )
+
 @router.get("/auth_status")
 def twitter_auth_status(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Twitter認証状態を確認"""
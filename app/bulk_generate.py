@@ -0,0 +1,46 @@
+"""
+ツイート案のバルク生成（夜間バックフィル用）
+
+使い方:
+    python -m app.bulk_generate requests.jsonl --language ja
+
+requests.jsonl は1行1件の {"repository": "owner/repo", "commit_message": "..."}。
+キャッシュ済みのものを除いてOpenAI Batch APIへ投入し、完了後に openai_tweet:* キャッシュへ格納する。
+入力は1行ずつ読むため、件数に関係なくメモリ使用量は一定。
+"""
+import argparse
+import json
+import logging
+from typing import Dict, Iterator
+
+from app.services.openai_service import run_bulk_generation
+
+logger = logging.getLogger(__name__)
+
+
+def read_requests(path: str) -> Iterator[Dict[str, str]]:
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                req = json.loads(line)
+                yield {"repository": req["repository"], "commit_message": req["commit_message"]}
+            except (ValueError, KeyError) as e:
+                logger.warning(f"入力行をスキップ: {line_number}行目 {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="リクエストのJSONLファイル")
+    parser.add_argument("--language", default="ja", help="言語コード")
+    parser.add_argument("--poll-interval", type=float, default=None, help="完了確認間隔（秒）")
+    args = parser.parse_args()
+
+    summary = run_bulk_generation(read_requests(args.input), args.language, poll_interval=args.poll_interval)
+    print(json.dumps(summary, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
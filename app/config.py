@@ -1,3 +1,4 @@
+from pydantic import Field
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 import os
@@ -71,6 +72,9 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str = ""
     GITHUB_API_URL: str = "https://api.github.com/repos/{repo}/commits"
     GITHUB_TOKEN: str = ""  # GitHub認証トークン（レート制限緩和用）
+    GITHUB_WEBHOOK_SECRET: str = ""  # GitHub Webhook署名シークレット
+    GITHUB_WEBHOOK_AUTO_POST: bool = False  # push受信時に登録ユーザーの自動投稿ジョブを追加
+    GITHUB_WEBHOOK_MAX_BODY_BYTES: int = 25 * 1024 * 1024  # Webhookペイロード上限（GitHubの上限25MB）
     TWITTER_CLIENT_ID: str = ""
     TWITTER_CLIENT_SECRET: str = ""
     TWITTER_ACCESS_TOKEN: str = ""
@@ -79,6 +83,7 @@ class Settings(BaseSettings):
     REDIS_URL: str = ""  # Railway Redis URL (本番環境で使用)
     DATABASE_URL: str = ""
     ENCRYPTION_KEY: str = ""
+    ENCRYPTION_OLD_KEYS: str = ""  # キー入れ替え中の以前のENCRYPTION_KEY（カンマ区切り・新しい順）
     
     # CORS設定
     CORS_ORIGINS: str = "http://localhost:3000,https://*.vercel.app,https://x-auto-post-tool.vercel.app,https://x-auto-post-tool-development.up.railway.app"
@@ -86,18 +91,94 @@ class Settings(BaseSettings):
     
     # 最適化設定
     ENABLE_CACHING: bool = True  # キャッシュ機能のON/OFF
-    CACHE_GITHUB_TTL: int = 300  # GitHubキャッシュ有効期限（秒）
+    CACHE_GITHUB_TTL: int = 300  # GitHubキャッシュ有効期限（ソフトTTL・秒）
+    CACHE_GITHUB_HARD_TTL: int = 3600  # 期限切れキャッシュを即時返却してよい上限（ハードTTL・秒）
+    CACHE_GITHUB_VALIDATOR_TTL: int = 86400  # ETag/Last-Modified保持期間（期限切れ後の条件付きリクエスト用・秒）
     CACHE_OPENAI_TTL: int = 86400  # OpenAIキャッシュ有効期限（秒）
+    ENABLE_L1_CACHE: bool = True  # プロセス内L1キャッシュ（github_commit / openai_tweet）のON/OFF
+    L1_CACHE_TTL: float = 60.0  # L1キャッシュ保持上限（秒）
+    L1_CACHE_MAX_ENTRIES: int = 1024  # L1キャッシュ最大エントリ数
+    L1_CACHE_MAX_BYTES: int = 8 * 1024 * 1024  # L1キャッシュのメモリ上限（JSONサイズ換算・バイト）
+    ENABLE_SINGLE_FLIGHT: bool = True  # 同一キーの同時キャッシュミスを1回の上流呼び出しに集約
+    SINGLE_FLIGHT_POLL_INTERVAL: float = 0.1  # フォロワーのキャッシュ確認間隔（秒）
+    ENABLE_NEAR_DUPLICATE_CHECK: bool = True  # SimHashによる類似ツイート検出のON/OFF
+    # 類似とみなすハミング距離（64ビット中）。SimHashの4バンド分割で取りこぼしなく検出できるのは3まで（範囲外は起動時エラー）
+    NEAR_DUPLICATE_MAX_DISTANCE: int = Field(default=3, ge=0, le=3)
+    OPENAI_BATCH_CONCURRENCY: int = 8  # ツイート一括生成の最大同時実行数（429で自動縮小）
+    OPENAI_BATCH_MAX_RETRIES: int = 5  # ツイート一括生成で429を受けた項目の再試行回数
+    OPENAI_BATCH_MAX_ITEMS: int = 100  # 一括生成1リクエストあたりの最大件数
+    OPENAI_BULK_MAX_REQUESTS_PER_FILE: int = 50000  # バルク生成1ファイルあたりの件数（Batch APIの上限）
+    OPENAI_BULK_POLL_INTERVAL: float = 30.0  # バルク生成の完了確認間隔（秒）
+    OPENAI_MAX_CANDIDATES: int = 5  # 1回のリクエストで生成するツイート案候補の上限（n）
+    OPENAI_COMMIT_TOKEN_BUDGET: int = 300  # プロンプトに含めるコミットメッセージの上限トークン数
+    OPENAI_TOKENIZER_ENCODING: str = "o200k_base"  # トークン数計算に使うtiktokenエンコーディング（gpt-4o系）
+    OPENAI_USAGE_RETENTION_DAYS: int = 30  # 日別トークン使用量の保持日数
+    RETRY_MAX_ATTEMPTS: int = 3  # 上流API呼び出しの最大試行回数（初回を含む）
+    RETRY_BASE_DELAY: float = 0.5  # 再試行の最小待機時間（秒・decorrelated jitter）
+    RETRY_MAX_DELAY: float = 20.0  # 再試行の最大待機時間（秒・Retry-Afterがこれを超える場合は再試行しない）
+    RETRY_BUDGET_RATIO: float = 0.2  # 再試行できる割合（リクエスト数に対する再試行数の上限）
+    RETRY_BUDGET_MIN_PER_SECOND: float = 1.0  # 低トラフィック時でも毎秒補充する再試行回数
+    RETRY_BUDGET_CAPACITY: float = 10.0  # 再試行予算の上限（バースト）
     ENABLE_CIRCUIT_BREAKER: bool = True  # サーキットブレーカーのON/OFF
     GITHUB_CIRCUIT_FAILURE_THRESHOLD: int = 3  # GitHub API障害閾値
     OPENAI_CIRCUIT_FAILURE_THRESHOLD: int = 5  # OpenAI API障害閾値
     TWITTER_CIRCUIT_FAILURE_THRESHOLD: int = 3  # Twitter API障害閾値
+    GITHUB_CIRCUIT_RECOVERY_TIMEOUT: int = 300  # GitHub API遮断後に試験呼び出しを許可するまでの秒数
+    OPENAI_CIRCUIT_RECOVERY_TIMEOUT: int = 60  # OpenAI API遮断後に試験呼び出しを許可するまでの秒数
+    TWITTER_CIRCUIT_RECOVERY_TIMEOUT: int = 180  # Twitter API遮断後に試験呼び出しを許可するまでの秒数
+    CIRCUIT_WINDOW_SECONDS: int = 60  # 失敗率を集計するスライディングウィンドウ（秒）
+    CIRCUIT_FAILURE_RATE: float = 0.5  # ウィンドウ内の失敗数が閾値以上かつこの割合以上で遮断
+    CIRCUIT_HALF_OPEN_PROBES: int = 1  # 半開状態で同時に許可する試験呼び出し数（この回数成功で復旧）
+    CIRCUIT_PROBE_TIMEOUT: int = 30  # 試験呼び出しの枠を保持する最大秒数（結果が記録されない場合に解放）
+    TWITTER_RATE_LIMIT_MAX_WAIT: float = 60.0  # 投稿枠のリセット待ちの上限（秒・超える場合は429を返す）
+    TWITTER_RATE_LIMIT_RESET_MARGIN: float = 1.0  # リセット時刻に足す余裕（秒・時計のずれ対策）
+    TWITTER_RATE_LIMIT_WINDOW: int = 900  # レート制限ウィンドウの長さ（秒・リセット後の新しいウィンドウの推定に使う）
     
     # パフォーマンス設定
     ASYNC_TIMEOUT: int = 30  # 非同期処理タイムアウト（秒）
     MAX_CONCURRENT_REQUESTS: int = 10  # 最大同時リクエスト数
     ENABLE_PERFORMANCE_LOGGING: bool = True  # パフォーマンスログのON/OFF
 
+    # 自動投稿ジョブキュー（Redis Streams）設定
+    WORKER_CONCURRENCY: int = 4  # ワーカーあたりの同時処理ジョブ数
+    JOB_VISIBILITY_TIMEOUT: int = 300  # ACKされないジョブを他ワーカーが引き取るまでの時間（秒）
+    JOB_RECLAIM_INTERVAL: int = 30  # 引き取り対象ジョブの確認間隔（秒）
+    JOB_MAX_ATTEMPTS: int = 3  # ジョブの最大試行回数
+    JOB_QUEUE_BLOCK_MS: int = 2000  # XREADGROUPの待機時間（REDIS_SOCKET_TIMEOUTより短くする）
+    JOB_QUEUE_MAXLEN: int = 100000  # ストリームの保持件数上限（概算）
+    JOB_STATUS_TTL: int = 86400  # ジョブ状態の保持期間（秒）
+
+    # 予約投稿スケジューラ設定
+    SCHEDULER_BATCH_SIZE: int = 100  # 1回に取得する予約投稿数
+    SCHEDULER_CONCURRENCY: int = 20  # 同時投稿数
+    SCHEDULER_POLL_INTERVAL: float = 5.0  # 期限到来行がない場合の待機時間（秒）
+    SCHEDULER_CLAIM_TIMEOUT: int = 600  # processing のまま放置された行を pending に戻すまでの時間（秒）
+    SCHEDULER_MAX_RETRIES: int = 3  # 投稿失敗時の最大試行回数
+    SCHEDULER_RETRY_BASE_DELAY: int = 60  # 再試行の基本待機時間（秒・指数バックオフ）
+
+    # 投稿履歴（post_history）ライトビハインド設定
+    POST_HISTORY_BATCH_SIZE: int = 200  # 1回のINSERTでまとめる件数（この件数たまったら即時書き込み）
+    POST_HISTORY_FLUSH_INTERVAL: float = 2.0  # 書き込み間隔の上限（秒）
+    POST_HISTORY_MAX_BUFFER: int = 10000  # DB障害時にメモリに保持する上限件数
+    STATS_FLUSH_INTERVAL: float = 5.0  # キャッシュヒット統計をRedisへまとめて加算する間隔（秒）
+
+    # Redisコネクションプール設定（論理DBごと・ワーカーごと）
+    REDIS_MAX_CONNECTIONS: int = 20  # プールあたりの最大接続数
+    REDIS_POOL_TIMEOUT: int = 5  # プール枯渇時の待機上限（秒）
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30  # アイドル接続のヘルスチェック間隔（秒）
+    REDIS_SOCKET_TIMEOUT: float = 5.0  # コマンドのソケットタイムアウト（秒）
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 5.0  # 接続確立タイムアウト（秒）
+
+    # HTTPクライアント（コネクションプール）設定
+    HTTP_ENABLE_HTTP2: bool = True  # HTTP/2のON/OFF（h2未インストール時は自動でHTTP/1.1）
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0  # アイドル接続の保持時間（秒）
+    GITHUB_HTTP_TIMEOUT: float = 10.0  # GitHub APIタイムアウト（秒）
+    GITHUB_MAX_CONNECTIONS: int = 10  # GitHub API最大接続数
+    TWITTER_HTTP_TIMEOUT: float = 30.0  # Twitter APIタイムアウト（秒）
+    TWITTER_MAX_CONNECTIONS: int = 10  # Twitter API最大接続数
+    OPENAI_HTTP_TIMEOUT: float = 30.0  # OpenAI APIタイムアウト（秒）
+    OPENAI_MAX_CONNECTIONS: int = 20  # OpenAI API最大接続数
+
     class Config:
         env_file = ".env"
         env_file_encoding = 'utf-8'
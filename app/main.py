@@ -1,15 +1,36 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.responses import RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import twitter, openai, auth
+from app.api import twitter, openai, auth, github
 from app.config import settings
 from app.middleware.rate_limiter import limiter
 from app.middleware.security_headers import SecurityHeadersMiddleware
 from app.middleware.https_redirect import HTTPSRedirectMiddleware
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
+from app.services.http_clients import http_clients
+from app.services.redis_pool import redis_pools
+from app.services.local_cache import cache_invalidation_listener
+from app.services.post_history_writer import post_history_writer
+from fastapi.concurrency import run_in_threadpool
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """アプリケーションの起動・終了処理（共有リソースの初期化と解放）"""
+    await http_clients.startup()
+    await cache_invalidation_listener.start()
+    post_history_writer.start()
+    try:
+        yield
+    finally:
+        # 投稿履歴バッファの残りを書き込んでから終了
+        await run_in_threadpool(post_history_writer.stop)
+        await cache_invalidation_listener.stop()
+        await http_clients.shutdown()
+        await redis_pools.aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 # HTTPS強制リダイレクト（本番環境のみ）
 if settings.ENVIRONMENT == "production":
@@ -40,6 +61,7 @@ app.add_middleware(
 app.include_router(twitter.router, prefix="/api")
 app.include_router(openai.router, prefix="/api")
 app.include_router(auth.router, prefix="/api")
+app.include_router(github.router, prefix="/api")
 
 # システム管理API
 from app.api import system
@@ -8,11 +8,10 @@ from app.config import settings
 redis_available = False
 
 try:
-    import redis
-    # 本番環境対応のRedis接続
+    from app.services.redis_pool import redis_pools, REDIS_DB_RATE_LIMIT
+    # 共有プール（レート制限用DB）で接続テスト
     redis_url = settings.get_redis_url()
-    redis_client = redis.from_url(redis_url, db=2, decode_responses=True)
-    # 接続テスト
+    redis_client = redis_pools.get_client(REDIS_DB_RATE_LIMIT)
     redis_client.ping()
     redis_available = True
     print(f"Redis接続成功: {redis_url}")
@@ -27,10 +26,14 @@ temp_env_file = tempfile.NamedTemporaryFile(mode='w', suffix='.env', delete=Fals
 temp_env_file.write("# Empty config file to avoid encoding issues\n")
 temp_env_file.close()
 
+# limitsのRedisストレージも共有プールを使う（limitsはバイト列応答を前提とするため raw プール）
+storage_options = {"connection_pool": redis_pools.get_pool(REDIS_DB_RATE_LIMIT, decode_responses=False)} if redis_available else {}
+
 # Limiterの設定
 limiter = Limiter(
     key_func=get_remote_address,
     storage_uri=f"{settings.get_redis_url()}/2" if redis_available else "memory://",
+    storage_options=storage_options,
     enabled=True,
     config_filename=temp_env_file.name  # 空のUTF-8ファイルを指定
 )
@@ -75,6 +78,7 @@ def rate_limit_key_func(request: Request):
 user_limiter = Limiter(
     key_func=rate_limit_key_func,
     storage_uri=f"{settings.get_redis_url()}/2" if redis_available else "memory://",
+    storage_options=storage_options,
     enabled=True,
     config_filename=temp_env_file.name  # 同じ空のUTF-8ファイルを指定
 )
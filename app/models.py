@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, Text, DateTime, ForeignKey, Index, text
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.sql import func
 
@@ -38,6 +38,18 @@ class OAuthToken(Base):
 
 class PostHistory(Base):
     __tablename__ = 'post_history'
+    __table_args__ = (
+        # 予約投稿スケジューラ: status='pending' かつ posted_at（予約時刻）到来済みの行を索引で探す
+        Index('ix_post_history_status_posted_at', 'status', 'posted_at'),
+        # 投稿履歴APIのキーセットページング: WHERE user_id = ? [AND ...] ORDER BY created_at DESC, id DESC
+        Index('ix_post_history_user_created_id', 'user_id', 'created_at', 'id'),
+        Index('ix_post_history_user_repository_created_id', 'user_id', 'repository', 'created_at', 'id'),
+        Index('ix_post_history_user_language_created_id', 'user_id', 'language', 'created_at', 'id'),
+        Index('ix_post_history_user_created_id_posted', 'user_id', 'created_at', 'id',
+              postgresql_where=text("status = 'posted'"), sqlite_where=text("status = 'posted'")),
+        Index('ix_post_history_user_created_id_failed', 'user_id', 'created_at', 'id',
+              postgresql_where=text("status = 'failed'"), sqlite_where=text("status = 'failed'")),
+    )
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     repository = Column(String(255), nullable=False)
@@ -45,11 +57,11 @@ class PostHistory(Base):
     tweet_text = Column(Text, nullable=False)
     tweet_id = Column(String(255))
     language = Column(String(10), default='ja')
-    status = Column(String(50), default='pending', nullable=False)
+    status = Column(String(50), default='pending', nullable=False)  # pending, processing, posted, failed
     error_message = Column(Text)
     retry_count = Column(Integer, default=0)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    posted_at = Column(DateTime(timezone=True))
+    posted_at = Column(DateTime(timezone=True))  # pending中は予約投稿時刻、投稿後は実際の投稿時刻
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     user = relationship('User', back_populates='post_history')
 
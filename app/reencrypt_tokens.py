@@ -0,0 +1,30 @@
+"""
+OAuthトークンの再暗号化（暗号化キーの入れ替え用）
+
+使い方:
+    ENCRYPTION_KEY=<新しいキー> ENCRYPTION_OLD_KEYS=<以前のキー> python -m app.reencrypt_tokens --batch-size 500
+
+現在のキー（ENCRYPTION_KEY）で暗号化されていない oauth_tokens の行をサーバーサイドカーソルで読み、
+batch_size 件ごとに更新する。完了後は ENCRYPTION_OLD_KEYS から以前のキーを外せる。
+途中で止めても再実行すれば残りの行だけを処理する。
+"""
+import argparse
+import json
+import logging
+
+from app.db import engine
+from app.services.token_service import reencrypt_oauth_tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500, help="1回の更新でまとめる行数")
+    args = parser.parse_args()
+
+    summary = reencrypt_oauth_tokens(engine, batch_size=args.batch_size)
+    print(json.dumps(summary, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
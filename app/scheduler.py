@@ -0,0 +1,35 @@
+"""
+予約投稿スケジューラ
+
+使い方:
+    python -m app.scheduler
+
+複数レプリカで起動しても、行ロック（FOR UPDATE SKIP LOCKED）により同じ予約投稿は1回だけ投稿される。
+"""
+import asyncio
+import logging
+import signal
+
+from app.services.http_clients import http_clients
+from app.services.redis_pool import redis_pools
+from app.services.scheduler_service import ScheduledPostRunner
+
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    runner = ScheduledPostRunner()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, runner.stop)
+
+    await http_clients.startup()
+    try:
+        await runner.run()
+    finally:
+        await http_clients.shutdown()
+        await redis_pools.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
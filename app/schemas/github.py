@@ -1,5 +1,20 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from app.config import settings
  
 class GenerateTweetRequest(BaseModel):
     repository: str
-    language: str = 'ja'  # デフォルトは日本語 
\ No newline at end of file
+    language: str = 'ja'  # デフォルトは日本語
+    fresh: bool = False  # Trueの場合はキャッシュを使わずGitHubの最新コミットを取得
+    candidates: int = Field(default=1, ge=1, le=settings.OPENAI_MAX_CANDIDATES)  # 2以上で候補を複数生成してランキング
+
+class AutoPostSubscriptionRequest(BaseModel):
+    repository: str = Field(
+        ...,
+        pattern=r'^[a-zA-Z0-9_.-]+/[a-zA-Z0-9_.-]+$',
+        description="GitHubリポジトリ名（owner/repo形式）"
+    )
+    language: str = Field(
+        default='ja',
+        pattern=r'^(ja|en|es|fr|de|it|pt|ru|zh|ko)$',
+        description="言語コード"
+    )
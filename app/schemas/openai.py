@@ -1,6 +1,24 @@
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from app.config import settings
  
+class TweetCandidate(BaseModel):
+    tweet: str
+    score: float
+    weighted_length: int
+    hashtags: int
+    overlap: float
+
 class GenerateTweetResponse(BaseModel):
     tweet_draft: str
     commit_message: str 
     repository: str 
+    candidates: Optional[List[TweetCandidate]] = None  # candidates>=2 の場合のみ（スコア順、先頭が tweet_draft）
+
+class BatchGenerateTweetItem(BaseModel):
+    commit_message: str = Field(..., min_length=1, max_length=10000)
+    repository: str = Field(..., min_length=1, max_length=200)
+
+class BatchGenerateTweetsRequest(BaseModel):
+    items: List[BatchGenerateTweetItem] = Field(..., min_length=1, max_length=settings.OPENAI_BATCH_MAX_ITEMS)
+    language: str = Field(default='ja', pattern=r'^(ja|en|es|fr|de|it|pt|ru|zh|ko)$')
@@ -1,6 +1,8 @@
 from pydantic import BaseModel, Field, field_validator
-from typing import Any, Optional
+from datetime import datetime
+from typing import Any, List, Optional
 import re
+from app.utils.tweet_length import MAX_WEIGHTED_LENGTH, weighted_length
 
 class PostTweetRequest(BaseModel):
     tweet_text: str = Field(
@@ -31,6 +33,11 @@ class PostTweetRequest(BaseModel):
         # 制御文字の除去（改行・タブは除く）
         v = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]', '', v)
         
+        # 日本語・絵文字は2、URLは23として数える（Twitterの文字数カウント）
+        length = weighted_length(v.strip())
+        if length > MAX_WEIGHTED_LENGTH:
+            raise ValueError(f'ツイートが文字数上限を超えています（{length}/{MAX_WEIGHTED_LENGTH}）')
+        
         return v.strip()
 
 class PostTweetResponse(BaseModel):
@@ -65,6 +72,14 @@ class AutoPostTweetRequest(BaseModel):
         pattern=r'^(ja|en|es|fr|de|it|pt|ru|zh|ko)$',
         description="言語コード（ja, en, es, fr, de, it, pt, ru, zh, ko）"
     )
+    fresh: bool = Field(
+        default=False,
+        description="Trueの場合はキャッシュを使わずGitHubの最新コミットを取得"
+    )
+    enqueue: bool = Field(
+        default=False,
+        description="Trueの場合はジョブキューに登録して即座に202とジョブIDを返す"
+    )
     
     @field_validator('repository')
     @classmethod
@@ -80,6 +95,52 @@ class AutoPostTweetRequest(BaseModel):
             
         return v.strip()
 
+class SchedulePostRequest(PostTweetRequest):
+    scheduled_at: datetime = Field(..., description="予約投稿時刻（タイムゾーン未指定はUTC）")
+    repository: str = Field(default="", max_length=200)
+    commit_message: str = Field(default="")
+    language: str = Field(default='ja', pattern=r'^(ja|en|es|fr|de|it|pt|ru|zh|ko)$')
+
+class SchedulePostResponse(BaseModel):
+    id: int
+    status: str
+    scheduled_at: datetime
+
+class PostHistoryItem(BaseModel):
+    id: int
+    repository: str
+    commit_message: str
+    tweet_text: str
+    tweet_id: Optional[str] = None
+    language: Optional[str] = None
+    status: str
+    error_message: Optional[str] = None
+    retry_count: Optional[int] = None
+    created_at: Optional[datetime] = None
+    posted_at: Optional[datetime] = None
+
+    model_config = {"from_attributes": True}
+
+class PostHistoryPageResponse(BaseModel):
+    items: List[PostHistoryItem]
+    next_cursor: Optional[str] = None
+
+class AutoPostJobResponse(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+
+class AutoPostJobStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    repository: str
+    language: str
+    attempts: int
+    created_at: float
+    updated_at: float
+    result: Optional[Any] = None
+    error: Optional[str] = None
+
 class AutoPostTweetResponse(BaseModel):
     status: str
     tweet_text: str
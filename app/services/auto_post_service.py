@@ -0,0 +1,87 @@
+"""
+自動投稿パイプライン（コミット取得 → ツイート生成 → 重複チェック → 投稿）
+
+非同期エンドポイント（インライン実行）とジョブワーカー（キュー実行）で共有する。
+失敗は ServiceError で送出し、上流APIのステータスを details["upstream_status"] に入れる
+（重複は status_code=409）。ワーカーはこれで再試行するかを判定する。
+"""
+import logging
+from typing import Any, Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.db import SessionLocal
+from app.services.oauth_service import OAuthService
+from app.utils.error_handler import GitHubAPIError, OpenAIAPIError, TwitterAPIError
+
+logger = logging.getLogger(__name__)
+
+
+def _load_access_token(user_id: int) -> Optional[str]:
+    """ワーカー用: 専用セッションでアクセストークンを復号"""
+    db = SessionLocal()
+    try:
+        return OAuthService(db).get_decrypted_access_token(user_id, "twitter")
+    finally:
+        db.close()
+
+
+async def get_access_token_async(user_id: int) -> Optional[str]:
+    # DBアクセス・復号は同期処理のためスレッドプールで実行
+    return await run_in_threadpool(_load_access_token, user_id)
+
+
+async def execute_auto_post_async(
+    access_token: str,
+    user_id: int,
+    repository: str,
+    language: str,
+    fresh: bool = False,
+    context: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """自動投稿を実行し、投稿したツイートとAPIレスポンスを返す"""
+    from app.services.github_service import fetch_latest_commit_message_async
+    from app.services.openai_service import generate_tweet_with_openai_async
+    from app.services.twitter_service import (
+        post_tweet_v2_async, is_duplicate_tweet_async, is_near_duplicate_tweet_async
+    )
+    from app.services.twitter_rate_limit import TwitterRateLimitExceeded
+
+    context = context or {}
+
+    # 1. GitHub APIから最新コミットを取得（非同期）
+    try:
+        commit_message = await fetch_latest_commit_message_async(repository, fresh=fresh)
+    except Exception as e:
+        raise GitHubAPIError(f"コミット取得失敗: {str(e)}", context=context, upstream_status=getattr(e, "status_code", None))
+
+    # 2. OpenAIでツイート案を生成（非同期）
+    try:
+        tweet_text = await generate_tweet_with_openai_async(commit_message, repository, language)
+    except Exception as e:
+        raise OpenAIAPIError(f"ツイート生成失敗: {str(e)}", context=context, upstream_status=getattr(e, "status_code", None))
+
+    # 3. 重複チェック（非同期）
+    if await is_duplicate_tweet_async(tweet_text, user_id=user_id):
+        logger.warning(f"重複ツイート検出: {tweet_text[:50]}...")
+        raise TwitterAPIError("重複する内容のツイートが検出されました", status_code=409, context=context)
+    if await is_near_duplicate_tweet_async(tweet_text, user_id=user_id):
+        logger.warning(f"類似ツイート検出: {tweet_text[:50]}...")
+        raise TwitterAPIError("類似する内容のツイートが最近投稿されています", status_code=409, context=context)
+
+    # 4. Xに投稿（非同期）
+    try:
+        response = await post_tweet_v2_async(
+            access_token, tweet_text, user_id=user_id,
+            history={"repository": repository, "commit_message": commit_message, "language": language}
+        )
+    except TwitterRateLimitExceeded as e:
+        raise TwitterAPIError(f"投稿失敗: {str(e.detail)}", context=context, upstream_status=e.status_code)
+    except Exception as e:
+        raise TwitterAPIError(f"投稿失敗: {str(e)}", context=context, upstream_status=getattr(e, "status_code", None))
+
+    return {
+        "commit_message": commit_message,
+        "tweet_text": tweet_text,
+        "tweet_response": response
+    }
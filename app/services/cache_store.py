@@ -0,0 +1,183 @@
+"""
+Redisキャッシュ・ストア層
+
+非同期エンドポイントは redis.asyncio ベースの AsyncCacheStore を使い、
+イベントループをブロックせずにキャッシュ・投稿履歴を読み書きする。
+同期版サービスは同じインターフェースの CacheStore（同期ファサード）を使う。
+
+github_commit:* / openai_tweet:* はプロセス内L1キャッシュ（local_cache）を経由し、
+L1ミス時のみRedis（L2）を参照する。
+"""
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from app.services.redis_pool import redis_pools, REDIS_DB_DEFAULT
+from app.services.local_cache import l1_cache, l2_stats, is_l1_key
+
+logger = logging.getLogger(__name__)
+
+
+def _split_local_hits(keys: List[str]):
+    """L1にあるキーの値と、Redisから取得すべきキーの位置を返す"""
+    values: List[Optional[Dict[str, Any]]] = [None] * len(keys)
+    missing = []
+    for index, key in enumerate(keys):
+        if is_l1_key(key):
+            value = l1_cache.get(key)
+            if value is not None:
+                values[index] = value
+                continue
+        missing.append(index)
+    return values, missing
+
+
+def _merge_remote(keys: List[str], values: list, missing: List[int], remote: list):
+    for index, data in zip(missing, remote):
+        use_l1 = is_l1_key(keys[index])
+        if data:
+            values[index] = json.loads(data)
+            if use_l1:
+                l2_stats.hit()
+                l1_cache.set(keys[index], values[index], len(data))
+        elif use_l1:
+            l2_stats.miss()
+    return values
+
+
+class CacheStore:
+    """同期版キャッシュストア（同期エンドポイント用ファサード）"""
+    def __init__(self, db: int = REDIS_DB_DEFAULT):
+        self.db = db
+
+    @property
+    def client(self) -> redis.Redis:
+        return redis_pools.get_client(self.db)
+
+    def get_json(self, key: str, local: bool = True) -> Optional[Dict[str, Any]]:
+        """JSONキャッシュを取得（エラー時はNone）。local=FalseでL1を読まずRedisを参照"""
+        use_l1 = is_l1_key(key)
+        if use_l1 and local:
+            value = l1_cache.get(key)
+            if value is not None:
+                return value
+        try:
+            data = self.client.get(key)
+            if data:
+                value = json.loads(data)
+                if use_l1:
+                    l2_stats.hit()
+                    l1_cache.set(key, value, len(data))
+                return value
+            if use_l1:
+                l2_stats.miss()
+        except Exception as e:
+            logger.warning(f"キャッシュ取得エラー: {e}")
+        return None
+
+    def get_many_json(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """複数キーをL1とRedis MGET（1往復）で取得。順序はkeysと同じ（エラー時はNone）"""
+        values, missing = _split_local_hits(keys)
+        if not missing:
+            return values
+        try:
+            return _merge_remote(keys, values, missing, self.client.mget([keys[i] for i in missing]))
+        except Exception as e:
+            logger.warning(f"キャッシュ一括取得エラー: {e}")
+            return values
+
+    def set_json(self, key: str, value: Dict[str, Any], ttl: int) -> bool:
+        """JSONキャッシュを保存（エラー時はFalse）"""
+        try:
+            data = json.dumps(value)
+            self.client.setex(key, ttl, data)
+            if is_l1_key(key):
+                l1_cache.set(key, value, len(data), ttl)
+            return True
+        except Exception as e:
+            logger.warning(f"キャッシュ保存エラー: {e}")
+            return False
+
+    def incr_counter(self, key: str, field: str, amount: int = 1) -> None:
+        """統計カウンタ（Redisハッシュ）を加算（エラー時は無視）"""
+        try:
+            self.client.hincrby(key, field, amount)
+        except Exception as e:
+            logger.debug(f"カウンタ更新エラー: {e}")
+
+    def get_counters(self, key: str) -> Dict[str, int]:
+        """統計カウンタを取得（エラー時は空）"""
+        try:
+            return {field: int(value) for field, value in self.client.hgetall(key).items()}
+        except Exception as e:
+            logger.warning(f"カウンタ取得エラー: {e}")
+            return {}
+
+
+class AsyncCacheStore:
+    """非同期版キャッシュストア（redis.asyncio）"""
+    def __init__(self, db: int = REDIS_DB_DEFAULT):
+        self.db = db
+
+    @property
+    def client(self) -> aioredis.Redis:
+        return redis_pools.get_async_client(self.db)
+
+    async def get_json(self, key: str, local: bool = True) -> Optional[Dict[str, Any]]:
+        """JSONキャッシュを取得（エラー時はNone）。local=FalseでL1を読まずRedisを参照"""
+        use_l1 = is_l1_key(key)
+        if use_l1 and local:
+            value = l1_cache.get(key)
+            if value is not None:
+                return value
+        try:
+            data = await self.client.get(key)
+            if data:
+                value = json.loads(data)
+                if use_l1:
+                    l2_stats.hit()
+                    l1_cache.set(key, value, len(data))
+                return value
+            if use_l1:
+                l2_stats.miss()
+        except Exception as e:
+            logger.warning(f"キャッシュ取得エラー: {e}")
+        return None
+
+    async def get_many_json(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """複数キーをL1とRedis MGET（1往復）で取得。順序はkeysと同じ（エラー時はNone）"""
+        values, missing = _split_local_hits(keys)
+        if not missing:
+            return values
+        try:
+            return _merge_remote(keys, values, missing, await self.client.mget([keys[i] for i in missing]))
+        except Exception as e:
+            logger.warning(f"キャッシュ一括取得エラー: {e}")
+            return values
+
+    async def set_json(self, key: str, value: Dict[str, Any], ttl: int) -> bool:
+        """JSONキャッシュを保存（エラー時はFalse）"""
+        try:
+            data = json.dumps(value)
+            await self.client.setex(key, ttl, data)
+            if is_l1_key(key):
+                l1_cache.set(key, value, len(data), ttl)
+            return True
+        except Exception as e:
+            logger.warning(f"キャッシュ保存エラー: {e}")
+            return False
+
+    async def incr_counter(self, key: str, field: str, amount: int = 1) -> None:
+        """統計カウンタ（Redisハッシュ）を加算（エラー時は無視）"""
+        try:
+            await self.client.hincrby(key, field, amount)
+        except Exception as e:
+            logger.debug(f"カウンタ更新エラー: {e}")
+
+
+# プロセス共有のストア
+cache_store = CacheStore()
+async_cache_store = AsyncCacheStore()
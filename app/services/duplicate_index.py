@@ -0,0 +1,116 @@
+"""
+重複ツイート索引
+
+正規化したツイート本文のハッシュを、ユーザーごとのソート済みセット
+tweet_dedup:{user_id}（メンバー=ハッシュ、スコア=投稿時刻）に保存する。
+重複チェックは ZSCORE 1往復で判定でき、KEYS tweet_history:* の全走査を不要にする。
+
+既存の tweet_history:* からの移行:
+    PYTHONPATH=. python -m app.services.duplicate_index
+"""
+import hashlib
+import json
+import logging
+import re
+import time
+import unicodedata
+from typing import Optional
+
+from app.services.cache_store import cache_store, async_cache_store
+
+logger = logging.getLogger(__name__)
+
+DEDUP_WINDOW_SECONDS = 86400  # 索引の保持期間（tweet_historyと同じ24時間）
+DEDUP_KEY_PREFIX = "tweet_dedup:"
+# user_idを持たない投稿（移行前の履歴など）の索引
+DEDUP_SHARED_KEY = f"{DEDUP_KEY_PREFIX}shared"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_tweet_text(text: str) -> str:
+    """全角半角・大文字小文字・空白の違いを吸収"""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def tweet_text_hash(text: str) -> str:
+    return hashlib.sha1(normalize_tweet_text(text).encode()).hexdigest()
+
+
+def _dedup_key(user_id: Optional[int]) -> str:
+    return DEDUP_SHARED_KEY if user_id is None else f"{DEDUP_KEY_PREFIX}{user_id}"
+
+
+def _is_within_window(scores, window_hours: int) -> bool:
+    threshold = time.time() - window_hours * 3600
+    return any(score is not None and score >= threshold for score in scores)
+
+
+def add_to_pipeline(pipe, user_id: Optional[int], tweet_text: str, timestamp: float):
+    """投稿履歴の保存と同じパイプラインで索引を更新（ZADD + 期限切れ削除 + EXPIRE）"""
+    key = _dedup_key(user_id)
+    pipe.zadd(key, {tweet_text_hash(tweet_text): timestamp})
+    pipe.zremrangebyscore(key, "-inf", timestamp - DEDUP_WINDOW_SECONDS)
+    pipe.expire(key, DEDUP_WINDOW_SECONDS)
+
+
+def is_duplicate(tweet_text: str, user_id: Optional[int] = None, window_hours: int = 24) -> bool:
+    """重複チェック（本人の索引と共有索引を1往復で確認）"""
+    digest = tweet_text_hash(tweet_text)
+    pipe = cache_store.client.pipeline(transaction=False)
+    pipe.zscore(_dedup_key(user_id), digest)
+    if user_id is not None:
+        pipe.zscore(DEDUP_SHARED_KEY, digest)
+    return _is_within_window(pipe.execute(), window_hours)
+
+
+async def is_duplicate_async(tweet_text: str, user_id: Optional[int] = None, window_hours: int = 24) -> bool:
+    """重複チェック（非同期版）"""
+    digest = tweet_text_hash(tweet_text)
+    pipe = async_cache_store.client.pipeline(transaction=False)
+    pipe.zscore(_dedup_key(user_id), digest)
+    if user_id is not None:
+        pipe.zscore(DEDUP_SHARED_KEY, digest)
+    return _is_within_window(await pipe.execute(), window_hours)
+
+
+def backfill_from_tweet_history(batch_size: int = 500) -> int:
+    """既存の tweet_history:* を SCAN + MGET で読み、索引（類似検出用の署名含む）に登録（繰り返し実行しても安全）"""
+    from app.services import near_duplicate
+
+    client = cache_store.client
+    now = time.time()
+    count = 0
+    batch = []
+
+    def flush(keys):
+        nonlocal count
+        pipe = client.pipeline(transaction=False)
+        for data in client.mget(keys):
+            if not data:
+                continue
+            entry = json.loads(data)
+            timestamp = entry.get("timestamp", 0)
+            if not entry.get("text") or now - timestamp >= DEDUP_WINDOW_SECONDS:
+                continue
+            add_to_pipeline(pipe, entry.get("user_id"), entry["text"], timestamp)
+            near_duplicate.add_to_pipeline(pipe, entry.get("user_id"), entry["text"], timestamp)
+            count += 1
+        pipe.execute()
+
+    for key in client.scan_iter(match="tweet_history:*", count=batch_size):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    logger.info(f"重複ツイート索引の移行完了: {count}件")
+    return count
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(f"登録件数: {backfill_from_tweet_history()}")
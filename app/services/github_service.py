@@ -1,131 +1,376 @@
-import requests
-import redis
-import json
+import asyncio
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 import httpx
-from typing import Optional, Dict, Any
+import requests
+from typing import Optional, Dict, Any, Set
 from fastapi import HTTPException
 from app.config import settings
+from app.services.http_clients import http_clients
+from app.services.cache_store import cache_store, async_cache_store
+from app.services.local_cache import publish_invalidation
+from app.services.stats_buffer import BufferedCounters
+from app.utils.circuit_breaker import github_circuit_breaker
+from app.utils.retry import RetryPolicy
+from app.utils.single_flight import SingleFlight
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Redisクライアント（キャッシュ用）
-# Redis接続（本番環境対応）
-def get_redis_client():
-    redis_url = settings.get_redis_url()
-    return redis.from_url(redis_url, decode_responses=True)
+# GitHubキャッシュ統計（全ワーカー共通のRedisハッシュ）
+GITHUB_CACHE_STATS_KEY = "github_cache_stats"
+# ヒット経路の回数（hits / stale_hits）はプロセス内で数えてまとめて加算する
+github_hit_counters = BufferedCounters(GITHUB_CACHE_STATS_KEY)
 
-redis_client = get_redis_client()
+# GitHub API呼び出しの再試行（一覧取得は冪等）
+github_retry = RetryPolicy("github")
 
-async def fetch_latest_commit_message_async(repository: str) -> str:
-    """非同期でGitHub APIから最新のコミットメッセージを取得（推奨）"""
-    cache_key = f"github_commit:{repository}"
-    
-    # キャッシュから取得を試行（5分間キャッシュ）
-    try:
-        cached_data = redis_client.get(cache_key)
-        if cached_data:
-            logger.info(f"GitHub APIキャッシュヒット: {repository}")
-            return json.loads(cached_data)["commit_message"]
-    except Exception as e:
-        logger.warning(f"キャッシュ取得エラー: {e}")
-    
-    url = settings.GITHUB_API_URL.format(repo=repository)
-    
-    # HTTPヘッダーでレート制限情報を含む
+# リポジトリ単位の呼び出し集約（ロックはHTTPタイムアウトより少し長く保持）
+github_single_flight = SingleFlight("github", lock_ttl=settings.GITHUB_HTTP_TIMEOUT + 5)
+
+# stale-while-revalidate のバックグラウンド更新（同一リポジトリは同時に1件まで）
+_refresh_tasks: Set[asyncio.Task] = set()
+_refreshing: Set[str] = set()
+_refreshing_lock = threading.Lock()
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="github-refresh")
+
+def _cache_key(repository: str) -> str:
+    return f"github_commit:{repository}"
+
+def _build_headers(cached_entry: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """リクエストヘッダーを構築（キャッシュがあれば条件付きリクエスト）"""
     headers = {
         "Accept": "application/vnd.github.v3+json",
         "User-Agent": "x-auto-post-tool/1.0"
     }
-    
+
     # GitHub認証トークンが設定されている場合は使用（レート制限緩和）
-    if hasattr(settings, 'GITHUB_TOKEN') and settings.GITHUB_TOKEN:
+    if settings.GITHUB_TOKEN:
         headers["Authorization"] = f"token {settings.GITHUB_TOKEN}"
-    
-    async with httpx.AsyncClient(timeout=10.0) as client:
+
+    # ETag / Last-Modified で再検証（304はレート制限を消費しない）
+    if cached_entry:
+        if cached_entry.get("etag"):
+            headers["If-None-Match"] = cached_entry["etag"]
+        elif cached_entry.get("last_modified"):
+            headers["If-Modified-Since"] = cached_entry["last_modified"]
+
+    return headers
+
+def _entry_age(cached_entry: Dict[str, Any]) -> float:
+    validated_at = cached_entry.get("validated_at", cached_entry.get("timestamp", 0))
+    return time.time() - validated_at
+
+def _is_fresh(cached_entry: Optional[Dict[str, Any]]) -> bool:
+    """再検証なしで返せるか（ソフトTTL: CACHE_GITHUB_TTL以内に検証済み）"""
+    return bool(cached_entry) and _entry_age(cached_entry) < settings.CACHE_GITHUB_TTL
+
+def _is_servable_stale(cached_entry: Optional[Dict[str, Any]]) -> bool:
+    """ソフトTTL切れだがハードTTL内（即時返却してバックグラウンド更新）"""
+    return bool(cached_entry) and _entry_age(cached_entry) < settings.CACHE_GITHUB_HARD_TTL
+
+def _try_mark_refreshing(repository: str) -> bool:
+    with _refreshing_lock:
+        if repository in _refreshing:
+            return False
+        _refreshing.add(repository)
+        return True
+
+def _unmark_refreshing(repository: str):
+    with _refreshing_lock:
+        _refreshing.discard(repository)
+
+def _build_cache_entry(commit_message: str, response_headers) -> Dict[str, Any]:
+    now = time.time()
+    return {
+        "commit_message": commit_message,
+        "etag": response_headers.get("ETag"),
+        "last_modified": response_headers.get("Last-Modified"),
+        "timestamp": now,
+        "validated_at": now
+    }
+
+def _log_rate_limit(response_headers):
+    # レート制限情報をログ出力
+    if "X-RateLimit-Remaining" in response_headers:
+        remaining = response_headers["X-RateLimit-Remaining"]
+        reset_time = response_headers.get("X-RateLimit-Reset", "")
+        logger.info(f"GitHub API残り回数: {remaining}, リセット時刻: {reset_time}")
+
+def _raise_for_error(resp):
+    """エラーレスポンスをHTTPExceptionに変換（httpx / requests 共通）"""
+    if resp.status_code == 403 and "rate limit" in resp.text.lower():
+        raise HTTPException(status_code=429, detail="GitHub APIレート制限に達しました。しばらく待ってから再試行してください。")
+
+    if resp.status_code != 200:
+        error_detail = f"GitHub API エラー: {resp.status_code}"
+        try:
+            error_data = resp.json()
+            if "message" in error_data:
+                error_detail += f" - {error_data['message']}"
+        except:
+            pass
+        raise HTTPException(status_code=resp.status_code, detail=error_detail)
+
+def _parse_commit_message(resp) -> str:
+    data = resp.json()
+    if not data:
+        raise HTTPException(status_code=404, detail="コミット情報が見つかりません")
+    return data[0]["commit"]["message"]
+
+def _revalidated_entry(cached_entry: Dict[str, Any]) -> Dict[str, Any]:
+    """304応答時: 既存エントリの検証時刻のみ更新"""
+    return {**cached_entry, "validated_at": time.time()}
+
+def _validator_ttl() -> int:
+    # ETagを保持する期間（鮮度切れ後も再検証に使う）
+    return max(settings.CACHE_GITHUB_VALIDATOR_TTL, settings.CACHE_GITHUB_HARD_TTL, settings.CACHE_GITHUB_TTL)
+
+async def fetch_latest_commit_message_async(repository: str, fresh: bool = False) -> str:
+    """
+    非同期でGitHub APIから最新のコミットメッセージを取得（推奨）
+
+    ソフトTTL内: キャッシュを返す
+    ソフトTTL〜ハードTTL: キャッシュを即時返却し、バックグラウンドで更新
+    ハードTTL切れ / fresh=True: GitHubに問い合わせて待つ（ETagがあれば条件付き）
+    """
+    cache_key = _cache_key(repository)
+    cached_entry = await async_cache_store.get_json(cache_key)
+
+    if fresh:
+        return await _fetch_and_cache_async(repository, cached_entry)
+
+    # キャッシュから取得を試行（CACHE_GITHUB_TTL以内ならそのまま返す）
+    if _is_fresh(cached_entry):
+        logger.info(f"GitHub APIキャッシュヒット: {repository}")
+        github_hit_counters.incr("hits")
+        return cached_entry["commit_message"]
+
+    if _is_servable_stale(cached_entry):
+        logger.info(f"GitHub APIキャッシュ（期限切れ・バックグラウンド更新）: {repository}")
+        github_hit_counters.incr("stale_hits")
+        _schedule_refresh_async(repository, cached_entry)
+        return cached_entry["commit_message"]
+
+    return await _coalesced_fetch_async(repository, cached_entry)
+
+async def _coalesced_fetch_async(repository: str, cached_entry: Optional[Dict[str, Any]]) -> str:
+    cache_key = _cache_key(repository)
+
+    async def lookup() -> Optional[str]:
+        # 他ワーカーの更新を見るためL1を飛ばしてRedisを参照
+        entry = await async_cache_store.get_json(cache_key, local=False)
+        return entry["commit_message"] if _is_fresh(entry) else None
+
+    # 同一リポジトリの同時キャッシュミスは1回のGitHub呼び出しに集約
+    return await github_single_flight.do(
+        repository,
+        lambda: _fetch_and_cache_async(repository, cached_entry),
+        lookup
+    )
+
+def _schedule_refresh_async(repository: str, cached_entry: Dict[str, Any]):
+    """バックグラウンド更新タスクを起動（実行中なら何もしない）"""
+    if not _try_mark_refreshing(repository):
+        return
+
+    async def refresh():
         try:
-            resp = await client.get(url, headers=headers)
-            
-            # レート制限情報をログ出力
-            if "X-RateLimit-Remaining" in resp.headers:
-                remaining = resp.headers["X-RateLimit-Remaining"]
-                reset_time = resp.headers.get("X-RateLimit-Reset", "")
-                logger.info(f"GitHub API残り回数: {remaining}, リセット時刻: {reset_time}")
-            
-            if resp.status_code == 403 and "rate limit" in resp.text.lower():
-                raise HTTPException(status_code=429, detail="GitHub APIレート制限に達しました。しばらく待ってから再試行してください。")
-            
-            if resp.status_code != 200:
-                error_detail = f"GitHub API エラー: {resp.status_code}"
-                try:
-                    error_data = resp.json()
-                    if "message" in error_data:
-                        error_detail += f" - {error_data['message']}"
-                except:
-                    pass
-                raise HTTPException(status_code=resp.status_code, detail=error_detail)
-            
-            data = resp.json()
-            if not data:
-                raise HTTPException(status_code=404, detail="コミット情報が見つかりません")
-            
-            commit_message = data[0]["commit"]["message"]
-            
-            # キャッシュに保存（5分間）
-            try:
-                cache_data = {
-                    "commit_message": commit_message,
-                    "timestamp": time.time()
-                }
-                redis_client.setex(cache_key, 300, json.dumps(cache_data))
-                logger.info(f"GitHub APIレスポンスをキャッシュ: {repository}")
-            except Exception as e:
-                logger.warning(f"キャッシュ保存エラー: {e}")
-            
-            return commit_message
-            
-        except httpx.TimeoutException:
-            raise HTTPException(status_code=408, detail="GitHub API接続タイムアウト")
-        except httpx.RequestError as e:
-            raise HTTPException(status_code=503, detail=f"GitHub API接続エラー: {str(e)}")
-
-def fetch_latest_commit_message(repository: str) -> str:
+            await _coalesced_fetch_async(repository, cached_entry)
+            await async_cache_store.incr_counter(GITHUB_CACHE_STATS_KEY, "background_refreshes")
+        except Exception as e:
+            logger.warning(f"GitHubキャッシュのバックグラウンド更新失敗: {repository}, {e}")
+        finally:
+            _unmark_refreshing(repository)
+
+    task = asyncio.create_task(refresh())
+    # タスクがGCされないよう参照を保持
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+async def _fetch_and_cache_async(repository: str, cached_entry: Optional[Dict[str, Any]]) -> str:
+    """GitHub APIを呼び出し（条件付きリクエスト）、結果をキャッシュに保存"""
+    cache_key = _cache_key(repository)
+    url = settings.GITHUB_API_URL.format(repo=repository)
+    client = http_clients.get_async_client("github")
+    try:
+        # 再試行を含めた1回の取得をブレーカーの1件として数える
+        resp = await github_circuit_breaker.call_async(lambda: github_retry.call_async(
+            lambda: client.get(url, headers=_build_headers(cached_entry), params={"per_page": 1}),
+            idempotent=True
+        ))
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=408, detail="GitHub API接続タイムアウト")
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=503, detail=f"GitHub API接続エラー: {str(e)}")
+
+    _log_rate_limit(resp.headers)
+
+    # 変更なし: キャッシュを延命して返す
+    if resp.status_code == 304 and cached_entry:
+        logger.info(f"GitHub API再検証（304 Not Modified）: {repository}")
+        await async_cache_store.set_json(cache_key, _revalidated_entry(cached_entry), _validator_ttl())
+        await async_cache_store.incr_counter(GITHUB_CACHE_STATS_KEY, "revalidations")
+        return cached_entry["commit_message"]
+
+    _raise_for_error(resp)
+    commit_message = _parse_commit_message(resp)
+    await async_cache_store.incr_counter(GITHUB_CACHE_STATS_KEY, "full_fetches")
+
+    # キャッシュに保存（ETag / Last-Modified を含む）
+    if await async_cache_store.set_json(cache_key, _build_cache_entry(commit_message, resp.headers), _validator_ttl()):
+        logger.info(f"GitHub APIレスポンスをキャッシュ: {repository}")
+
+    return commit_message
+
+def fetch_latest_commit_message(repository: str, fresh: bool = False) -> str:
     """同期版（後方互換性のため保持）"""
+    cache_key = _cache_key(repository)
+    cached_entry = cache_store.get_json(cache_key)
+
+    if not fresh:
+        if _is_fresh(cached_entry):
+            logger.info(f"GitHub APIキャッシュヒット: {repository}")
+            github_hit_counters.incr("hits")
+            return cached_entry["commit_message"]
+
+        if _is_servable_stale(cached_entry):
+            logger.info(f"GitHub APIキャッシュ（期限切れ・バックグラウンド更新）: {repository}")
+            github_hit_counters.incr("stale_hits")
+            _schedule_refresh_sync(repository, cached_entry)
+            return cached_entry["commit_message"]
+
+    return _fetch_and_cache_sync(repository, cached_entry)
+
+def _schedule_refresh_sync(repository: str, cached_entry: Dict[str, Any]):
+    """同期版のバックグラウンド更新（専用スレッドで実行）"""
+    if not _try_mark_refreshing(repository):
+        return
+
+    def refresh():
+        try:
+            _fetch_and_cache_sync(repository, cached_entry)
+            cache_store.incr_counter(GITHUB_CACHE_STATS_KEY, "background_refreshes")
+        except Exception as e:
+            logger.warning(f"GitHubキャッシュのバックグラウンド更新失敗: {repository}, {e}")
+        finally:
+            _unmark_refreshing(repository)
+
+    _refresh_executor.submit(refresh)
+
+def _fetch_and_cache_sync(repository: str, cached_entry: Optional[Dict[str, Any]]) -> str:
+    """GitHub APIを呼び出し（条件付きリクエスト）、結果をキャッシュに保存（同期版）"""
+    cache_key = _cache_key(repository)
     url = settings.GITHUB_API_URL.format(repo=repository)
-    
-    headers = {
-        "Accept": "application/vnd.github.v3+json",
-        "User-Agent": "x-auto-post-tool/1.0"
-    }
-    
-    if hasattr(settings, 'GITHUB_TOKEN') and settings.GITHUB_TOKEN:
-        headers["Authorization"] = f"token {settings.GITHUB_TOKEN}"
-    
     try:
-        resp = requests.get(url, headers=headers, timeout=10)
-        
-        if resp.status_code == 403 and "rate limit" in resp.text.lower():
-            raise HTTPException(status_code=429, detail="GitHub APIレート制限に達しました。")
-        
-        if resp.status_code != 200:
-            error_detail = f"GitHub API エラー: {resp.status_code}"
-            try:
-                error_data = resp.json()
-                if "message" in error_data:
-                    error_detail += f" - {error_data['message']}"
-            except:
-                pass
-            raise HTTPException(status_code=resp.status_code, detail=error_detail)
-        
-        data = resp.json()
-        if not data:
-            raise HTTPException(status_code=404, detail="コミット情報が見つかりません")
-        
-        commit_message = data[0]["commit"]["message"]
-        return commit_message
-        
+        session = http_clients.get_session("github")
+        resp = github_circuit_breaker.call(lambda: github_retry.call(
+            lambda: session.get(url, headers=_build_headers(cached_entry), params={"per_page": 1}, timeout=settings.GITHUB_HTTP_TIMEOUT),
+            idempotent=True
+        ))
     except requests.exceptions.Timeout:
         raise HTTPException(status_code=408, detail="GitHub API接続タイムアウト")
     except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=503, detail=f"GitHub API接続エラー: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=503, detail=f"GitHub API接続エラー: {str(e)}")
+
+    _log_rate_limit(resp.headers)
+
+    if resp.status_code == 304 and cached_entry:
+        logger.info(f"GitHub API再検証（304 Not Modified）: {repository}")
+        cache_store.set_json(cache_key, _revalidated_entry(cached_entry), _validator_ttl())
+        cache_store.incr_counter(GITHUB_CACHE_STATS_KEY, "revalidations")
+        return cached_entry["commit_message"]
+
+    _raise_for_error(resp)
+    commit_message = _parse_commit_message(resp)
+    cache_store.incr_counter(GITHUB_CACHE_STATS_KEY, "full_fetches")
+    cache_store.set_json(cache_key, _build_cache_entry(commit_message, resp.headers), _validator_ttl())
+
+    return commit_message
+
+# ブランチ削除のpushで after に入るSHA
+ZERO_SHA = "0" * 40
+
+def _commit_sha_key(repository: str, sha: str) -> str:
+    return f"github_commit:{repository}@{sha}"
+
+def store_push_commits(payload: Dict[str, Any]) -> int:
+    """
+    pushイベントのコミットをキャッシュへ一括保存（Webhook用）
+
+    既定ブランチへのpushなら head_commit を github_commit:{repo} に書き込み、
+    以降の生成・自動投稿でGitHub APIを呼ばずに済むようにする。
+    各コミットは github_commit:{repo}@{sha} にも保存する。
+    ブランチ削除（deleted / after がゼロSHA）のpushでは既定ブランチのキャッシュを書き換えない。
+    """
+    repository = (payload.get("repository") or {}).get("full_name")
+    if not repository:
+        return 0
+
+    commits = payload.get("commits") or []
+    head_commit = payload.get("head_commit")
+    default_branch = (payload.get("repository") or {}).get("default_branch")
+    on_default_branch = payload.get("ref") == f"refs/heads/{default_branch}"
+    deleted = bool(payload.get("deleted")) or payload.get("after") == ZERO_SHA
+
+    now = time.time()
+    ttl = _validator_ttl()
+    # 1往復でまとめて書き込む
+    pipe = cache_store.client.pipeline(transaction=False)
+    for commit in commits:
+        if commit.get("id") and commit.get("message") is not None:
+            pipe.setex(
+                _commit_sha_key(repository, commit["id"]),
+                ttl,
+                json.dumps({"commit_message": commit["message"], "timestamp": now, "validated_at": now})
+            )
+
+    head_key = _cache_key(repository)
+    update_head = on_default_branch and bool(head_commit) and not deleted
+    if update_head:
+        # Webhook由来の値はETagを持たない（次の再検証はフル取得）
+        pipe.setex(head_key, ttl, json.dumps({
+            "commit_message": head_commit["message"],
+            "etag": None,
+            "last_modified": None,
+            "timestamp": now,
+            "validated_at": now
+        }))
+    pipe.execute()
+
+    # 他ワーカーのL1に残る古いコミットを無効化
+    if update_head:
+        publish_invalidation(keys=[head_key])
+
+    cache_store.incr_counter(GITHUB_CACHE_STATS_KEY, "webhook_commits", len(commits))
+    logger.info(f"GitHub Webhookからコミットをキャッシュ: {repository}, {len(commits)}件")
+    return len(commits)
+
+def _auto_post_subscription_key(repository: str) -> str:
+    return f"github_auto_post:{repository}"
+
+def set_auto_post_subscription(repository: str, user_id: int, language: str):
+    """push時の自動投稿を登録（リポジトリごとに ユーザーID → 言語）"""
+    cache_store.client.hset(_auto_post_subscription_key(repository), str(user_id), language)
+
+def remove_auto_post_subscription(repository: str, user_id: int) -> bool:
+    return bool(cache_store.client.hdel(_auto_post_subscription_key(repository), str(user_id)))
+
+def get_auto_post_subscribers(repository: str) -> Dict[int, str]:
+    """自動投稿を登録しているユーザーと言語"""
+    subscribers = cache_store.client.hgetall(_auto_post_subscription_key(repository))
+    return {int(user_id): language for user_id, language in subscribers.items()}
+
+def get_github_cache_statistics() -> Dict[str, int]:
+    """GitHubキャッシュの ヒット / 期限切れ返却 / バックグラウンド更新 / 再検証(304) / フル取得 回数"""
+    counters = github_hit_counters.get_counters()
+    return {
+        "hits": counters.get("hits", 0),
+        "stale_hits": counters.get("stale_hits", 0),
+        "background_refreshes": counters.get("background_refreshes", 0),
+        "revalidations": counters.get("revalidations", 0),
+        "full_fetches": counters.get("full_fetches", 0),
+        "webhook_commits": counters.get("webhook_commits", 0)
+    }
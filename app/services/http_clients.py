@@ -0,0 +1,300 @@
+"""
+外部API用HTTPクライアントレジストリ（コネクションプール共有）
+
+GitHub / Twitter / OpenAI ごとにキープアライブ付きのクライアントを1つずつ保持し、
+アプリケーションのlifespanで起動・終了する。
+"""
+import threading
+import time
+import weakref
+import logging
+from typing import Dict, Any, Optional, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from openai import OpenAI, AsyncOpenAI
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2はh2パッケージが必要（未インストール時はHTTP/1.1で動作）
+try:
+    import h2  # noqa: F401
+    http2_available = True
+except ImportError:
+    http2_available = False
+
+
+class UpstreamConfig:
+    """上流APIごとの接続設定"""
+    def __init__(self, name: str, base_url: str, timeout: float, max_connections: int, http2: bool = True):
+        self.name = name
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_connections
+        self.http2 = http2 and settings.HTTP_ENABLE_HTTP2 and http2_available
+
+
+def get_upstream_configs() -> Dict[str, UpstreamConfig]:
+    """設定値から上流APIごとの接続設定を生成"""
+    return {
+        "github": UpstreamConfig("github", "https://api.github.com", settings.GITHUB_HTTP_TIMEOUT, settings.GITHUB_MAX_CONNECTIONS),
+        "twitter": UpstreamConfig("twitter", "https://api.twitter.com", settings.TWITTER_HTTP_TIMEOUT, settings.TWITTER_MAX_CONNECTIONS),
+        "openai": UpstreamConfig("openai", "https://api.openai.com", settings.OPENAI_HTTP_TIMEOUT, settings.OPENAI_MAX_CONNECTIONS),
+    }
+
+
+class PoolStats:
+    """プール利用統計"""
+    def __init__(self):
+        self.requests_total = 0
+        self.active_requests = 0
+        self.errors_total = 0
+        self.connections_created = 0
+        self._seen_connections = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def on_request_start(self):
+        with self._lock:
+            self.requests_total += 1
+            self.active_requests += 1
+
+    def on_request_end(self, failed: bool = False):
+        with self._lock:
+            self.active_requests -= 1
+            if failed:
+                self.errors_total += 1
+
+    def observe_connections(self, connections):
+        """プール内の接続を観測し、新規作成された接続数を数える"""
+        with self._lock:
+            for connection in connections:
+                if connection not in self._seen_connections:
+                    self._seen_connections.add(connection)
+                    self.connections_created += 1
+
+
+def _pool_connections(transport) -> list:
+    pool = getattr(transport, "_pool", None)
+    return list(getattr(pool, "connections", []) or [])
+
+
+class InstrumentedAsyncTransport(httpx.AsyncHTTPTransport):
+    """リクエスト数・接続再利用を記録する非同期トランスポート"""
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.on_request_start()
+        failed = True
+        try:
+            response = await super().handle_async_request(request)
+            failed = False
+            return response
+        finally:
+            self.stats.on_request_end(failed)
+            self.stats.observe_connections(_pool_connections(self))
+
+
+class InstrumentedTransport(httpx.HTTPTransport):
+    """リクエスト数・接続再利用を記録する同期トランスポート"""
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.on_request_start()
+        failed = True
+        try:
+            response = super().handle_request(request)
+            failed = False
+            return response
+        finally:
+            self.stats.on_request_end(failed)
+            self.stats.observe_connections(_pool_connections(self))
+
+
+class InstrumentedSession(requests.Session):
+    """リクエスト数を記録するrequestsセッション（同期版サービス用）"""
+    def __init__(self, stats: PoolStats):
+        super().__init__()
+        self.stats = stats
+
+    def request(self, *args, **kwargs):
+        self.stats.on_request_start()
+        failed = True
+        try:
+            response = super().request(*args, **kwargs)
+            failed = False
+            return response
+        finally:
+            self.stats.on_request_end(failed)
+
+
+class HTTPClientRegistry:
+    """上流APIごとの共有HTTPクライアントを管理"""
+    def __init__(self):
+        self.configs = get_upstream_configs()
+        self._async_clients: Dict[str, httpx.AsyncClient] = {}
+        self._sync_clients: Dict[str, httpx.Client] = {}
+        self._sessions: Dict[str, requests.Session] = {}
+        self._async_openai: Optional[Tuple[httpx.AsyncClient, AsyncOpenAI]] = None
+        self._sync_openai: Optional[Tuple[httpx.Client, OpenAI]] = None
+        self._async_stats = {name: PoolStats() for name in self.configs}
+        self._sync_stats = {name: PoolStats() for name in self.configs}
+        self._lock = threading.Lock()
+        self.started_at: Optional[float] = None
+
+    def _limits(self, config: UpstreamConfig) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        )
+
+    def _create_async_client(self, name: str) -> httpx.AsyncClient:
+        config = self.configs[name]
+        transport = InstrumentedAsyncTransport(
+            self._async_stats[name],
+            http2=config.http2,
+            limits=self._limits(config),
+        )
+        return httpx.AsyncClient(transport=transport, timeout=config.timeout, http2=config.http2)
+
+    def _create_sync_client(self, name: str) -> httpx.Client:
+        config = self.configs[name]
+        transport = InstrumentedTransport(
+            self._sync_stats[name],
+            http2=config.http2,
+            limits=self._limits(config),
+        )
+        return httpx.Client(transport=transport, timeout=config.timeout, http2=config.http2)
+
+    def _create_session(self, name: str) -> requests.Session:
+        config = self.configs[name]
+        session = InstrumentedSession(self._sync_stats[name])
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.max_connections)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    async def startup(self):
+        """全上流APIのクライアントを生成（lifespan開始時）"""
+        for name in self.configs:
+            self.get_async_client(name)
+            self.get_session(name)
+        self.started_at = time.time()
+        logger.info(f"HTTPクライアントプールを起動しました (HTTP/2: {http2_available and settings.HTTP_ENABLE_HTTP2})")
+
+    async def shutdown(self):
+        """全クライアントをクローズ（lifespan終了時）"""
+        with self._lock:
+            async_clients = list(self._async_clients.values())
+            sync_clients = list(self._sync_clients.values())
+            sessions = list(self._sessions.values())
+            self._async_clients.clear()
+            self._sync_clients.clear()
+            self._sessions.clear()
+            self._async_openai = None
+            self._sync_openai = None
+        for client in async_clients:
+            await client.aclose()
+        for client in sync_clients:
+            client.close()
+        for session in sessions:
+            session.close()
+        self.started_at = None
+        logger.info("HTTPクライアントプールを終了しました")
+
+    def get_async_client(self, name: str) -> httpx.AsyncClient:
+        """非同期クライアントを取得（未起動時は遅延生成）"""
+        client = self._async_clients.get(name)
+        if client is None or client.is_closed:
+            with self._lock:
+                client = self._async_clients.get(name)
+                if client is None or client.is_closed:
+                    client = self._create_async_client(name)
+                    self._async_clients[name] = client
+        return client
+
+    def get_sync_client(self, name: str) -> httpx.Client:
+        """同期httpxクライアントを取得（OpenAI同期SDK用）"""
+        client = self._sync_clients.get(name)
+        if client is None or client.is_closed:
+            with self._lock:
+                client = self._sync_clients.get(name)
+                if client is None or client.is_closed:
+                    client = self._create_sync_client(name)
+                    self._sync_clients[name] = client
+        return client
+
+    def get_session(self, name: str) -> requests.Session:
+        """同期版サービス用のrequestsセッションを取得"""
+        session = self._sessions.get(name)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(name)
+                if session is None:
+                    session = self._create_session(name)
+                    self._sessions[name] = session
+        return session
+
+    def get_async_openai(self, api_key: str) -> AsyncOpenAI:
+        """共有プール上のAsyncOpenAIクライアントを取得（再試行は openai_retry で行うためSDK内部の再試行は無効）"""
+        http_client = self.get_async_client("openai")
+        cached = self._async_openai
+        if cached is None or cached[0] is not http_client or cached[1].api_key != api_key:
+            cached = (http_client, AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=0))
+            self._async_openai = cached
+        return cached[1]
+
+    def get_sync_openai(self, api_key: str) -> OpenAI:
+        """共有プール上のOpenAIクライアントを取得（SDK内部の再試行は無効）"""
+        http_client = self.get_sync_client("openai")
+        cached = self._sync_openai
+        if cached is None or cached[0] is not http_client or cached[1].api_key != api_key:
+            cached = (http_client, OpenAI(api_key=api_key, http_client=http_client, max_retries=0))
+            self._sync_openai = cached
+        return cached[1]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """上流APIごとのプール利用統計"""
+        upstreams = {}
+        for name, config in self.configs.items():
+            async_client = self._async_clients.get(name)
+            connections = _pool_connections(async_client._transport) if async_client else []
+            async_stats = self._async_stats[name]
+            sync_stats = self._sync_stats[name]
+            upstreams[name] = {
+                "http2": config.http2,
+                "timeout": config.timeout,
+                "max_connections": config.max_connections,
+                "async": {
+                    "requests_total": async_stats.requests_total,
+                    "active_requests": async_stats.active_requests,
+                    "errors_total": async_stats.errors_total,
+                    "connections_created": async_stats.connections_created,
+                    "connections_open": len(connections),
+                    "connections_idle": sum(1 for c in connections if c.is_idle()),
+                },
+                "sync": {
+                    "requests_total": sync_stats.requests_total,
+                    "active_requests": sync_stats.active_requests,
+                    "errors_total": sync_stats.errors_total,
+                    "connections_created": sync_stats.connections_created,
+                },
+            }
+        return {
+            "started": self.started_at is not None,
+            "uptime_seconds": round(time.time() - self.started_at, 1) if self.started_at else 0,
+            "http2_available": http2_available,
+            "upstreams": upstreams,
+        }
+
+
+# プロセス共有のレジストリ
+http_clients = HTTPClientRegistry()
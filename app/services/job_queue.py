@@ -0,0 +1,172 @@
+"""
+自動投稿ジョブキュー（Redis Streams）
+
+API は auto_post_jobs ストリームにジョブを追加して即座に202を返し、
+ワーカープロセス（app.worker）がコンシューマーグループ経由で取り出して実行する。
+ジョブの状態は auto_post_job:{job_id} ハッシュに保存し、ステータスAPIから参照する。
+投稿に成功したジョブはACK前に tweet_id をハッシュに書き込み、ACK前にワーカーが落ちて
+引き取られた場合も二重投稿しない。
+"""
+import json
+import logging
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis
+
+from app.config import settings
+from app.services.redis_pool import redis_pools
+
+logger = logging.getLogger(__name__)
+
+AUTO_POST_STREAM = "auto_post_jobs"
+AUTO_POST_GROUP = "auto_post_workers"
+JOB_STATUS_PREFIX = "auto_post_job:"
+
+# ジョブ状態
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+def _status_key(job_id: str) -> str:
+    return f"{JOB_STATUS_PREFIX}{job_id}"
+
+
+def _new_job(user_id: int, repository: str, language: str, fresh: bool, source: str) -> Tuple[str, Dict[str, Any], Dict[str, Any]]:
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    message = {
+        "job_id": job_id,
+        "user_id": str(user_id),
+        "repository": repository,
+        "language": language,
+        "fresh": "1" if fresh else "0",
+    }
+    status = {
+        **message,
+        "status": JOB_QUEUED,
+        "source": source,
+        "attempts": 0,
+        "created_at": now,
+        "updated_at": now,
+    }
+    return job_id, message, status
+
+
+def enqueue_auto_post(user_id: int, repository: str, language: str = "ja", fresh: bool = False, source: str = "api") -> str:
+    """自動投稿ジョブを追加（同期版）"""
+    job_id, message, status = _new_job(user_id, repository, language, fresh, source)
+    pipe = redis_pools.get_client().pipeline(transaction=True)
+    pipe.hset(_status_key(job_id), mapping=status)
+    pipe.expire(_status_key(job_id), settings.JOB_STATUS_TTL)
+    pipe.xadd(AUTO_POST_STREAM, message, maxlen=settings.JOB_QUEUE_MAXLEN, approximate=True)
+    pipe.execute()
+    logger.info(f"自動投稿ジョブ登録: {job_id}, リポジトリ: {repository}, ユーザー: {user_id}")
+    return job_id
+
+
+async def enqueue_auto_post_async(user_id: int, repository: str, language: str = "ja", fresh: bool = False, source: str = "api") -> str:
+    """自動投稿ジョブを追加（非同期版）"""
+    job_id, message, status = _new_job(user_id, repository, language, fresh, source)
+    pipe = redis_pools.get_async_client().pipeline(transaction=True)
+    pipe.hset(_status_key(job_id), mapping=status)
+    pipe.expire(_status_key(job_id), settings.JOB_STATUS_TTL)
+    pipe.xadd(AUTO_POST_STREAM, message, maxlen=settings.JOB_QUEUE_MAXLEN, approximate=True)
+    await pipe.execute()
+    logger.info(f"自動投稿ジョブ登録: {job_id}, リポジトリ: {repository}, ユーザー: {user_id}")
+    return job_id
+
+
+def get_job_status(job_id: str) -> Optional[Dict[str, Any]]:
+    """ジョブ状態を取得（存在しなければNone）"""
+    data = redis_pools.get_client().hgetall(_status_key(job_id))
+    if not data:
+        return None
+    if data.get("result"):
+        data["result"] = json.loads(data["result"])
+    data["attempts"] = int(data.get("attempts", 0))
+    data["fresh"] = data.get("fresh") == "1"
+    for field in ("created_at", "updated_at"):
+        if field in data:
+            data[field] = float(data[field])
+    return data
+
+
+class AutoPostJobStore:
+    """ワーカー側のストリーム操作（redis.asyncio）"""
+    def __init__(self, consumer: str):
+        self.consumer = consumer
+
+    @property
+    def client(self):
+        return redis_pools.get_async_client()
+
+    async def ensure_group(self):
+        try:
+            await self.client.xgroup_create(AUTO_POST_STREAM, AUTO_POST_GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def read(self, count: int) -> List[Tuple[str, Dict[str, str]]]:
+        """未配信のジョブを最大count件取得（ソケットタイムアウトより短くブロック）"""
+        response = await self.client.xreadgroup(
+            AUTO_POST_GROUP, self.consumer, {AUTO_POST_STREAM: ">"},
+            count=count, block=settings.JOB_QUEUE_BLOCK_MS
+        )
+        if not response:
+            return []
+        return response[0][1]
+
+    async def reclaim(self, count: int) -> List[Tuple[str, Dict[str, str]]]:
+        """処理中のままワーカーが落ちたジョブを引き取る（XAUTOCLAIM）"""
+        _, messages, *_ = await self.client.xautoclaim(
+            AUTO_POST_STREAM, AUTO_POST_GROUP, self.consumer,
+            min_idle_time=settings.JOB_VISIBILITY_TIMEOUT * 1000,
+            start_id="0-0", count=count
+        )
+        # 削除済みメッセージは None で返る
+        return [(message_id, fields) for message_id, fields in messages if fields]
+
+    async def start_attempt(self, job_id: str) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """試行回数を加算し、(試行回数, 投稿済みなら前回の結果) を返す"""
+        key = _status_key(job_id)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hincrby(key, "attempts", 1)
+        pipe.hset(key, mapping={"status": JOB_RUNNING, "worker": self.consumer, "updated_at": time.time()})
+        pipe.hmget(key, "tweet_id", "result")
+        attempts, _, (tweet_id, result) = await pipe.execute()
+        if not tweet_id:
+            return attempts, None
+        return attempts, json.loads(result) if result else {"tweet_id": tweet_id}
+
+    async def record_posted(self, job_id: str, result: Dict[str, Any]):
+        """投稿済みの結果を保存（ACK前に呼び、引き取り時の再投稿を防ぐ）"""
+        tweet_id = ((result.get("tweet_response") or {}).get("data") or {}).get("id")
+        await self.client.hset(_status_key(job_id), mapping={
+            "tweet_id": tweet_id or "",
+            "result": json.dumps(result, ensure_ascii=False),
+            "updated_at": time.time()
+        })
+
+    async def release(self, job_id: str, error: str):
+        """一時的な失敗: ACKせずに待機中へ戻す（メッセージは引き取りで再配信される）"""
+        await self.client.hset(_status_key(job_id), mapping={
+            "status": JOB_QUEUED, "error": error, "updated_at": time.time()
+        })
+
+    async def finish(self, message_id: str, job_id: str, status: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        """ジョブ状態を確定してACK"""
+        fields: Dict[str, Any] = {"status": status, "updated_at": time.time()}
+        if result is not None:
+            fields["result"] = json.dumps(result, ensure_ascii=False)
+        if error is not None:
+            fields["error"] = error
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(_status_key(job_id), mapping=fields)
+        pipe.expire(_status_key(job_id), settings.JOB_STATUS_TTL)
+        pipe.xack(AUTO_POST_STREAM, AUTO_POST_GROUP, message_id)
+        await pipe.execute()
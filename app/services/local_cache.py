@@ -0,0 +1,213 @@
+"""
+プロセス内L1キャッシュ（TTL + LRU + メモリ上限）
+
+github_commit:* / openai_tweet:* のRedisキャッシュ（L2）の手前に置き、
+ヒット時のRedis往復と json.loads を省く。
+無効化はRedis pub/subで全ワーカーに配信する（/api/system/cache/clear など）。
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from app.config import settings
+from app.services.redis_pool import redis_pools
+
+logger = logging.getLogger(__name__)
+
+# L1に載せるキーのプレフィックス
+L1_KEY_PREFIXES = ("github_commit:", "openai_tweet:")
+
+# 無効化通知チャンネル
+CACHE_INVALIDATION_CHANNEL = "cache_invalidation"
+
+
+class TierStats:
+    """キャッシュ階層ごとのヒット・ミス統計（スレッドプールから同時に加算されるためロックで保護）"""
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+        }
+
+
+class LocalTTLCache:
+    """エントリ数とおおよそのバイト数で上限化したTTL付きLRUキャッシュ（スレッドセーフ）"""
+    def __init__(self, max_entries: int, max_bytes: int, default_ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        # key -> (値, 失効時刻, サイズ)
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = TierStats()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.miss()
+                return None
+            value, expires_at, _ = entry
+            if expires_at <= now:
+                self._remove(key)
+                self.stats.miss()
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hit()
+            return value
+
+    def set(self, key: str, value: Any, size: int, ttl: Optional[float] = None):
+        ttl = self.default_ttl if ttl is None else min(ttl, self.default_ttl)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl, size)
+            self._bytes += size
+            # LRU順に上限まで追い出す
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear_prefixes(self, prefixes: Iterable[str]) -> int:
+        """プレフィックスに一致するエントリを削除"""
+        prefixes = tuple(prefixes)
+        with self._lock:
+            keys = [key for key in self._entries if key.startswith(prefixes)]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats.to_dict(),
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+
+def is_l1_key(key: str) -> bool:
+    return settings.ENABLE_L1_CACHE and key.startswith(L1_KEY_PREFIXES)
+
+
+# プロセス共有のL1キャッシュと、L1対象キーのRedis（L2）統計
+l1_cache = LocalTTLCache(
+    max_entries=settings.L1_CACHE_MAX_ENTRIES,
+    max_bytes=settings.L1_CACHE_MAX_BYTES,
+    default_ttl=settings.L1_CACHE_TTL,
+)
+l2_stats = TierStats()
+
+
+def get_tier_statistics() -> Dict[str, Any]:
+    """階層別ヒット率（このワーカーの値）"""
+    return {
+        "l1": l1_cache.to_dict(),
+        "l2": l2_stats.to_dict(),
+    }
+
+
+def publish_invalidation(prefixes: Iterable[str] = (), keys: Iterable[str] = ()):
+    """全ワーカーにL1無効化を通知（自プロセスは即時削除）"""
+    prefixes = list(prefixes)
+    keys = list(keys)
+    l1_cache.clear_prefixes(prefixes)
+    for key in keys:
+        l1_cache.delete(key)
+    try:
+        redis_pools.get_client().publish(CACHE_INVALIDATION_CHANNEL, json.dumps({"prefixes": prefixes, "keys": keys}))
+    except Exception as e:
+        logger.warning(f"キャッシュ無効化通知エラー: {e}")
+
+
+class CacheInvalidationListener:
+    """無効化チャンネルを購読し、受信したプレフィックスをL1から削除する"""
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if settings.ENABLE_L1_CACHE and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            pubsub = None
+            try:
+                pubsub = redis_pools.get_async_client().pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+                # 購読が切れていた間の更新を取りこぼさないよう、(再)接続時はL1を空にする
+                l1_cache.clear_prefixes(L1_KEY_PREFIXES)
+                async for message in pubsub.listen():
+                    self._handle(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"キャッシュ無効化購読エラー（再接続します）: {e}")
+                await asyncio.sleep(1)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+
+    def _handle(self, message: Dict[str, Any]):
+        try:
+            payload = json.loads(message["data"])
+            removed = l1_cache.clear_prefixes(payload.get("prefixes", []))
+            for key in payload.get("keys", []):
+                l1_cache.delete(key)
+            logger.info(f"L1キャッシュ無効化: {payload.get('prefixes')} {payload.get('keys', [])[:5]}, {removed}件削除")
+        except Exception as e:
+            logger.warning(f"キャッシュ無効化メッセージ処理エラー: {e}")
+
+
+cache_invalidation_listener = CacheInvalidationListener()
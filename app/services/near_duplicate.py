@@ -0,0 +1,148 @@
+"""
+類似ツイート索引（SimHash）
+
+ハッシュタグ・絵文字・句読点だけが異なるツイート案を検出する。
+正規化した本文の文字3-gramから64ビットSimHashを計算し、16ビットずつ4バンドに分けて
+バンド値ごとのソート済みセット tweet_simhash:{user_id}:{バンド番号}:{バンド値}
+（メンバー=署名、スコア=投稿時刻）に保存する。
+
+ハミング距離が3以下の署名は鳩の巣原理により必ずいずれかのバンドが一致するため、
+4バンド分の ZRANGEBYSCORE を1往復で実行し、返った候補だけを距離計算すれば取りこぼしがない。
+このため NEAR_DUPLICATE_MAX_DISTANCE は 0〜3（SIMHASH_BANDS - 1）に制限している（config で検証）。
+"""
+import hashlib
+import re
+import time
+from collections import Counter
+from typing import Iterable, Optional
+
+from app.config import settings
+from app.services.cache_store import cache_store, async_cache_store
+from app.services.duplicate_index import DEDUP_WINDOW_SECONDS, normalize_tweet_text
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4
+BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+SHINGLE_SIZE = 3
+
+SIMHASH_KEY_PREFIX = "tweet_simhash:"
+SIMHASH_SHARED_OWNER = "shared"
+
+_URL = re.compile(r"https?://\S+")
+_HASHTAG_OR_MENTION = re.compile(r"[#＃@]\w+")
+_SYMBOLS = re.compile(r"[^\w\s]|_")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _canonical_text(text: str) -> str:
+    """URL・ハッシュタグ・メンション・記号（絵文字含む）を除いた本文"""
+    text = normalize_tweet_text(text)
+    text = _URL.sub(" ", text)
+    text = _HASHTAG_OR_MENTION.sub(" ", text)
+    text = _SYMBOLS.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def _shingles(text: str) -> Iterable[str]:
+    if len(text) <= SHINGLE_SIZE:
+        return [text] if text else []
+    return (text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1))
+
+
+def shingle_set(text: str) -> frozenset:
+    """正規化した本文の文字3-gram集合（候補ランキングの重なり計算用）"""
+    return frozenset(_shingles(_canonical_text(text)))
+
+
+def simhash(text: str) -> int:
+    """本文の64ビットSimHash（特徴がない場合は0）"""
+    weights = [0] * SIMHASH_BITS
+    features = Counter(_shingles(_canonical_text(text)))
+    if not features:
+        return 0
+    for feature, count in features.items():
+        value = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            if value >> bit & 1:
+                weights[bit] += count
+            else:
+                weights[bit] -= count
+
+    signature = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            signature |= 1 << bit
+    return signature
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _band_keys(owner, signature: int):
+    return [
+        f"{SIMHASH_KEY_PREFIX}{owner}:{band}:{(signature >> (band * BAND_BITS)) & BAND_MASK:04x}"
+        for band in range(SIMHASH_BANDS)
+    ]
+
+
+def _owners(user_id: Optional[int]):
+    if user_id is None:
+        return [SIMHASH_SHARED_OWNER]
+    return [user_id, SIMHASH_SHARED_OWNER]
+
+
+def add_to_pipeline(pipe, user_id: Optional[int], tweet_text: str, timestamp: float):
+    """投稿履歴の保存と同じパイプラインで署名を登録"""
+    signature = simhash(tweet_text)
+    if signature:
+        add_signature_to_pipeline(pipe, user_id, signature, timestamp)
+
+
+def add_signature_to_pipeline(pipe, user_id: Optional[int], signature: int, timestamp: float):
+    owner = SIMHASH_SHARED_OWNER if user_id is None else user_id
+    member = f"{signature:016x}"
+    for key in _band_keys(owner, signature):
+        pipe.zadd(key, {member: timestamp})
+        pipe.zremrangebyscore(key, "-inf", timestamp - DEDUP_WINDOW_SECONDS)
+        pipe.expire(key, DEDUP_WINDOW_SECONDS)
+
+
+def _queue_lookup(pipe, user_id: Optional[int], signature: int, window_hours: int):
+    threshold = time.time() - window_hours * 3600
+    for owner in _owners(user_id):
+        for key in _band_keys(owner, signature):
+            pipe.zrangebyscore(key, threshold, "+inf")
+
+
+def _closest_distance(signature: int, results) -> Optional[int]:
+    closest = None
+    for members in results:
+        for member in members:
+            distance = hamming_distance(signature, int(member, 16))
+            if closest is None or distance < closest:
+                closest = distance
+    if closest is not None and closest <= settings.NEAR_DUPLICATE_MAX_DISTANCE:
+        return closest
+    return None
+
+
+def find_near_duplicate(tweet_text: str, user_id: Optional[int] = None, window_hours: int = 24) -> Optional[int]:
+    """しきい値以内の類似投稿があればハミング距離を返す（なければNone）"""
+    signature = simhash(tweet_text)
+    if not signature:
+        return None
+    pipe = cache_store.client.pipeline(transaction=False)
+    _queue_lookup(pipe, user_id, signature, window_hours)
+    return _closest_distance(signature, pipe.execute())
+
+
+async def find_near_duplicate_async(tweet_text: str, user_id: Optional[int] = None, window_hours: int = 24) -> Optional[int]:
+    """類似投稿検索（非同期版）"""
+    signature = simhash(tweet_text)
+    if not signature:
+        return None
+    pipe = async_cache_store.client.pipeline(transaction=False)
+    _queue_lookup(pipe, user_id, signature, window_hours)
+    return _closest_distance(signature, await pipe.execute())
@@ -1,26 +1,35 @@
 import os
-import redis
-import json
 import time
+import json
+import asyncio
 import hashlib
-from typing import Optional, AsyncIterator
+import tempfile
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, AsyncIterator, Tuple
+import openai
 from fastapi import HTTPException
-from openai import OpenAI, AsyncOpenAI
 from app.config import settings
+from app.services.http_clients import http_clients
+from app.services.cache_store import cache_store, async_cache_store
+from app.services.stats_buffer import BufferedCounters
+from app.utils.single_flight import SingleFlight
+from app.utils.adaptive_limiter import AdaptiveLimiter
+from app.utils.circuit_breaker import CircuitOpenError, openai_circuit_breaker
+from app.utils.retry import RetryPolicy, header_retry_after
+from app.utils.commit_message import canonical_commit_message, canonicalize_commit_message, fit_commit_message
+from app.utils.tweet_length import fit_to_limit, trim_to_limit, truncate_to_limit, weighted_length
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Redisクライアント（キャッシュ用）
-# Redis接続（本番環境対応）
-def get_redis_client():
-    redis_url = settings.get_redis_url()
-    if settings.REDIS_URL:
-        return redis.from_url(redis_url, decode_responses=True)
-    else:
-        return redis.from_url(settings.get_redis_url(), decode_responses=True)
+# OpenAI API呼び出しの再試行（同じプロンプトの再送は二重投稿などの副作用がないため冪等として扱う）
+openai_retry = RetryPolicy("openai")
 
-redis_client = get_redis_client()
+# キャッシュキー単位の生成集約（ロックはHTTPタイムアウトより少し長く保持）
+openai_single_flight = SingleFlight("openai", lock_ttl=settings.OPENAI_HTTP_TIMEOUT + 5)
 
 def get_openai_api_key():
     api_key = settings.OPENAI_API_KEY
@@ -28,13 +37,138 @@ def get_openai_api_key():
         raise HTTPException(status_code=500, detail="OpenAI APIキーが設定されていません")
     return api_key
 
+OPENAI_MODEL = "gpt-4o-mini"
+# _build_optimized_prompt を変更したら上げる（旧プロンプトのキャッシュを使わないため）
+PROMPT_VERSION = "p3"
+
+# 生成したツイート案が境界で切り詰められないほど長い場合の再生成回数
+MAX_LENGTH_REGENERATIONS = 1
+
+# キャッシュ参照の統計（全ワーカー共通のRedisハッシュ）
+OPENAI_CACHE_STATS_KEY = "openai_cache_stats"
+openai_cache_counters = BufferedCounters(OPENAI_CACHE_STATS_KEY)
+# トークン使用量（日別のRedisハッシュ、UTC日付）
+OPENAI_USAGE_KEY_PREFIX = "openai_usage"
+
+@lru_cache(maxsize=1024)
+def _prompt_commit_message(commit_message: str, token_budget: int) -> Tuple[str, bool]:
+    """プロンプトに入れるコミットメッセージ（正規化後、token_budget に収める）と切り詰めたかどうか
+
+    token_budget は settings.OPENAI_COMMIT_TOKEN_BUDGET を渡す（予算もキャッシュのキーに含める）。
+    """
+    return fit_commit_message(canonical_commit_message(commit_message), token_budget)
+
 def _create_cache_key(commit_message: str, repository: str, language: str) -> str:
-    """キャッシュキーを生成"""
-    content = f"{commit_message}:{repository}:{language}"
-    return f"openai_tweet:{hashlib.md5(content.encode()).hexdigest()}"
+    """キャッシュキーを生成（プロンプトに入るコミットメッセージ + プロンプト/モデルのバージョン）"""
+    content = f"{_prompt_commit_message(commit_message, settings.OPENAI_COMMIT_TOKEN_BUDGET)[0]}:{repository}:{language}"
+    return f"openai_tweet:{PROMPT_VERSION}:{OPENAI_MODEL}:{hashlib.md5(content.encode()).hexdigest()}"
+
+def _cache_stat_fields(commit_message: str, hit: bool) -> List[str]:
+    """hits / misses と、正規化で入力が変化した理由ごとの内訳フィールド"""
+    outcome = "hits" if hit else "misses"
+    reasons = canonicalize_commit_message(commit_message)[1] or ["unchanged"]
+    return [outcome] + [f"{outcome}:{reason}" for reason in reasons]
+
+def _count_cache_lookups(lookups: Iterable[Tuple[str, bool]]) -> Counter:
+    counts = Counter()
+    for commit_message, hit in lookups:
+        counts.update(_cache_stat_fields(commit_message, hit))
+    return counts
+
+def _record_cache_lookups(lookups: Iterable[Tuple[str, bool]]):
+    # ヒット経路でRedisを呼ばない（プロセス内で数えて一定間隔でまとめて加算）
+    openai_cache_counters.update(_count_cache_lookups(lookups))
+
+def get_openai_cache_statistics() -> Dict[str, Any]:
+    """OpenAIキャッシュのヒット/ミス回数と、正規化理由ごとの内訳"""
+    counters = openai_cache_counters.get_counters()
+    hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+    by_reason = {}
+    for field, value in counters.items():
+        if ":" in field:
+            outcome, reason = field.split(":", 1)
+            by_reason.setdefault(reason, {"hits": 0, "misses": 0})[outcome] = value
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+        "by_reason": by_reason,
+        "prompt_version": PROMPT_VERSION,
+        "model": OPENAI_MODEL
+    }
+
+def _usage_key(day: Optional[datetime] = None) -> str:
+    return f"{OPENAI_USAGE_KEY_PREFIX}:{(day or datetime.now(timezone.utc)).strftime('%Y%m%d')}"
+
+def _usage_fields(usage, latency_ms: float, truncated: bool) -> Dict[str, int]:
+    return {
+        "requests": 1,
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "latency_ms": int(latency_ms),
+        "truncated_prompts": int(truncated),
+    }
+
+def _log_usage(kind: str, fields: Dict[str, int]):
+    logger.info(
+        f"OpenAI API使用量({kind}): prompt={fields['prompt_tokens']} completion={fields['completion_tokens']} "
+        f"latency={fields['latency_ms']}ms truncated={bool(fields['truncated_prompts'])}"
+    )
+
+def _record_usage(kind: str, commit_message: str, usage, started: float):
+    """1リクエストのトークン数・レイテンシを日別カウンタに加算"""
+    fields = _usage_fields(usage, (time.perf_counter() - started) * 1000, _prompt_commit_message(commit_message, settings.OPENAI_COMMIT_TOKEN_BUDGET)[1])
+    _log_usage(kind, fields)
+    try:
+        key = _usage_key()
+        pipe = cache_store.client.pipeline(transaction=False)
+        for field, amount in fields.items():
+            pipe.hincrby(key, field, amount)
+        pipe.expire(key, settings.OPENAI_USAGE_RETENTION_DAYS * 86400)
+        pipe.execute()
+    except Exception as e:
+        logger.debug(f"使用量統計更新エラー: {e}")
+
+async def _record_usage_async(kind: str, commit_message: str, usage, started: float):
+    fields = _usage_fields(usage, (time.perf_counter() - started) * 1000, _prompt_commit_message(commit_message, settings.OPENAI_COMMIT_TOKEN_BUDGET)[1])
+    _log_usage(kind, fields)
+    try:
+        key = _usage_key()
+        pipe = async_cache_store.client.pipeline(transaction=False)
+        for field, amount in fields.items():
+            pipe.hincrby(key, field, amount)
+        pipe.expire(key, settings.OPENAI_USAGE_RETENTION_DAYS * 86400)
+        await pipe.execute()
+    except Exception as e:
+        logger.debug(f"使用量統計更新エラー: {e}")
+
+def get_openai_usage_statistics(days: int = 7) -> Dict[str, Any]:
+    """直近 days 日分（UTC）の日別トークン使用量と平均レイテンシ"""
+    today = datetime.now(timezone.utc)
+    daily = []
+    for offset in range(max(1, min(days, settings.OPENAI_USAGE_RETENTION_DAYS))):
+        day = today - timedelta(days=offset)
+        counters = cache_store.get_counters(_usage_key(day))
+        requests = counters.get("requests", 0)
+        daily.append({
+            "date": day.strftime("%Y-%m-%d"),
+            "requests": requests,
+            "bulk_requests": counters.get("bulk_requests", 0),
+            "prompt_tokens": counters.get("prompt_tokens", 0),
+            "completion_tokens": counters.get("completion_tokens", 0),
+            "truncated_prompts": counters.get("truncated_prompts", 0),
+            "avg_latency_ms": counters.get("latency_ms", 0) / requests if requests else 0.0,
+        })
+    return {
+        "model": OPENAI_MODEL,
+        "prompt_version": PROMPT_VERSION,
+        "commit_token_budget": settings.OPENAI_COMMIT_TOKEN_BUDGET,
+        "daily": daily
+    }
 
 def _build_optimized_prompt(commit_message: str, repository: str, language: str) -> str:
     """最適化されたプロンプトを構築"""
+    commit_message = _prompt_commit_message(commit_message, settings.OPENAI_COMMIT_TOKEN_BUDGET)[0]
     # プロンプトをより効率的に構築（トークン数削減）
     if language == 'en':
         return f"""Create engaging tweet (max 140 chars) for:
@@ -48,6 +182,35 @@ Include hashtags."""
 コミット: {commit_message}
 要件: ハッシュタグ含む、個人開発者風、熱量のある表現"""
 
+def _completion_params(
+    commit_message: str, repository: str, language: str, n: int = 1, stream: bool = False
+) -> Dict[str, Any]:
+    """ツイート生成のChat Completionsパラメータ（リアルタイム・ストリーミング・バルク共通）
+
+    ストリーミングも同じキャッシュキーに保存するため、サンプリング設定は必ずここで揃える。
+    """
+    params = {
+        "model": OPENAI_MODEL,  # GPT-4o-mini: より安価で高性能
+        "messages": [{"role": "user", "content": _build_optimized_prompt(commit_message, repository, language)}],
+        "max_tokens": 80,  # トークン数削減
+        "temperature": 0.7,  # 一貫性向上
+        "top_p": 0.9,  # 品質向上
+    }
+    if n > 1:
+        # 候補生成: 入力トークンは1回分で済み、候補ごとの差を出すため温度を上げる
+        params.update(n=n, temperature=0.9)
+    if stream:
+        # 最後のチャンクにトークン数が入る
+        params.update(stream=True, stream_options={"include_usage": True})
+    return params
+
+def _tweet_cache_data(tweet: str) -> Dict[str, Any]:
+    return {
+        "tweet": tweet,
+        "timestamp": time.time(),
+        "model": OPENAI_MODEL
+    }
+
 async def generate_tweet_with_openai_async(
     commit_message: str, 
     repository: str, 
@@ -58,140 +221,485 @@ async def generate_tweet_with_openai_async(
     cache_key = _create_cache_key(commit_message, repository, language)
     
     # キャッシュ確認（24時間キャッシュ）
-    if use_cache:
-        try:
-            cached_data = redis_client.get(cache_key)
-            if cached_data:
-                logger.info(f"OpenAI APIキャッシュヒット: {cache_key[:20]}...")
-                return json.loads(cached_data)["tweet"]
-        except Exception as e:
-            logger.warning(f"キャッシュ取得エラー: {e}")
-    
-    client = AsyncOpenAI(api_key=get_openai_api_key())
-    prompt = _build_optimized_prompt(commit_message, repository, language)
+    if not use_cache:
+        return await _generate_and_cache_async(commit_message, repository, language, cache_key, use_cache)
+
+    cached_data = await async_cache_store.get_json(cache_key)
+    _record_cache_lookups([(commit_message, bool(cached_data))])
+    if cached_data:
+        logger.info(f"OpenAI APIキャッシュヒット: {cache_key[:20]}...")
+        return cached_data["tweet"]
+
+    async def lookup() -> Optional[str]:
+        data = await async_cache_store.get_json(cache_key, local=False)
+        return data["tweet"] if data else None
+
+    # 同一コミット・リポジトリ・言語の同時キャッシュミスは1回の生成に集約
+    return await openai_single_flight.do(
+        cache_key,
+        lambda: _generate_and_cache_async(commit_message, repository, language, cache_key, use_cache),
+        lookup
+    )
+
+async def _generate_and_cache_async(
+    commit_message: str,
+    repository: str,
+    language: str,
+    cache_key: str,
+    use_cache: bool
+) -> str:
+    """OpenAI APIでツイート案を生成し、キャッシュに保存"""
+    client = http_clients.get_async_openai(get_openai_api_key())
     
     try:
-        # GPT-4o-miniを使用（コスト効率が良い）
-        response = await client.chat.completions.create(
-            model="gpt-4o-mini",  # より安価で高性能
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=80,  # トークン数削減
-            temperature=0.7,  # 一貫性向上
-            top_p=0.9,  # 品質向上
-        )
-        
-        content = response.choices[0].message.content if response.choices[0].message else None
-        if content is None:
-            raise HTTPException(status_code=500, detail="OpenAI APIからツイート案の生成に失敗しました")
-        
-        tweet = content.strip()
+        tweet = await _request_tweet_async(client, commit_message, repository, language)
         
         # キャッシュに保存（24時間）
         if use_cache:
-            try:
-                cache_data = {
-                    "tweet": tweet,
-                    "timestamp": time.time(),
-                    "model": "gpt-4o-mini"
-                }
-                redis_client.setex(cache_key, 86400, json.dumps(cache_data))
-                logger.info(f"OpenAI APIレスポンスをキャッシュ: {cache_key[:20]}...")
-            except Exception as e:
-                logger.warning(f"キャッシュ保存エラー: {e}")
+            await _cache_tweet_async(cache_key, tweet)
         
         return tweet
         
+    except CircuitOpenError:
+        raise
     except Exception as e:
         logger.error(f"OpenAI API非同期エラー: {str(e)}")
         raise HTTPException(status_code=500, detail=f"OpenAI APIエラー: {str(e)}")
 
+def _response_content(response) -> str:
+    content = response.choices[0].message.content if response.choices[0].message else None
+    if content is None:
+        raise HTTPException(status_code=500, detail="OpenAI APIからツイート案の生成に失敗しました")
+    return content.strip()
+
+def _fit_or_none(tweet: str, attempt: int) -> Optional[str]:
+    """文字数上限に収めたツイート案（境界で切り詰められず再生成すべき場合はNone、再生成後は強制的に収める）"""
+    fitted = trim_to_limit(tweet)
+    if fitted is not None:
+        return fitted
+    if attempt < MAX_LENGTH_REGENERATIONS:
+        logger.info(f"ツイート案が文字数上限を超えたため再生成: {weighted_length(tweet)}")
+        return None
+    return truncate_to_limit(tweet)
+
+async def _request_tweet_async(client, commit_message: str, repository: str, language: str, retry: bool = True) -> str:
+    """ツイート案を1件生成（OpenAI SDKの例外はそのまま送出）
+
+    retry=False の場合は再試行せず1回だけ呼び出す（一括生成は AdaptiveLimiter 側で再試行する）。
+    """
+    params = _completion_params(commit_message, repository, language)
+    for attempt in range(MAX_LENGTH_REGENERATIONS + 1):
+        started = time.perf_counter()
+        if retry:
+            response = await openai_circuit_breaker.call_async(
+                lambda: openai_retry.call_async(lambda: client.chat.completions.create(**params), idempotent=True)
+            )
+        else:
+            response = await openai_circuit_breaker.call_async(lambda: client.chat.completions.create(**params))
+        await _record_usage_async("async", commit_message, getattr(response, "usage", None), started)
+        
+        tweet = _fit_or_none(_response_content(response), attempt)
+        if tweet is not None:
+            return tweet
+
+async def _cache_tweet_async(cache_key: str, tweet: str):
+    if await async_cache_store.set_json(cache_key, _tweet_cache_data(tweet), 86400):
+        logger.info(f"OpenAI APIレスポンスをキャッシュ: {cache_key[:20]}...")
+
+async def get_cached_tweet_async(commit_message: str, repository: str, language: str = 'ja') -> Optional[str]:
+    """キャッシュ済みのツイート案（なければNone）"""
+    cached_data = await async_cache_store.get_json(_create_cache_key(commit_message, repository, language))
+    _record_cache_lookups([(commit_message, bool(cached_data))])
+    return cached_data["tweet"] if cached_data else None
+
 async def generate_tweet_stream_async(
     commit_message: str, 
     repository: str, 
-    language: str = 'ja'
+    language: str = 'ja',
+    use_cache: bool = True
 ) -> AsyncIterator[str]:
-    """ストリーミング版（リアルタイム表示用）"""
-    client = AsyncOpenAI(api_key=get_openai_api_key())
-    prompt = _build_optimized_prompt(commit_message, repository, language)
+    """ストリーミング版（リアルタイム表示用）
+
+    受信したトークンを順に返しつつ全文を組み立て、最後まで受信できた場合のみ
+    generate_tweet_with_openai_async と同じキャッシュキーに保存する。
+    """
+    client = http_clients.get_async_openai(get_openai_api_key())
+    params = _completion_params(commit_message, repository, language, stream=True)
+    parts = []
+    usage = None
+    started = time.perf_counter()
     
     try:
-        stream = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=80,
-            temperature=0.7,
-            stream=True
-        )
+        # 再試行はストリーム開始まで（受信を始めたトークンは送信済みのため再送しない）
+        stream = await openai_circuit_breaker.call_async(lambda: openai_retry.call_async(
+            lambda: client.chat.completions.create(**params), idempotent=True
+        ))
         
         async for chunk in stream:
-            if chunk.choices[0].delta.content is not None:
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content is not None:
+                parts.append(chunk.choices[0].delta.content)
                 yield chunk.choices[0].delta.content
                 
+    except CircuitOpenError:
+        raise
     except Exception as e:
         logger.error(f"OpenAI APIストリーミングエラー: {str(e)}")
         raise HTTPException(status_code=500, detail=f"OpenAI APIストリーミングエラー: {str(e)}")
 
+    await _record_usage_async("stream", commit_message, usage, started)
+    # 送信済みのトークンは取り消せないため再生成はせず、切り詰めた全文をキャッシュする
+    tweet = fit_to_limit("".join(parts).strip())
+    if use_cache and tweet:
+        await _cache_tweet_async(_create_cache_key(commit_message, repository, language), tweet)
+
 def generate_tweet_with_openai(commit_message: str, repository: str, language: str = 'ja') -> str:
     """同期版（後方互換性のため保持）"""
     cache_key = _create_cache_key(commit_message, repository, language)
     
     # キャッシュ確認
-    try:
-        cached_data = redis_client.get(cache_key)
-        if cached_data:
-            logger.info(f"OpenAI APIキャッシュヒット: {cache_key[:20]}...")
-            return json.loads(cached_data)["tweet"]
-    except Exception as e:
-        logger.warning(f"キャッシュ取得エラー: {e}")
+    cached_data = cache_store.get_json(cache_key)
+    _record_cache_lookups([(commit_message, bool(cached_data))])
+    if cached_data:
+        logger.info(f"OpenAI APIキャッシュヒット: {cache_key[:20]}...")
+        return cached_data["tweet"]
     
-    client = OpenAI(api_key=get_openai_api_key())
-    prompt = _build_optimized_prompt(commit_message, repository, language)
+    client = http_clients.get_sync_openai(get_openai_api_key())
+    
+    params = _completion_params(commit_message, repository, language)
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=80,
-            temperature=0.7,
-            top_p=0.9,
-        )
-        
-        content = response.choices[0].message.content if response.choices[0].message else None
-        if content is None:
-            raise HTTPException(status_code=500, detail="OpenAI APIからツイート案の生成に失敗しました")
-        
-        tweet = content.strip()
+        for attempt in range(MAX_LENGTH_REGENERATIONS + 1):
+            started = time.perf_counter()
+            response = openai_circuit_breaker.call(
+                lambda: openai_retry.call(lambda: client.chat.completions.create(**params), idempotent=True)
+            )
+            _record_usage("sync", commit_message, getattr(response, "usage", None), started)
+            
+            tweet = _fit_or_none(_response_content(response), attempt)
+            if tweet is not None:
+                break
         
         # キャッシュに保存
-        try:
-            cache_data = {
-                "tweet": tweet,
-                "timestamp": time.time(),
-                "model": "gpt-4o-mini"
-            }
-            redis_client.setex(cache_key, 86400, json.dumps(cache_data))
-        except Exception as e:
-            logger.warning(f"キャッシュ保存エラー: {e}")
+        cache_data = {
+            "tweet": tweet,
+            "timestamp": time.time(),
+            "model": OPENAI_MODEL
+        }
+        cache_store.set_json(cache_key, cache_data, 86400)
         
         return tweet
         
+    except CircuitOpenError:
+        raise
     except Exception as e:
         logger.error(f"OpenAI API同期エラー: {str(e)}")
         raise HTTPException(status_code=500, detail=f"OpenAI APIエラー: {str(e)}")
 
-def batch_generate_tweets(requests: list, language: str = 'ja') -> list:
-    """複数のツイート案を一括生成（効率向上）"""
-    results = []
-    client = OpenAI(api_key=get_openai_api_key())
-    
-    for req in requests:
-        commit_message = req.get("commit_message")
-        repository = req.get("repository")
-        
+def _create_candidates_cache_key(commit_message: str, repository: str, language: str) -> str:
+    """候補一式のキャッシュキー（単一ツイート案とは別キー、候補数に依存しない）"""
+    return "openai_tweet_candidates:" + _create_cache_key(commit_message, repository, language).split(":", 1)[1]
+
+def generate_tweet_candidates(commit_message: str, repository: str, language: str = 'ja', n: int = 3) -> List[str]:
+    """ツイート案の候補を n 件生成（1回のリクエストで n 件を受け取り、候補一式を1キーにキャッシュ）
+
+    キャッシュ済みの候補が n 件以上あればAPIを呼ばずにその先頭 n 件を返す。
+    """
+    n = max(1, min(n, settings.OPENAI_MAX_CANDIDATES))
+    cache_key = _create_candidates_cache_key(commit_message, repository, language)
+
+    cached_data = cache_store.get_json(cache_key)
+    # 重複除去で n 件未満になった候補一式も、同じ n で生成済みならヒットとする
+    hit = bool(cached_data) and cached_data.get("requested", len(cached_data["candidates"])) >= n
+    _record_cache_lookups([(commit_message, hit)])
+    if hit:
+        logger.info(f"OpenAI API候補キャッシュヒット: {cache_key[:30]}...")
+        return cached_data["candidates"][:n]
+
+    client = http_clients.get_sync_openai(get_openai_api_key())
+    try:
+        started = time.perf_counter()
+        params = _completion_params(commit_message, repository, language, n)
+        response = openai_circuit_breaker.call(
+            lambda: openai_retry.call(lambda: client.chat.completions.create(**params), idempotent=True)
+        )
+        _record_usage("candidates", commit_message, getattr(response, "usage", None), started)
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        logger.error(f"OpenAI API候補生成エラー: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"OpenAI APIエラー: {str(e)}")
+
+    candidates = []
+    for choice in response.choices:
+        # 候補は複数あるため再生成はせず、上限を超えたものは切り詰める
+        content = fit_to_limit(choice.message.content) if choice.message and choice.message.content else ""
+        if content and content not in candidates:
+            candidates.append(content)
+    if not candidates:
+        raise HTTPException(status_code=500, detail="OpenAI APIからツイート案の生成に失敗しました")
+
+    cache_store.set_json(cache_key, {
+        "candidates": candidates,
+        "requested": n,
+        "timestamp": time.time(),
+        "model": OPENAI_MODEL
+    }, 86400)
+    return candidates
+
+def _retry_after(error: openai.RateLimitError, attempt: int) -> float:
+    """429レスポンスの待機秒数（ヘッダーがなければ指数バックオフ）"""
+    headers = error.response.headers if getattr(error, "response", None) is not None else {}
+    wait_time = header_retry_after(headers)
+    return wait_time if wait_time is not None else min(2 ** attempt, 60)
+
+async def _generate_batch_item(
+    client,
+    limiter: AdaptiveLimiter,
+    commit_message: str,
+    repository: str,
+    language: str,
+    cache_key: str
+) -> str:
+    """一括生成の1件（429は同時実行数を絞って再試行）"""
+    for attempt in range(settings.OPENAI_BATCH_MAX_RETRIES + 1):
+        await limiter.acquire()
+        succeeded = False
         try:
-            tweet = generate_tweet_with_openai(commit_message, repository, language)
-            results.append({"success": True, "tweet": tweet, "repository": repository})
-        except Exception as e:
-            results.append({"success": False, "error": str(e), "repository": repository})
-    
-    return results 
\ No newline at end of file
+            tweet = await _request_tweet_async(client, commit_message, repository, language, retry=False)
+            succeeded = True
+        except openai.RateLimitError as e:
+            # 利用枠の超過は待っても回復しない
+            if getattr(e, "code", None) == "insufficient_quota" or attempt >= settings.OPENAI_BATCH_MAX_RETRIES:
+                raise
+            wait_time = _retry_after(e, attempt)
+            logger.warning(f"OpenAI APIレート制限。同時実行数を縮小し{wait_time:.1f}秒待機...")
+            await limiter.throttle(wait_time)
+            continue
+        finally:
+            await limiter.release(success=succeeded)
+
+        await _cache_tweet_async(cache_key, tweet)
+        return tweet
+
+def _batch_result(index: int, repository: str, tweet: str = None, error: Exception = None, cached: bool = False) -> Dict[str, Any]:
+    if error is not None:
+        return {"index": index, "repository": repository, "success": False, "error": str(getattr(error, "detail", error))}
+    return {"index": index, "repository": repository, "success": True, "tweet": tweet, "cached": cached}
+
+async def batch_generate_tweets_stream(
+    requests: List[Dict[str, str]],
+    language: str = 'ja',
+    max_concurrency: Optional[int] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """複数のツイート案を並行生成し、完了した順に1件ずつ返す
+
+    キャッシュはMGET 1往復でまとめて確認し、ヒット分を先に返す。
+    同じキャッシュキーの項目は1回だけ生成する。
+    """
+    cache_keys = [
+        _create_cache_key(req.get("commit_message"), req.get("repository"), language) for req in requests
+    ]
+    cached = await async_cache_store.get_many_json(cache_keys)
+    _record_cache_lookups(
+        (req.get("commit_message"), bool(data)) for req, data in zip(requests, cached)
+    )
+
+    pending: Dict[str, List[int]] = {}
+    for index, (req, data) in enumerate(zip(requests, cached)):
+        if data:
+            yield _batch_result(index, req.get("repository"), tweet=data["tweet"], cached=True)
+        else:
+            pending.setdefault(cache_keys[index], []).append(index)
+    if not pending:
+        return
+
+    # 再試行は AdaptiveLimiter 側で行うため、SDK内部のリトライは無効化
+    client = http_clients.get_async_openai(get_openai_api_key()).with_options(max_retries=0)
+    limiter = AdaptiveLimiter(max_concurrency or settings.OPENAI_BATCH_CONCURRENCY)
+    tasks = {}
+    for cache_key, indexes in pending.items():
+        req = requests[indexes[0]]
+        task = asyncio.create_task(_generate_batch_item(
+            client, limiter, req.get("commit_message"), req.get("repository"), language, cache_key
+        ))
+        tasks[task] = indexes
+
+    try:
+        remaining = set(tasks)
+        while remaining:
+            done, remaining = await asyncio.wait(remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                error = task.exception()
+                for index in tasks[task]:
+                    repository = requests[index].get("repository")
+                    if error is not None:
+                        yield _batch_result(index, repository, error=error)
+                    else:
+                        yield _batch_result(index, repository, tweet=task.result())
+    finally:
+        # クライアント切断などで途中終了した場合は未完了の生成を止める
+        for task in tasks:
+            task.cancel()
+        logger.info(f"ツイート一括生成: {len(requests)}件, 同時実行数 {limiter.to_dict()}")
+
+async def batch_generate_tweets(requests: list, language: str = 'ja', max_concurrency: Optional[int] = None) -> list:
+    """複数のツイート案を一括生成（結果は入力順）"""
+    results = [result async for result in batch_generate_tweets_stream(requests, language, max_concurrency)]
+    return sorted(results, key=lambda result: result["index"])
+
+
+# ---- バルク生成（OpenAI Batch API） ----
+# 夜間バックフィル向け。リクエストをJSONLファイルに書き出してBatch APIへ投入し、
+# 完了後に結果ファイルを1行ずつ読みながら openai_tweet:* キャッシュへ書き込む。
+# custom_id にキャッシュキーを使うため、入力・結果とも件数に関係なく一定のメモリで処理できる。
+
+BATCH_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+def _iter_uncached(requests: Iterable[Dict[str, str]], language: str, chunk_size: int = 500) -> Iterator[tuple]:
+    """未キャッシュの (cache_key, request) を返す（キャッシュ確認はチャンクごとのMGET）"""
+    iterator = iter(requests)
+    seen = set()
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        keys = [_create_cache_key(req["commit_message"], req["repository"], language) for req in chunk]
+        for key, req, cached in zip(keys, chunk, cache_store.get_many_json(keys)):
+            # チャンク内の重複は1件だけ投入（メモリを一定に保つため、チャンクを跨いだ重複は許容）
+            if cached is None and key not in seen:
+                seen.add(key)
+                yield key, req
+        seen.clear()
+
+def write_batch_files(
+    requests: Iterable[Dict[str, str]],
+    language: str = 'ja',
+    directory: Optional[str] = None,
+    max_requests_per_file: Optional[int] = None
+) -> Iterator[tuple]:
+    """未キャッシュのリクエストをBatch API形式のJSONLに書き出し、(パス, 件数) を1ファイルずつ返す"""
+    max_requests = max_requests_per_file or settings.OPENAI_BULK_MAX_REQUESTS_PER_FILE
+    handle, path, count = None, None, 0
+    try:
+        for cache_key, req in _iter_uncached(requests, language):
+            if handle is None:
+                fd, path = tempfile.mkstemp(prefix="openai_batch_", suffix=".jsonl", dir=directory)
+                handle = os.fdopen(fd, "w", encoding="utf-8")
+            line = {
+                "custom_id": cache_key,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": _completion_params(req["commit_message"], req["repository"], language),
+            }
+            handle.write(json.dumps(line, ensure_ascii=False) + "\n")
+            count += 1
+            if count >= max_requests:
+                handle.close()
+                yield path, count
+                handle, path, count = None, None, 0
+        if handle is not None:
+            handle.close()
+            yield path, count
+            handle = None
+    finally:
+        if handle is not None:
+            handle.close()
+
+def submit_batch(client, path: str) -> str:
+    """JSONLをアップロードしてバッチを作成し、バッチIDを返す"""
+    with open(path, "rb") as f:
+        uploaded = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    logger.info(f"OpenAIバッチを投入: {batch.id}")
+    return batch.id
+
+def wait_for_batch(client, batch_id: str, poll_interval: Optional[float] = None, timeout: Optional[float] = None):
+    """バッチが終了状態になるまでポーリング"""
+    poll_interval = poll_interval if poll_interval is not None else settings.OPENAI_BULK_POLL_INTERVAL
+    deadline = time.monotonic() + timeout if timeout else None
+    while True:
+        batch = openai_retry.call(lambda: client.batches.retrieve(batch_id), idempotent=True)
+        if batch.status in BATCH_TERMINAL_STATUSES:
+            return batch
+        if deadline and time.monotonic() > deadline:
+            raise TimeoutError(f"OpenAIバッチが時間内に完了しませんでした: {batch_id} ({batch.status})")
+        time.sleep(poll_interval)
+
+def store_batch_results(client, output_file_id: str, pipeline_size: int = 500) -> Dict[str, int]:
+    """結果ファイルをストリーミングで読み、成功分をキャッシュへ書き込む"""
+    stats = {"stored": 0, "failed": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    redis_client = cache_store.client
+    pipe = redis_client.pipeline(transaction=False)
+    queued = 0
+
+    with client.files.with_streaming_response.content(output_file_id) as response:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            result = json.loads(line)
+            response_body = (result.get("response") or {}).get("body") or {}
+            choices = response_body.get("choices") or []
+            content = choices[0].get("message", {}).get("content") if choices else None
+            if result.get("error") or content is None:
+                stats["failed"] += 1
+                continue
+            usage = response_body.get("usage") or {}
+            stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            stats["completion_tokens"] += usage.get("completion_tokens", 0)
+            pipe.setex(result["custom_id"], 86400, json.dumps(_tweet_cache_data(fit_to_limit(content))))
+            queued += 1
+            if queued >= pipeline_size:
+                pipe.execute()
+                stats["stored"] += queued
+                queued = 0
+
+    if queued:
+        pipe.execute()
+        stats["stored"] += queued
+
+    # バルク分もリアルタイムと同じ日別カウンタに加算（レイテンシは対象外）
+    try:
+        key = _usage_key()
+        pipe.hincrby(key, "bulk_requests", stats["stored"])
+        pipe.hincrby(key, "prompt_tokens", stats["prompt_tokens"])
+        pipe.hincrby(key, "completion_tokens", stats["completion_tokens"])
+        pipe.expire(key, settings.OPENAI_USAGE_RETENTION_DAYS * 86400)
+        pipe.execute()
+    except Exception as e:
+        logger.debug(f"使用量統計更新エラー: {e}")
+    return stats
+
+def run_bulk_generation(
+    requests: Iterable[Dict[str, str]],
+    language: str = 'ja',
+    client=None,
+    poll_interval: Optional[float] = None
+) -> Dict[str, Any]:
+    """未キャッシュ分をBatch APIで生成してキャッシュへ格納（ファイルごとに投入し、全件投入後に完了を待つ）"""
+    client = client or http_clients.get_sync_openai(get_openai_api_key())
+    summary = {"batches": [], "submitted": 0, "stored": 0, "failed": 0}
+
+    for path, count in write_batch_files(requests, language):
+        try:
+            summary["batches"].append(submit_batch(client, path))
+            summary["submitted"] += count
+        finally:
+            os.remove(path)
+
+    for batch_id in summary["batches"]:
+        batch = wait_for_batch(client, batch_id, poll_interval)
+        if batch.status != "completed" or not batch.output_file_id:
+            logger.error(f"OpenAIバッチが完了しませんでした: {batch_id} ({batch.status})")
+            continue
+        summary["stored"] += store_batch_results(client, batch.output_file_id)["stored"]
+
+    # 未完了バッチ・エラー行を含めた未格納件数
+    summary["failed"] = summary["submitted"] - summary["stored"]
+    logger.info(f"OpenAIバルク生成完了: {summary}")
+    return summary
@@ -0,0 +1,86 @@
+"""
+投稿履歴（post_history）の参照
+
+一覧はキーセット（カーソル）ページングで返す。並び順は (created_at, id) の降順で、
+次ページは「前ページ最後の行より小さい (created_at, id)」を索引
+(user_id, created_at, id) から読み始めるため、OFFSETと違い深いページでも読み飛ばしが発生しない。
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+
+from app.models import PostHistory
+
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(post: PostHistory) -> str:
+    payload = json.dumps([post.created_at.isoformat(), post.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """カーソルを (created_at, id) に戻す（不正な値はValueError）"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, post_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(post_id)
+    except Exception as e:
+        raise ValueError("カーソルが不正です") from e
+
+
+def build_history_query(
+    user_id: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    repository: Optional[str] = None,
+    language: Optional[str] = None
+):
+    """一覧取得クエリ（limit+1件を取得し、次ページの有無を判定する）"""
+    query = select(PostHistory).where(PostHistory.user_id == user_id)
+    if status:
+        query = query.where(PostHistory.status == status)
+    if repository:
+        query = query.where(PostHistory.repository == repository)
+    if language:
+        query = query.where(PostHistory.language == language)
+    if cursor:
+        created_at, post_id = decode_cursor(cursor)
+        query = query.where(tuple_(PostHistory.created_at, PostHistory.id) < tuple_(created_at, post_id))
+    return query.order_by(PostHistory.created_at.desc(), PostHistory.id.desc()).limit(limit + 1)
+
+
+def list_post_history(
+    db: Session,
+    user_id: int,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    repository: Optional[str] = None,
+    language: Optional[str] = None
+) -> Tuple[List[PostHistory], Optional[str]]:
+    """1ページ分の投稿履歴と次ページのカーソル（最終ページならNone）を返す"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    rows = db.execute(
+        build_history_query(user_id, limit, cursor, status, repository, language)
+    ).scalars().all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1])
+
+
+def recent_tweet_texts(db: Session, user_id: int, limit: int = 20) -> List[str]:
+    """直近の投稿済みツイート本文（索引 ix_post_history_user_created_id_posted を使用）"""
+    query = (
+        select(PostHistory.tweet_text)
+        .where(PostHistory.user_id == user_id, PostHistory.status == "posted")
+        .order_by(PostHistory.created_at.desc(), PostHistory.id.desc())
+        .limit(limit)
+    )
+    return list(db.execute(query).scalars().all())
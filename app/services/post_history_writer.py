@@ -0,0 +1,149 @@
+"""
+投稿結果の post_history への書き込み（ライトビハインド）
+
+投稿処理からはメモリ上のバッファに追加するだけで、DBへのINSERTは専用スレッドが
+POST_HISTORY_BATCH_SIZE 件たまるか POST_HISTORY_FLUSH_INTERVAL 秒ごとにまとめて実行する
+（executemany。PostgreSQLでは複数行VALUESのINSERTに展開される）。
+停止時（lifespan終了・ワーカー終了・プロセス終了）には残りを必ず書き込む。
+"""
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import PostHistory
+
+logger = logging.getLogger(__name__)
+
+
+class PostHistoryWriter:
+    def __init__(self):
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"recorded": 0, "written": 0, "dropped": 0, "flush_errors": 0, "skipped_no_user": 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="post-history-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """書き込みスレッドを止め、バッファの残りを書き込む"""
+        self._stopping.set()
+        self._wakeup.set()
+        thread = self._thread
+        if thread and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout)
+        self.flush()
+
+    def record(
+        self,
+        user_id: Optional[int],
+        tweet_text: str,
+        status: str,
+        tweet_id: Optional[str] = None,
+        error_message: Optional[str] = None,
+        history: Optional[Dict[str, Any]] = None
+    ):
+        """投稿結果をバッファに追加（DBアクセスなし）"""
+        if user_id is None:
+            # post_history.user_id はNOT NULLのため記録できない（ユーザーに紐づかない投稿）
+            with self._lock:
+                self.stats["skipped_no_user"] += 1
+            logger.warning(f"ユーザー未指定のため投稿履歴を記録しません: status={status}, tweet_id={tweet_id}")
+            return
+        history = history or {}
+        now = datetime.now(timezone.utc)
+        row = {
+            "user_id": user_id,
+            "repository": history.get("repository") or "",
+            "commit_message": history.get("commit_message") or "",
+            "tweet_text": tweet_text,
+            "tweet_id": tweet_id,
+            "language": history.get("language") or "ja",
+            "status": status,
+            "error_message": error_message,
+            "retry_count": 0,
+            # サーバー既定値だと書き込み時刻になり、投稿順と (created_at, id) の並びがずれる
+            "created_at": now,
+            "posted_at": now if status == "posted" else None,
+            "updated_at": now,
+        }
+
+        with self._lock:
+            if len(self._buffer) >= settings.POST_HISTORY_MAX_BUFFER:
+                self.stats["dropped"] += 1
+                logger.error("投稿履歴バッファが上限に達したため破棄しました")
+                return
+            self._buffer.append(row)
+            self.stats["recorded"] += 1
+            full = len(self._buffer) >= settings.POST_HISTORY_BATCH_SIZE
+
+        if self._thread is None:
+            self.start()
+        if full:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """バッファをバッチサイズごとに一括INSERT（失敗した行はバッファに戻す）"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    rows = self._buffer[:settings.POST_HISTORY_BATCH_SIZE]
+                    del self._buffer[:len(rows)]
+                if not rows:
+                    return written
+                try:
+                    self._insert(rows)
+                except Exception as e:
+                    with self._lock:
+                        self._buffer[:0] = rows
+                        self.stats["flush_errors"] += 1
+                    logger.error(f"投稿履歴の書き込みエラー（{len(rows)}件を再試行待ち）: {e}")
+                    return written
+                written += len(rows)
+                with self._lock:
+                    self.stats["written"] += len(rows)
+
+    def _insert(self, rows: List[Dict[str, Any]]):
+        db = SessionLocal()
+        try:
+            db.execute(insert(PostHistory), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(settings.POST_HISTORY_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            self.flush()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "pending": len(self._buffer)}
+
+
+post_history_writer = PostHistoryWriter()
+# lifespan を経由しないプロセス（スクリプト等）でも終了時に残りを書き込む
+atexit.register(post_history_writer.stop)
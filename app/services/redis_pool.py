@@ -0,0 +1,206 @@
+"""
+プロセス共有のRedisコネクションプールレジストリ
+
+論理DBごとに1つのブロッキングプール（同期・非同期それぞれ）を保持し、
+ワーカーあたりの接続数を REDIS_MAX_CONNECTIONS で上限化する。
+プールが枯渇した場合は REDIS_POOL_TIMEOUT 秒まで空きを待つ。
+"""
+import threading
+import time
+import logging
+from typing import Dict, Any, Tuple
+
+import redis
+import redis.asyncio as aioredis
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 論理DB番号
+REDIS_DB_DEFAULT = 0  # キャッシュ・セッション・投稿履歴
+REDIS_DB_OAUTH = 1  # OAuth状態管理
+REDIS_DB_RATE_LIMIT = 2  # レート制限
+
+
+class PoolUsageStats:
+    """プールのチェックアウト・待機統計"""
+    def __init__(self):
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time_total = 0.0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def on_checkout(self, waited: bool, elapsed: float):
+        with self._lock:
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+                self.wait_time_total += elapsed
+
+    def on_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "checkouts": self.checkouts,
+            "waits": self.waits,
+            "wait_time_total_ms": round(self.wait_time_total * 1000, 2),
+            "timeouts": self.timeouts,
+        }
+
+
+class InstrumentedBlockingConnectionPool(redis.BlockingConnectionPool):
+    """チェックアウト・待機回数を記録する同期ブロッキングプール"""
+    def __init__(self, *args, stats: PoolUsageStats = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = stats or PoolUsageStats()
+
+    def get_connection(self, *args, **kwargs):
+        waited = self.pool.empty()
+        started = time.perf_counter()
+        try:
+            connection = super().get_connection(*args, **kwargs)
+        except redis.ConnectionError:
+            if waited:
+                self.stats.on_timeout()
+            raise
+        self.stats.on_checkout(waited, time.perf_counter() - started)
+        return connection
+
+    def in_use_count(self) -> int:
+        return len(self._connections) - sum(1 for c in list(self.pool.queue) if c is not None)
+
+
+class InstrumentedAsyncBlockingConnectionPool(aioredis.BlockingConnectionPool):
+    """チェックアウト・待機回数を記録する非同期ブロッキングプール"""
+    def __init__(self, *args, stats: PoolUsageStats = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = stats or PoolUsageStats()
+
+    async def get_connection(self, *args, **kwargs):
+        waited = not self.can_get_connection()
+        started = time.perf_counter()
+        try:
+            connection = await super().get_connection(*args, **kwargs)
+        except redis.ConnectionError:
+            if waited:
+                self.stats.on_timeout()
+            raise
+        self.stats.on_checkout(waited, time.perf_counter() - started)
+        return connection
+
+    def in_use_count(self) -> int:
+        return len(self._in_use_connections)
+
+
+def _pool_options() -> Dict[str, Any]:
+    return {
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+        "timeout": settings.REDIS_POOL_TIMEOUT,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+    }
+
+
+class RedisPoolRegistry:
+    """論理DBごとの共有プールとクライアントを管理"""
+    def __init__(self):
+        self._pools: Dict[Tuple[int, bool], InstrumentedBlockingConnectionPool] = {}
+        self._clients: Dict[Tuple[int, bool], redis.Redis] = {}
+        self._async_pools: Dict[int, InstrumentedAsyncBlockingConnectionPool] = {}
+        self._async_clients: Dict[int, aioredis.Redis] = {}
+        self._lock = threading.Lock()
+
+    def get_pool(self, db: int = REDIS_DB_DEFAULT, decode_responses: bool = True) -> InstrumentedBlockingConnectionPool:
+        """同期プールを取得（初回のみ生成）"""
+        key = (db, decode_responses)
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    pool = InstrumentedBlockingConnectionPool.from_url(
+                        settings.get_redis_url(),
+                        db=db,
+                        decode_responses=decode_responses,
+                        stats=PoolUsageStats(),
+                        **_pool_options()
+                    )
+                    self._pools[key] = pool
+        return pool
+
+    def get_client(self, db: int = REDIS_DB_DEFAULT, decode_responses: bool = True) -> redis.Redis:
+        """共有プール上の同期クライアントを取得"""
+        key = (db, decode_responses)
+        client = self._clients.get(key)
+        if client is None:
+            pool = self.get_pool(db, decode_responses)
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = redis.Redis(connection_pool=pool)
+                    self._clients[key] = client
+        return client
+
+    def get_async_client(self, db: int = REDIS_DB_DEFAULT) -> aioredis.Redis:
+        """共有プール上の非同期クライアントを取得（decode_responses=True）"""
+        client = self._async_clients.get(db)
+        if client is None:
+            with self._lock:
+                client = self._async_clients.get(db)
+                if client is None:
+                    pool = InstrumentedAsyncBlockingConnectionPool.from_url(
+                        settings.get_redis_url(),
+                        db=db,
+                        decode_responses=True,
+                        stats=PoolUsageStats(),
+                        **_pool_options()
+                    )
+                    self._async_pools[db] = pool
+                    client = aioredis.Redis(connection_pool=pool)
+                    self._async_clients[db] = client
+        return client
+
+    async def aclose(self):
+        """非同期プールを閉じ、同期プールの接続を切断（lifespan終了時）"""
+        with self._lock:
+            async_pools = list(self._async_pools.values())
+            self._async_pools.clear()
+            self._async_clients.clear()
+            pools = list(self._pools.values())
+        for pool in async_pools:
+            await pool.disconnect()
+        # 同期クライアントはモジュール変数から参照されるため破棄せず切断のみ
+        for pool in pools:
+            pool.disconnect()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """プールごとの接続数・チェックアウト・待機統計"""
+        pools = {}
+        for (db, decode_responses), pool in list(self._pools.items()):
+            name = f"sync:db{db}" + ("" if decode_responses else ":raw")
+            pools[name] = {
+                "max_connections": pool.max_connections,
+                "created_connections": len(pool._connections),
+                "in_use_connections": pool.in_use_count(),
+                **pool.stats.to_dict(),
+            }
+        for db, pool in list(self._async_pools.items()):
+            pools[f"async:db{db}"] = {
+                "max_connections": pool.max_connections,
+                "created_connections": len(pool._available_connections) + len(pool._in_use_connections),
+                "in_use_connections": pool.in_use_count(),
+                **pool.stats.to_dict(),
+            }
+        return {
+            "settings": _pool_options(),
+            "pools": pools,
+        }
+
+
+# プロセス共有のレジストリ
+redis_pools = RedisPoolRegistry()
@@ -0,0 +1,262 @@
+"""
+予約投稿スケジューラ（post_history駆動）
+
+予約投稿は post_history に status='pending'、posted_at=予約時刻 で保存する。
+スケジューラは (status, posted_at) 索引で期限到来行を SELECT … FOR UPDATE SKIP LOCKED で取得し、
+同じトランザクション内で status='processing' に更新して確定する（複数レプリカでも二重投稿しない）。
+投稿結果はバッチごとに一括UPDATEする。
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import PostHistory
+from app.services.oauth_service import OAuthService
+from app.utils.retry import is_permanent_status
+
+logger = logging.getLogger(__name__)
+
+# post_history.status
+POST_PENDING = "pending"
+POST_PROCESSING = "processing"
+POST_POSTED = "posted"
+POST_FAILED = "failed"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def schedule_post(
+    db: Session,
+    user_id: int,
+    tweet_text: str,
+    scheduled_at: datetime,
+    repository: str = "",
+    commit_message: str = "",
+    language: str = "ja"
+) -> PostHistory:
+    """予約投稿を登録"""
+    if scheduled_at.tzinfo is None:
+        scheduled_at = scheduled_at.replace(tzinfo=timezone.utc)
+    post = PostHistory(
+        user_id=user_id,
+        repository=repository,
+        commit_message=commit_message,
+        tweet_text=tweet_text,
+        language=language,
+        status=POST_PENDING,
+        retry_count=0,
+        posted_at=scheduled_at
+    )
+    db.add(post)
+    db.commit()
+    db.refresh(post)
+    return post
+
+
+def claim_due_posts(limit: int) -> List[Dict[str, Any]]:
+    """期限到来の予約投稿を取得し processing に更新（他レプリカがロック中の行は飛ばす）"""
+    db = SessionLocal()
+    try:
+        now = _now()
+        rows = db.execute(
+            select(PostHistory.id, PostHistory.user_id, PostHistory.tweet_text, PostHistory.retry_count)
+            .where(PostHistory.status == POST_PENDING, PostHistory.posted_at <= now)
+            .order_by(PostHistory.posted_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not rows:
+            db.rollback()
+            return []
+
+        db.execute(
+            update(PostHistory)
+            .where(PostHistory.id.in_([row.id for row in rows]))
+            .values(status=POST_PROCESSING, updated_at=now)
+        )
+        db.commit()
+        return [dict(row._mapping) for row in rows]
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def release_stale_claims() -> int:
+    """processing のまま放置された行（スケジューラ停止など）を pending に戻す"""
+    db = SessionLocal()
+    try:
+        threshold = _now() - timedelta(seconds=settings.SCHEDULER_CLAIM_TIMEOUT)
+        result = db.execute(
+            update(PostHistory)
+            .where(PostHistory.status == POST_PROCESSING, PostHistory.updated_at < threshold)
+            .values(status=POST_PENDING, updated_at=_now())
+        )
+        db.commit()
+        return result.rowcount
+    finally:
+        db.close()
+
+
+def load_access_tokens(user_ids: List[int]) -> Dict[int, str]:
+    """バッチ内ユーザーのアクセストークンをまとめて復号（OAuthServiceは1回だけ生成）"""
+    db = SessionLocal()
+    try:
+        oauth_service = OAuthService(db)
+        tokens = {}
+        for user_id in set(user_ids):
+            token = oauth_service.get_decrypted_access_token(user_id, "twitter")
+            if token:
+                tokens[user_id] = token
+        return tokens
+    finally:
+        db.close()
+
+
+def apply_results(results: List[Dict[str, Any]]):
+    """投稿結果を一括UPDATE（主キー指定のexecutemany）"""
+    if not results:
+        return
+    db = SessionLocal()
+    try:
+        db.execute(update(PostHistory), results)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _deferred_result(post: Dict[str, Any], release_at: datetime) -> Dict[str, Any]:
+    """レート制限ウィンドウのリセット時刻に再予約（失敗ではないため retry_count は増やさない）"""
+    return {"id": post["id"], "status": POST_PENDING, "posted_at": release_at,
+            "error_message": "Twitter APIレート制限のため投稿枠のリセット時刻に再予約", "updated_at": _now()}
+
+
+def _failed_result(post: Dict[str, Any], error: str) -> Dict[str, Any]:
+    """再試行しても結果が変わらない失敗（重複・Twitter APIの4xx）は再予約せず失敗にする"""
+    return {"id": post["id"], "status": POST_FAILED, "retry_count": (post["retry_count"] or 0) + 1,
+            "error_message": error, "updated_at": _now()}
+
+
+def _is_permanent_error(e: Exception) -> bool:
+    """429（レート制限）と408（タイムアウト）以外の4xx"""
+    return is_permanent_status(getattr(e, "status_code", None))
+
+
+def _result_for(post: Dict[str, Any], tweet_id: str = None, error: str = None) -> Dict[str, Any]:
+    now = _now()
+    if error is None:
+        return {"id": post["id"], "status": POST_POSTED, "tweet_id": tweet_id, "posted_at": now,
+                "error_message": None, "updated_at": now}
+
+    retry_count = (post["retry_count"] or 0) + 1
+    if retry_count >= settings.SCHEDULER_MAX_RETRIES:
+        return {"id": post["id"], "status": POST_FAILED, "retry_count": retry_count,
+                "error_message": error, "updated_at": now}
+    # 指数バックオフで再予約
+    retry_at = now + timedelta(seconds=settings.SCHEDULER_RETRY_BASE_DELAY * (2 ** (retry_count - 1)))
+    return {"id": post["id"], "status": POST_PENDING, "retry_count": retry_count, "posted_at": retry_at,
+            "error_message": error, "updated_at": now}
+
+
+class ScheduledPostRunner:
+    """期限到来の予約投稿をバッチ単位・同時実行数上限付きで投稿する"""
+    def __init__(self, batch_size: int = None, concurrency: int = None):
+        self.batch_size = batch_size or settings.SCHEDULER_BATCH_SIZE
+        self.concurrency = concurrency or settings.SCHEDULER_CONCURRENCY
+        self._stopping = asyncio.Event()
+        # 直近のバッチで再予約した行のうち最も早い予約時刻（レート制限のリセット時刻ちょうどに起きるため）
+        self._next_release = None
+
+    def stop(self):
+        self._stopping.set()
+
+    async def run(self):
+        logger.info(f"予約投稿スケジューラ起動: バッチ {self.batch_size}件, 同時実行数 {self.concurrency}")
+        loop = asyncio.get_running_loop()
+        release_at = 0.0
+        while not self._stopping.is_set():
+            try:
+                if loop.time() >= release_at:
+                    released = await run_in_threadpool(release_stale_claims)
+                    if released:
+                        logger.warning(f"処理中のまま停止した予約投稿を再登録: {released}件")
+                    release_at = loop.time() + settings.SCHEDULER_CLAIM_TIMEOUT / 2
+                processed = await self.run_once()
+            except Exception as e:
+                logger.error(f"予約投稿スケジューラエラー: {e}")
+                processed = 0
+
+            # バッチが埋まっていれば待たずに次を取得
+            if processed < self.batch_size:
+                timeout = settings.SCHEDULER_POLL_INTERVAL
+                if self._next_release is not None:
+                    timeout = min(timeout, max(0.0, (self._next_release - _now()).total_seconds()))
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run_once(self) -> int:
+        """1バッチを処理し、処理件数を返す"""
+        from app.services.twitter_rate_limit import TwitterRateLimitExceeded, release_time
+        from app.services.twitter_service import (
+            is_duplicate_tweet_async, is_near_duplicate_tweet_async, post_tweet_v2_async
+        )
+
+        self._next_release = None
+        posts = await run_in_threadpool(claim_due_posts, self.batch_size)
+        if not posts:
+            return 0
+
+        tokens = await run_in_threadpool(load_access_tokens, [post["user_id"] for post in posts])
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def publish(post: Dict[str, Any]) -> Dict[str, Any]:
+            access_token = tokens.get(post["user_id"])
+            if not access_token:
+                return _result_for(post, error="Twitter認証が必要です")
+            # 対話的な投稿と同じ重複チェック（予約後に同じ内容が投稿されている場合）
+            if await is_duplicate_tweet_async(post["tweet_text"], user_id=post["user_id"]):
+                logger.warning(f"予約投稿の重複を検出: id={post['id']}")
+                return _failed_result(post, "重複する内容のツイートが検出されました")
+            if await is_near_duplicate_tweet_async(post["tweet_text"], user_id=post["user_id"]):
+                logger.warning(f"予約投稿の類似投稿を検出: id={post['id']}")
+                return _failed_result(post, "類似する内容のツイートが最近投稿されています")
+            async with semaphore:
+                try:
+                    # 投稿枠がなければ待たずにリセット時刻へ再予約（セマフォを塞がない）
+                    response = await post_tweet_v2_async(
+                        access_token, post["tweet_text"], user_id=post["user_id"], record_history=False,
+                        max_rate_limit_wait=0
+                    )
+                    return _result_for(post, tweet_id=(response.get("data") or {}).get("id"))
+                except TwitterRateLimitExceeded as e:
+                    release_at = datetime.fromtimestamp(release_time(e.reset_at), tz=timezone.utc)
+                    return _deferred_result(post, release_at)
+                except Exception as e:
+                    error = str(getattr(e, "detail", e))
+                    if _is_permanent_error(e):
+                        # 重複（403）や文字数超過（400）などは再試行しても成功しない
+                        return _failed_result(post, error)
+                    return _result_for(post, error=error)
+
+        results = await asyncio.gather(*(publish(post) for post in posts))
+        await run_in_threadpool(apply_results, list(results))
+
+        posted = sum(1 for result in results if result["status"] == POST_POSTED)
+        logger.info(f"予約投稿バッチ完了: {len(results)}件中 {posted}件投稿")
+        self._next_release = min(
+            (result["posted_at"] for result in results if result["status"] == POST_PENDING),
+            default=None
+        )
+        return len(results)
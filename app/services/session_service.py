@@ -1,13 +1,11 @@
 import uuid
-import redis
 from typing import Optional
 from fastapi import Request, HTTPException
-from app.config import settings
+from app.services.redis_pool import redis_pools, REDIS_DB_DEFAULT
 
-# Redisクライアント初期化（本番環境対応）
+# Redisクライアント（共有プール）
 def get_redis_client():
-    redis_url = settings.get_redis_url()
-    return redis.from_url(redis_url, db=0, decode_responses=True)
+    return redis_pools.get_client(REDIS_DB_DEFAULT)
 
 r = get_redis_client()
 
@@ -0,0 +1,94 @@
+"""
+統計カウンタのプロセス内集計
+
+キャッシュヒットのたびに Redis の HINCRBY を呼ぶとヒット経路にRedis往復が戻るため、
+ヒット経路ではプロセス内のカウンタを加算するだけにし、専用スレッドが STATS_FLUSH_INTERVAL 秒ごとに
+差分をまとめて Redis ハッシュへ加算する（全ワーカー共通の集計はこれまでどおり Redis 側）。
+Redis障害時は差分を保持して次回に加算し、プロセス終了時には残りを書き込む。
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Mapping, Optional
+
+from app.config import settings
+from app.services.cache_store import cache_store
+
+logger = logging.getLogger(__name__)
+
+_buffers: List["BufferedCounters"] = []
+_flusher: Optional[threading.Thread] = None
+_flusher_lock = threading.Lock()
+
+
+class BufferedCounters:
+    """Redisハッシュ key へ加算する統計カウンタ（加算はプロセス内のみ）"""
+    def __init__(self, key: str):
+        self.key = key
+        self._pending: Counter = Counter()
+        self._lock = threading.Lock()
+        _buffers.append(self)
+
+    def incr(self, field: str, amount: int = 1):
+        with self._lock:
+            self._pending[field] += amount
+        _ensure_flusher()
+
+    def update(self, counts: Mapping[str, int]):
+        with self._lock:
+            self._pending.update(counts)
+        _ensure_flusher()
+
+    def pending(self) -> Dict[str, int]:
+        """まだRedisに加算していない差分"""
+        with self._lock:
+            return dict(self._pending)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        if not pending:
+            return
+        try:
+            pipe = cache_store.client.pipeline(transaction=False)
+            for field, amount in pending.items():
+                pipe.hincrby(self.key, field, amount)
+            pipe.execute()
+        except Exception as e:
+            logger.debug(f"統計カウンタ書き込みエラー: {e}")
+            with self._lock:
+                self._pending.update(pending)
+
+    def get_counters(self) -> Dict[str, int]:
+        """Redisの集計値にこのプロセスの未書き込み分を足したもの"""
+        counters = cache_store.get_counters(self.key)
+        for field, amount in self.pending().items():
+            counters[field] = counters.get(field, 0) + amount
+        return counters
+
+
+def flush_all():
+    for buffer in _buffers:
+        buffer.flush()
+
+
+def _run():
+    while True:
+        time.sleep(settings.STATS_FLUSH_INTERVAL)
+        flush_all()
+
+
+def _ensure_flusher():
+    global _flusher
+    # fork後の子プロセスではスレッドが引き継がれないため起動し直す
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_run, name="stats-flusher", daemon=True)
+            _flusher.start()
+
+
+atexit.register(flush_all)
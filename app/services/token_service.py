@@ -1,59 +1,189 @@
-import os
+"""
+OAuthトークンの暗号化
+
+暗号化キーは ENCRYPTION_KEY から PBKDF2（100,000回）で導出する。導出はプロセスごとに1回だけ行い
+（キーの値ごとにキャッシュ）、TokenService の生成ではCPUを使わない。
+
+暗号文は v2:{キーID}:{Fernetトークン} 形式（キーID は導出キーのハッシュ先頭8桁）。
+キーを入れ替える場合は新しいキーを ENCRYPTION_KEY に、以前のキーを ENCRYPTION_OLD_KEYS
+（カンマ区切り、新しい順）に設定する。暗号化は常に ENCRYPTION_KEY で行い、復号はキーIDのキー
+（不明なら全キー、MultiFernet）で行うため、入れ替え中も既存のトークンを読める。
+旧形式（Fernetトークンをさらにbase64化したもの）も復号できる。
+既存の行は reencrypt_oauth_tokens（python -m app.reencrypt_tokens）で現在のキーに書き換える。
+"""
 import base64
-from cryptography.fernet import Fernet
+import hashlib
+import logging
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from sqlalchemy import bindparam, or_, select, update
+from sqlalchemy.engine import Engine
+
 from app.config import settings
-from typing import Optional
+from app.models import OAuthToken
+
+logger = logging.getLogger(__name__)
+
+TOKEN_FORMAT_VERSION = "v2"
+# 開発環境用のデフォルトキー（本番では必ず環境変数で設定）
+DEV_SECRET_KEY = "dev-secret-key-for-encryption-32chars!!"
+KDF_SALT = b'x_auto_post_tool_salt'  # 固定のソルト（本番ではランダム化を検討）
+KDF_ITERATIONS = 100000
+
+
+@lru_cache(maxsize=8)
+def _derive_key(secret_key: str) -> bytes:
+    """ENCRYPTION_KEY からFernetキーを導出（同じキーはプロセス内で1回だけ）"""
+    # キーを32バイトに調整
+    if len(secret_key) < 32:
+        secret_key = secret_key.ljust(32, '0')
+    elif len(secret_key) > 32:
+        secret_key = secret_key[:32]
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=KDF_SALT,
+        iterations=KDF_ITERATIONS,
+    )
+    return base64.urlsafe_b64encode(kdf.derive(secret_key.encode()))
+
+
+class Keyring:
+    """暗号化キー（先頭が現在のキー）"""
+    def __init__(self, secret_keys: Tuple[str, ...]):
+        keys = [_derive_key(secret_key) for secret_key in secret_keys]
+        self.key_ids = [hashlib.sha256(key).hexdigest()[:8] for key in keys]
+        self.primary_id = self.key_ids[0]
+        self.fernets: Dict[str, Fernet] = {}
+        for key_id, key in zip(self.key_ids, keys):
+            self.fernets.setdefault(key_id, Fernet(key))
+        self.multi = MultiFernet([Fernet(key) for key in keys])
+
+    @property
+    def prefix(self) -> str:
+        """現在のキーで暗号化した値の接頭辞"""
+        return f"{TOKEN_FORMAT_VERSION}:{self.primary_id}:"
+
+
+@lru_cache(maxsize=4)
+def _load_keyring(secret_key: str, old_secret_keys: str) -> Keyring:
+    old = tuple(key.strip() for key in old_secret_keys.split(",") if key.strip())
+    return Keyring((secret_key,) + old)
+
+
+def get_keyring() -> Keyring:
+    """設定（環境変数・.env）のキーに対応するキーリング（プロセス内で共有）"""
+    return _load_keyring(settings.ENCRYPTION_KEY or DEV_SECRET_KEY, settings.ENCRYPTION_OLD_KEYS)
+
+
+def _fernet_token(keyring: Keyring, encrypted_token: str) -> Tuple[Optional[Fernet], bytes]:
+    """(キーIDに対応するFernet（不明ならNone）, Fernetトークン)"""
+    if encrypted_token.startswith(TOKEN_FORMAT_VERSION + ":"):
+        _, key_id, token = encrypted_token.split(":", 2)
+        return keyring.fernets.get(key_id), token.encode()
+    # 旧形式: Fernetトークンをbase64化したもの
+    return None, base64.urlsafe_b64decode(encrypted_token.encode())
+
 
 class TokenService:
     def __init__(self):
-        # 環境変数から暗号化キーを取得、なければ生成
-        self.secret_key = os.getenv('ENCRYPTION_KEY')
-        if not self.secret_key:
-            # 開発環境用のデフォルトキー（本番では必ず環境変数で設定）
-            self.secret_key = "dev-secret-key-for-encryption-32chars!!"
-        
-        # キーを32バイトに調整
-        if len(self.secret_key) < 32:
-            self.secret_key = self.secret_key.ljust(32, '0')
-        elif len(self.secret_key) > 32:
-            self.secret_key = self.secret_key[:32]
-        
-        # Fernetキーを生成
-        salt = b'x_auto_post_tool_salt'  # 固定のソルト（本番ではランダム化を検討）
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(self.secret_key.encode()))
-        self.fernet = Fernet(key)
-    
+        self.keyring = get_keyring()
+
     def encrypt_token(self, token: str) -> str:
         """トークンを暗号化"""
         if not token:
             return ""
-        encrypted = self.fernet.encrypt(token.encode())
-        return base64.urlsafe_b64encode(encrypted).decode()
-    
+        encrypted = self.keyring.fernets[self.keyring.primary_id].encrypt(token.encode())
+        return self.keyring.prefix + encrypted.decode()
+
     def decrypt_token(self, encrypted_token: str) -> Optional[str]:
         """トークンを復号化"""
         if not encrypted_token:
             return None
         try:
-            encrypted_bytes = base64.urlsafe_b64decode(encrypted_token.encode())
-            decrypted = self.fernet.decrypt(encrypted_bytes)
+            fernet, token = _fernet_token(self.keyring, encrypted_token)
+            decrypted = (fernet or self.keyring.multi).decrypt(token)
             return decrypted.decode()
         except Exception as e:
-            # 復号化に失敗した場合（古い形式のトークンなど）
+            # 復号化に失敗した場合（入れ替え前のキーが設定されていないなど）
             return None
-    
+
+    def needs_reencryption(self, encrypted_token: Optional[str]) -> bool:
+        """現在のキー・形式で暗号化されていないか"""
+        return bool(encrypted_token) and not encrypted_token.startswith(self.keyring.prefix)
+
+    def reencrypt_token(self, encrypted_token: Optional[str]) -> Optional[str]:
+        """現在のキーで暗号化し直す（元の暗号化時刻は保持。復号できなければ InvalidToken）"""
+        if not self.needs_reencryption(encrypted_token):
+            return encrypted_token
+        try:
+            _, token = _fernet_token(self.keyring, encrypted_token)
+        except ValueError:
+            raise InvalidToken
+        return self.keyring.prefix + self.keyring.multi.rotate(token).decode()
+
     def is_token_expired(self, expires_at) -> bool:
         """トークンの有効期限をチェック"""
         if not expires_at:
             return True
         from datetime import datetime, timezone
         now = datetime.now(timezone.utc)
-        return now >= expires_at 
\ No newline at end of file
+        return now >= expires_at
+
+
+def reencrypt_oauth_tokens(engine: Engine, batch_size: int = 500) -> Dict[str, int]:
+    """oauth_tokens を現在のキーで暗号化し直す
+
+    現在のキーで暗号化されていない行だけをサーバーサイドカーソル（stream_results）で読み、
+    batch_size 件ごとに別の接続・トランザクションでまとめて更新する（executemany）。
+    行数に関係なくメモリ使用量は一定。読み取り後に利用者がトークンを保存し直した行は、
+    暗号文が読み取り時と一致する場合のみ更新するため上書きしない。
+    """
+    token_service = TokenService()
+    prefix_pattern = token_service.keyring.prefix + "%"
+    table = OAuthToken.__table__
+    query = select(table.c.id, table.c.access_token, table.c.refresh_token).where(or_(
+        table.c.access_token.not_like(prefix_pattern),
+        (table.c.refresh_token != "") & table.c.refresh_token.not_like(prefix_pattern)
+    )).order_by(table.c.id)
+    statement = update(table).where(
+        table.c.id == bindparam("_id"),
+        table.c.access_token == bindparam("_access_token"),
+        table.c.refresh_token.is_not_distinct_from(bindparam("_refresh_token"))
+    ).values(access_token=bindparam("access_token"), refresh_token=bindparam("refresh_token"))
+
+    stats = {"scanned": 0, "reencrypted": 0, "skipped": 0, "failed": 0}
+    with engine.connect() as reader:
+        result = reader.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+        for rows in result.partitions():
+            params = []
+            for row in rows:
+                stats["scanned"] += 1
+                try:
+                    params.append({
+                        "_id": row.id,
+                        "_access_token": row.access_token,
+                        "_refresh_token": row.refresh_token,
+                        "access_token": token_service.reencrypt_token(row.access_token),
+                        "refresh_token": token_service.reencrypt_token(row.refresh_token),
+                    })
+                except InvalidToken:
+                    stats["failed"] += 1
+                    logger.warning(f"OAuthトークンを復号できないため再暗号化をスキップ: id={row.id}")
+            if not params:
+                continue
+            if engine.dialect.name == "sqlite":
+                # SQLiteはサーバーサイドカーソルがなく、読み取り中に別の接続から書き込めないため同じ接続で更新
+                updated = reader.execute(statement, params).rowcount
+                reader.commit()
+            else:
+                with engine.begin() as writer:
+                    updated = writer.execute(statement, params).rowcount
+            stats["reencrypted"] += updated
+            stats["skipped"] += len(params) - updated
+            logger.info(f"OAuthトークン再暗号化: {stats['reencrypted']}件完了（{stats['scanned']}件走査）")
+    return stats
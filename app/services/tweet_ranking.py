@@ -0,0 +1,67 @@
+"""
+ツイート案候補のローカルランキング
+
+1回のChat Completions（n=N）で得た候補を、追加のAPI呼び出しなしで並べ替える。
+スコアは次の3項目の重み付き和:
+- 文字数: 重み付き文字数が目標に近いほど高い（280超は大きく減点）
+- ハッシュタグ: 1〜2個を最良とし、なし・多すぎは減点
+- 最近の投稿との重なり: 正規化本文の3-gram Jaccard係数の最大値だけ減点
+"""
+from typing import Dict, Iterable, List, Sequence
+
+from app.services.near_duplicate import shingle_set
+from app.utils.tweet_length import MAX_WEIGHTED_LENGTH, weighted_length
+
+TARGET_WEIGHTED_LENGTH = 220
+LENGTH_WEIGHT = 1.0
+HASHTAG_WEIGHT = 0.5
+OVERLAP_WEIGHT = 2.0
+OVER_LIMIT_PENALTY = -2.0
+
+_HASHTAG_SCORES = {0: 0.0, 1: 1.0, 2: 1.0, 3: 0.5}
+
+
+def _length_score(length: int) -> float:
+    if length > MAX_WEIGHTED_LENGTH:
+        return OVER_LIMIT_PENALTY
+    return max(0.0, 1.0 - abs(length - TARGET_WEIGHTED_LENGTH) / TARGET_WEIGHTED_LENGTH)
+
+
+def _hashtag_count(text: str) -> int:
+    return sum(1 for word in text.split() if word[:1] in ("#", "＃") and len(word) > 1)
+
+
+def _max_overlap(shingles: frozenset, recent: Sequence[frozenset]) -> float:
+    best = 0.0
+    for other in recent:
+        if shingles and other:
+            best = max(best, len(shingles & other) / len(shingles | other))
+    return best
+
+
+def score_candidate(text: str, recent_shingles: Sequence[frozenset] = ()) -> Dict[str, float]:
+    """1件の候補のスコア内訳"""
+    length = weighted_length(text)
+    hashtags = _hashtag_count(text)
+    overlap = _max_overlap(shingle_set(text), recent_shingles)
+    score = (
+        LENGTH_WEIGHT * _length_score(length)
+        + HASHTAG_WEIGHT * _HASHTAG_SCORES.get(hashtags, 0.0)
+        - OVERLAP_WEIGHT * overlap
+    )
+    return {
+        "score": round(score, 4),
+        "weighted_length": length,
+        "hashtags": hashtags,
+        "overlap": round(overlap, 4),
+    }
+
+
+def rank_candidates(candidates: Iterable[str], recent_posts: Iterable[str] = ()) -> List[Dict[str, object]]:
+    """候補をスコアの高い順に並べる（同点は生成順）"""
+    recent_shingles = [shingle_set(text) for text in recent_posts]
+    scored = [
+        {"tweet": text, **score_candidate(text, recent_shingles)}
+        for text in candidates
+    ]
+    return sorted(scored, key=lambda item: -item["score"])
@@ -0,0 +1,163 @@
+"""
+Twitter APIのレート制限予算（アクセストークン単位）
+
+投稿APIのレスポンスごとに x-rate-limit-limit / x-rate-limit-remaining / x-rate-limit-reset
+（reset はUNIX時刻）を Redis のハッシュ twitter_rate:{トークンのハッシュ} に保存する。
+投稿前に残り回数を1つ予約し、残りがなければ API を呼ばずにウィンドウのリセット時刻を返す。
+呼び出し側はリセット時刻ちょうどまで待つか、その時刻に再予約する（429を受けてから待つのではなく事前に止める）。
+
+リセット時刻を過ぎた最初の予約は、前のウィンドウの上限（x-rate-limit-limit）から自分の分を引いた残り回数と
+推定リセット時刻（現在時刻 + TWITTER_RATE_LIMIT_WINDOW）で新しいウィンドウを開始する
+（リセット直後に全ワーカーが予約なしで一斉に送信しない）。推定したウィンドウは次のレスポンスヘッダーで置き換える。
+
+予約とヘッダー反映はLuaスクリプトで原子的に行うため、複数ワーカーが同じトークンで投稿しても
+残り回数を超えて送信しない。Redis障害時は予約をスキップして投稿を止めない。
+"""
+import hashlib
+import logging
+import math
+import time
+from typing import Mapping, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.config import settings
+from app.services.cache_store import cache_store, async_cache_store
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_KEY_PREFIX = "twitter_rate:"
+# リセット後もしばらく保持（遅れて届いた旧ウィンドウのヘッダーを無視し、新しいウィンドウを上限から始めるため）
+RATE_LIMIT_KEY_GRACE = 60
+
+# 残り回数があれば1減らして0、なければリセット時刻を返す（ウィンドウ不明は0）
+# リセット時刻を過ぎていれば上限 - 1 の残り回数で推定ウィンドウを開始する（上限が不明なら0）
+_RESERVE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local reset = tonumber(redis.call('hget', KEYS[1], 'reset') or '0')
+if reset <= now then
+    local limit = tonumber(redis.call('hget', KEYS[1], 'limit') or '0')
+    if limit <= 0 then
+        return 0
+    end
+    local estimated_reset = math.floor(now) + tonumber(ARGV[2])
+    redis.call('hset', KEYS[1], 'remaining', limit - 1, 'reset', estimated_reset, 'previous_reset', reset)
+    redis.call('expireat', KEYS[1], estimated_reset + tonumber(ARGV[3]))
+    return 0
+end
+local remaining = tonumber(redis.call('hget', KEYS[1], 'remaining') or '1')
+if remaining > 0 then
+    redis.call('hincrby', KEYS[1], 'remaining', -1)
+    return 0
+end
+return reset
+"""
+
+# 同じウィンドウのヘッダーは小さい方の残り回数を採用（予約済みの分を巻き戻さない）、古いウィンドウは無視
+# 推定ウィンドウ（previous_reset あり）は推定前より新しいウィンドウのヘッダーで置き換える
+_UPDATE_SCRIPT = """
+local current_reset = tonumber(redis.call('hget', KEYS[1], 'reset') or '0')
+local reset = tonumber(ARGV[3])
+local remaining = tonumber(ARGV[2])
+local previous_reset = redis.call('hget', KEYS[1], 'previous_reset')
+if previous_reset then
+    if tonumber(previous_reset) >= reset then
+        return 0
+    end
+    redis.call('hdel', KEYS[1], 'previous_reset')
+    current_reset = reset
+elseif current_reset > reset then
+    return 0
+end
+if current_reset == reset then
+    local current = tonumber(redis.call('hget', KEYS[1], 'remaining') or ARGV[2])
+    if current < remaining then
+        remaining = current
+    end
+end
+redis.call('hset', KEYS[1], 'limit', ARGV[1], 'remaining', remaining, 'reset', reset)
+redis.call('expireat', KEYS[1], reset + tonumber(ARGV[4]))
+return 1
+"""
+
+
+class TwitterRateLimitExceeded(HTTPException):
+    """レート制限ウィンドウのリセット待ち（reset_at: UNIX時刻）"""
+    def __init__(self, reset_at: float):
+        wait = max(0, math.ceil(reset_at - time.time()))
+        super().__init__(
+            status_code=429,
+            detail=f"Twitter APIレート制限に達しました（{wait}秒後に解除）",
+            headers={"Retry-After": str(wait)}
+        )
+        self.reset_at = reset_at
+
+
+def _key(access_token: str) -> str:
+    # トークンそのものはRedisに保存しない
+    return RATE_LIMIT_KEY_PREFIX + hashlib.sha256(access_token.encode()).hexdigest()[:32]
+
+
+def parse_rate_limit_headers(headers: Mapping[str, str]) -> Optional[Tuple[int, int, int]]:
+    """(limit, remaining, reset) を返す（ヘッダーがなければNone）"""
+    try:
+        remaining = int(headers["x-rate-limit-remaining"])
+        reset = int(headers["x-rate-limit-reset"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    try:
+        limit = int(headers.get("x-rate-limit-limit", remaining))
+    except (TypeError, ValueError):
+        limit = remaining
+    return limit, remaining, reset
+
+
+def release_time(reset_at: float) -> float:
+    """待機していた投稿を解放する時刻（時計のずれを見込んでリセット時刻に少し足す）"""
+    return reset_at + settings.TWITTER_RATE_LIMIT_RESET_MARGIN
+
+
+def reserve(access_token: str) -> Optional[float]:
+    """投稿枠を1つ予約（予約できればNone、残りがなければリセット時刻）"""
+    try:
+        reset_at = cache_store.client.eval(
+            _RESERVE_SCRIPT, 1, _key(access_token), time.time(), settings.TWITTER_RATE_LIMIT_WINDOW, RATE_LIMIT_KEY_GRACE
+        )
+    except Exception as e:
+        logger.debug(f"Twitterレート制限予約エラー: {e}")
+        return None
+    return float(reset_at) if reset_at else None
+
+
+async def reserve_async(access_token: str) -> Optional[float]:
+    """投稿枠を1つ予約（非同期版）"""
+    try:
+        reset_at = await async_cache_store.client.eval(
+            _RESERVE_SCRIPT, 1, _key(access_token), time.time(), settings.TWITTER_RATE_LIMIT_WINDOW, RATE_LIMIT_KEY_GRACE
+        )
+    except Exception as e:
+        logger.debug(f"Twitterレート制限予約エラー: {e}")
+        return None
+    return float(reset_at) if reset_at else None
+
+
+def record_response(access_token: str, headers: Mapping[str, str]):
+    """レスポンスヘッダーの残り回数・リセット時刻を反映"""
+    parsed = parse_rate_limit_headers(headers)
+    if parsed is None:
+        return
+    try:
+        cache_store.client.eval(_UPDATE_SCRIPT, 1, _key(access_token), *parsed, RATE_LIMIT_KEY_GRACE)
+    except Exception as e:
+        logger.debug(f"Twitterレート制限更新エラー: {e}")
+
+
+async def record_response_async(access_token: str, headers: Mapping[str, str]):
+    """レスポンスヘッダーの残り回数・リセット時刻を反映（非同期版）"""
+    parsed = parse_rate_limit_headers(headers)
+    if parsed is None:
+        return
+    try:
+        await async_cache_store.client.eval(_UPDATE_SCRIPT, 1, _key(access_token), *parsed, RATE_LIMIT_KEY_GRACE)
+    except Exception as e:
+        logger.debug(f"Twitterレート制限更新エラー: {e}")
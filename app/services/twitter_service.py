@@ -4,24 +4,27 @@ import requests
 import httpx
 import asyncio
 import time
-import redis
 import json
+import math
 from typing import Dict, Any, Optional, List
 from fastapi import HTTPException
+from app.services.http_clients import http_clients
+from app.services.cache_store import cache_store, async_cache_store
+from app.services import duplicate_index, near_duplicate, twitter_rate_limit
+from app.services.twitter_rate_limit import TwitterRateLimitExceeded
+from app.services.post_history_writer import post_history_writer
+from app.utils.circuit_breaker import twitter_circuit_breaker
+from app.utils.retry import RetryPolicy, header_retry_after
+from app.utils.tweet_length import MAX_WEIGHTED_LENGTH, weighted_length
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Redisクライアント（投稿履歴・レート制限管理）
-# Redis接続（本番環境対応）
-def get_redis_client():
-    redis_url = settings.get_redis_url()
-    if settings.REDIS_URL:
-        return redis.from_url(redis_url, decode_responses=True)
-    else:
-        return redis.from_url(settings.get_redis_url(), decode_responses=True)
+# ツイート投稿の再試行（投稿は冪等ではないため、送信されなかったと分かる失敗のみ再送）
+twitter_retry = RetryPolicy("twitter")
 
-redis_client = get_redis_client()
+TWEET_HISTORY_TTL = 86400  # 投稿履歴の保持期間（秒）
+RATE_LIMIT_MAX_REWAITS = 2  # 429（x-rate-limit-* 付き）を受けて投稿枠のリセットを待ち直す回数（非同期版）
 
 def get_tweepy_client():
     consumer_key = settings.TWITTER_CLIENT_ID
@@ -44,8 +47,131 @@ def post_tweet_with_tweepy(tweet: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Twitter APIエラー: {str(e)}")
 
-async def post_tweet_v2_async(access_token: str, tweet_text: str, retry_count: int = 3) -> Dict[str, Any]:
-    """非同期版Twitter API v2投稿（リトライ機能付き）"""
+def _build_post_data(result: Dict[str, Any], tweet_text: str, user_id: Optional[int] = None) -> Dict[str, Any]:
+    """投稿履歴として保存するデータを生成"""
+    return {
+        "tweet_id": result.get("data", {}).get("id"),
+        "user_id": user_id,
+        "text": tweet_text,
+        "timestamp": time.time(),
+        "status": "success"
+    }
+
+def _queue_post_record(pipe, result: Dict[str, Any], tweet_text: str, user_id: Optional[int]):
+    """投稿履歴と重複索引の書き込みを1つのパイプラインに積む"""
+    post_data = _build_post_data(result, tweet_text, user_id)
+    pipe.setex(f"tweet_history:{post_data['tweet_id']}", TWEET_HISTORY_TTL, json.dumps(post_data))
+    duplicate_index.add_to_pipeline(pipe, user_id, tweet_text, post_data["timestamp"])
+    near_duplicate.add_to_pipeline(pipe, user_id, tweet_text, post_data["timestamp"])
+
+async def _record_post_async(result: Dict[str, Any], tweet_text: str, user_id: Optional[int]):
+    try:
+        pipe = async_cache_store.client.pipeline(transaction=False)
+        _queue_post_record(pipe, result, tweet_text, user_id)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning(f"投稿履歴保存エラー: {e}")
+
+def _record_post(result: Dict[str, Any], tweet_text: str, user_id: Optional[int]):
+    try:
+        pipe = cache_store.client.pipeline(transaction=False)
+        _queue_post_record(pipe, result, tweet_text, user_id)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"投稿履歴保存エラー: {e}")
+
+def _record_outcome(
+    user_id: Optional[int],
+    tweet_text: str,
+    history: Optional[Dict[str, Any]],
+    result: Optional[Dict[str, Any]] = None,
+    error: Optional[Exception] = None
+):
+    """投稿結果を post_history 書き込みバッファへ追加"""
+    if error is None:
+        post_history_writer.record(
+            user_id, tweet_text, "posted",
+            tweet_id=(result or {}).get("data", {}).get("id"), history=history
+        )
+    else:
+        post_history_writer.record(
+            user_id, tweet_text, "failed",
+            error_message=str(getattr(error, "detail", error)), history=history
+        )
+
+async def post_tweet_v2_async(
+    access_token: str,
+    tweet_text: str,
+    retry_count: int = 3,
+    user_id: Optional[int] = None,
+    history: Optional[Dict[str, Any]] = None,
+    record_history: bool = True,
+    max_rate_limit_wait: Optional[float] = None
+) -> Dict[str, Any]:
+    """非同期版Twitter API v2投稿（結果は post_history にライトビハインドで記録）
+
+    history: repository / commit_message / language（post_historyの列）
+    record_history: 呼び出し側で post_history を更新する場合（予約投稿）はFalse
+    max_rate_limit_wait: レート制限の解除をこの秒数まで待つ（超える場合は TwitterRateLimitExceeded、
+        省略時は TWITTER_RATE_LIMIT_MAX_WAIT）
+    """
+    if max_rate_limit_wait is None:
+        max_rate_limit_wait = settings.TWITTER_RATE_LIMIT_MAX_WAIT
+    try:
+        result = await _post_tweet_v2_async(access_token, tweet_text, retry_count, user_id, max_rate_limit_wait)
+    except Exception as e:
+        if record_history:
+            _record_outcome(user_id, tweet_text, history, error=e)
+        raise
+    if record_history:
+        _record_outcome(user_id, tweet_text, history, result=result)
+    return result
+
+def _ensure_tweet_length(tweet_text: str):
+    """重み付き文字数の上限超過は投稿前に400で返す（API往復を省く）"""
+    length = weighted_length(tweet_text)
+    if length > MAX_WEIGHTED_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"ツイートが文字数上限を超えています（{length}/{MAX_WEIGHTED_LENGTH}）"
+        )
+
+async def _wait_for_rate_limit_async(access_token: str, max_wait: float):
+    """投稿枠を予約（残りがなければウィンドウのリセットまで待つ。max_wait を超える場合は待たずに送出）"""
+    reset_at = await twitter_rate_limit.reserve_async(access_token)
+    if reset_at is None:
+        return
+    wait_time = twitter_rate_limit.release_time(reset_at) - time.time()
+    if wait_time > max_wait:
+        raise TwitterRateLimitExceeded(reset_at)
+    logger.info(f"Twitter APIの投稿枠がないためウィンドウのリセットまで{wait_time:.1f}秒待機")
+    await asyncio.sleep(max(0.0, wait_time))
+
+def _retry_after(response) -> Optional[float]:
+    """再試行前の最低待機秒数
+
+    x-rate-limit-* 付きの429はここでは再試行しない（非同期版はサーキットブレーカーの外で
+    反映済みの予算によりリセットまで待ってから送り直す。同期版は待たずに429を返す）。
+    """
+    if response.status_code == 429 and twitter_rate_limit.parse_rate_limit_headers(response.headers) is not None:
+        return math.inf
+    return header_retry_after(response.headers)
+
+async def _post_tweet_v2_async(
+    access_token: str,
+    tweet_text: str,
+    retry_count: int,
+    user_id: Optional[int],
+    max_rate_limit_wait: float
+) -> Dict[str, Any]:
+    """非同期版Twitter API v2投稿
+
+    retry_count は twitter_retry による1回の送信あたりの最大試行回数。レート制限の429を受けた場合は
+    サーキットブレーカーの外でリセットを待ってから、最大 RATE_LIMIT_MAX_REWAITS 回送り直す。
+    """
+    if retry_count < 1:
+        raise ValueError(f"retry_count は1以上を指定してください: {retry_count}")
+    _ensure_tweet_length(tweet_text)
     url = "https://api.twitter.com/2/tweets"
     headers = {
         "Authorization": f"Bearer {access_token}",
@@ -55,70 +181,63 @@ async def post_tweet_v2_async(access_token: str, tweet_text: str, retry_count: i
         "text": tweet_text
     }
     
-    for attempt in range(retry_count):
-        try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(url, headers=headers, json=json_data)
-                
-                # レート制限対応
-                if response.status_code == 429:
-                    wait_time = int(response.headers.get("x-rate-limit-reset", 900))
-                    logger.warning(f"Twitter APIレート制限。{wait_time}秒待機...")
-                    
-                    if attempt < retry_count - 1:
-                        await asyncio.sleep(min(wait_time, 60))  # 最大60秒待機
-                        continue
-                    else:
-                        raise HTTPException(status_code=429, detail="Twitter APIレート制限により投稿できませんでした")
-                
-                # 成功
-                if response.status_code == 201:
-                    result = response.json()
-                    
-                    # 投稿履歴をRedisに保存
-                    try:
-                        post_data = {
-                            "tweet_id": result.get("data", {}).get("id"),
-                            "text": tweet_text,
-                            "timestamp": time.time(),
-                            "status": "success"
-                        }
-                        redis_client.setex(f"tweet_history:{result.get('data', {}).get('id')}", 86400, json.dumps(post_data))
-                    except Exception as e:
-                        logger.warning(f"投稿履歴保存エラー: {e}")
-                    
-                    return result
-                
-                # その他のエラー
-                error_detail = f"Twitter API v2エラー: {response.status_code} - {response.text}"
-                
-                # 一時的なエラーの場合はリトライ
-                if response.status_code in [500, 502, 503, 504] and attempt < retry_count - 1:
-                    wait_time = (2 ** attempt) + 1  # 指数バックオフ
-                    logger.warning(f"一時的エラー。{wait_time}秒後にリトライ... (試行 {attempt + 1}/{retry_count})")
-                    await asyncio.sleep(wait_time)
-                    continue
-                
-                raise HTTPException(status_code=response.status_code, detail=error_detail)
-                
-        except httpx.TimeoutException:
-            if attempt < retry_count - 1:
-                logger.warning(f"タイムアウト。リトライ... (試行 {attempt + 1}/{retry_count})")
-                await asyncio.sleep((2 ** attempt) + 1)
-                continue
-            raise HTTPException(status_code=408, detail="Twitter API接続タイムアウト")
+    client = http_clients.get_async_client("twitter")
+    
+    async def attempt():
+        response = await client.post(url, headers=headers, json=json_data)
+        await twitter_rate_limit.record_response_async(access_token, response.headers)
+        if response.status_code == 429:
+            logger.warning(f"Twitter APIレート制限: reset={response.headers.get('x-rate-limit-reset')}")
+        return response
+    
+    try:
+        for _ in range(RATE_LIMIT_MAX_REWAITS + 1):
+            # 投稿枠のリセット待ちはサーキットブレーカーの外で行う（試験呼び出しの枠を待機中に保持しない）
+            await _wait_for_rate_limit_async(access_token, max_rate_limit_wait)
+            response = await twitter_circuit_breaker.call_async(lambda: twitter_retry.call_async(
+                attempt, idempotent=False, retry_after=_retry_after, max_attempts=retry_count
+            ))
+            if response.status_code != 429 or twitter_rate_limit.parse_rate_limit_headers(response.headers) is None:
+                break
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=408, detail="Twitter API接続タイムアウト")
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=503, detail=f"Twitter API接続エラー: {str(e)}")
+    
+    # 成功
+    if response.status_code == 201:
+        result = response.json()
         
-        except httpx.RequestError as e:
-            if attempt < retry_count - 1:
-                logger.warning(f"接続エラー。リトライ... (試行 {attempt + 1}/{retry_count}): {str(e)}")
-                await asyncio.sleep((2 ** attempt) + 1)
-                continue
-            raise HTTPException(status_code=503, detail=f"Twitter API接続エラー: {str(e)}")
+        # 投稿履歴・重複索引をRedisに保存
+        await _record_post_async(result, tweet_text, user_id)
+        
+        return result
     
-    raise HTTPException(status_code=500, detail="Twitter投稿に失敗しました（全リトライ試行完了）")
+    if response.status_code == 429:
+        parsed = twitter_rate_limit.parse_rate_limit_headers(response.headers)
+        if parsed is not None:
+            raise TwitterRateLimitExceeded(parsed[2])
+        raise HTTPException(status_code=429, detail="Twitter APIレート制限により投稿できませんでした")
+    
+    raise HTTPException(status_code=response.status_code, detail=f"Twitter API v2エラー: {response.status_code} - {response.text}")
 
-def post_tweet_v2(access_token: str, tweet_text: str):
+def post_tweet_v2(
+    access_token: str,
+    tweet_text: str,
+    user_id: Optional[int] = None,
+    history: Optional[Dict[str, Any]] = None
+):
     """同期版（後方互換性のため保持）"""
+    try:
+        result = _post_tweet_v2(access_token, tweet_text, user_id)
+    except Exception as e:
+        _record_outcome(user_id, tweet_text, history, error=e)
+        raise
+    _record_outcome(user_id, tweet_text, history, result=result)
+    return result
+
+def _post_tweet_v2(access_token: str, tweet_text: str, user_id: Optional[int]):
+    _ensure_tweet_length(tweet_text)
     url = "https://api.twitter.com/2/tweets"
     headers = {
         "Authorization": f"Bearer {access_token}",
@@ -129,9 +248,25 @@ def post_tweet_v2(access_token: str, tweet_text: str):
     }
     
     try:
-        response = requests.post(url, headers=headers, json=json_data, timeout=30)
+        session = http_clients.get_session("twitter")
+        
+        def attempt():
+            # 同期版はリクエストスレッドを塞がないよう待機せず、解除時刻を Retry-After で返す
+            reset_at = twitter_rate_limit.reserve(access_token)
+            if reset_at is not None:
+                raise TwitterRateLimitExceeded(reset_at)
+            response = session.post(url, headers=headers, json=json_data, timeout=settings.TWITTER_HTTP_TIMEOUT)
+            twitter_rate_limit.record_response(access_token, response.headers)
+            return response
+        
+        response = twitter_circuit_breaker.call(
+            lambda: twitter_retry.call(attempt, idempotent=False, retry_after=_retry_after)
+        )
         
         if response.status_code == 429:
+            parsed = twitter_rate_limit.parse_rate_limit_headers(response.headers)
+            if parsed is not None:
+                raise TwitterRateLimitExceeded(parsed[2])
             raise HTTPException(status_code=429, detail="Twitter APIレート制限に達しました")
         
         if response.status_code != 201:
@@ -139,17 +274,8 @@ def post_tweet_v2(access_token: str, tweet_text: str):
         
         result = response.json()
         
-        # 投稿履歴保存
-        try:
-            post_data = {
-                "tweet_id": result.get("data", {}).get("id"),
-                "text": tweet_text,
-                "timestamp": time.time(),
-                "status": "success"
-            }
-            redis_client.setex(f"tweet_history:{result.get('data', {}).get('id')}", 86400, json.dumps(post_data))
-        except Exception as e:
-            logger.warning(f"投稿履歴保存エラー: {e}")
+        # 投稿履歴・重複索引保存
+        _record_post(result, tweet_text, user_id)
         
         return result
         
@@ -171,7 +297,10 @@ async def batch_post_tweets(tweets_data: List[Dict[str, Any]]) -> List[Dict[str,
                 access_token = tweet_data["access_token"]
                 tweet_text = tweet_data["tweet_text"]
                 
-                result = await post_tweet_v2_async(access_token, tweet_text)
+                result = await post_tweet_v2_async(
+                    access_token, tweet_text,
+                    user_id=tweet_data.get("user_id"), history=tweet_data
+                )
                 return {
                     "success": True,
                     "tweet_id": result.get("data", {}).get("id"),
@@ -192,28 +321,51 @@ async def batch_post_tweets(tweets_data: List[Dict[str, Any]]) -> List[Dict[str,
 
 def get_tweet_history(tweet_id: str) -> Optional[Dict[str, Any]]:
     """投稿履歴を取得"""
+    return cache_store.get_json(f"tweet_history:{tweet_id}")
+
+def is_duplicate_tweet(tweet_text: str, window_hours: int = 24, user_id: Optional[int] = None) -> bool:
+    """重複投稿チェック（正規化本文ハッシュの索引を1往復で確認）"""
     try:
-        data = redis_client.get(f"tweet_history:{tweet_id}")
-        if data:
-            return json.loads(data)
+        # 過去24時間の投稿をチェック
+        return duplicate_index.is_duplicate(tweet_text, user_id, window_hours)
     except Exception as e:
-        logger.warning(f"投稿履歴取得エラー: {e}")
-    return None
+        logger.warning(f"重複チェックエラー: {e}")
+    
+    return False
 
-def is_duplicate_tweet(tweet_text: str, window_hours: int = 24) -> bool:
-    """重複投稿チェック"""
+async def is_duplicate_tweet_async(tweet_text: str, window_hours: int = 24, user_id: Optional[int] = None) -> bool:
+    """重複投稿チェック（非同期版）"""
     try:
-        # 過去24時間の投稿をチェック
-        keys = redis_client.keys("tweet_history:*")
-        for key in keys:
-            data = redis_client.get(key)
-            if data:
-                post_data = json.loads(data)
-                if post_data.get("text") == tweet_text:
-                    post_time = post_data.get("timestamp", 0)
-                    if time.time() - post_time < window_hours * 3600:
-                        return True
+        return await duplicate_index.is_duplicate_async(tweet_text, user_id, window_hours)
     except Exception as e:
         logger.warning(f"重複チェックエラー: {e}")
     
-    return False 
\ No newline at end of file
+    return False
+
+def is_near_duplicate_tweet(tweet_text: str, window_hours: int = 24, user_id: Optional[int] = None) -> bool:
+    """類似投稿チェック（ハッシュタグ・絵文字・句読点だけが異なる案を検出）"""
+    if not settings.ENABLE_NEAR_DUPLICATE_CHECK:
+        return False
+    try:
+        distance = near_duplicate.find_near_duplicate(tweet_text, user_id, window_hours)
+        if distance is not None:
+            logger.info(f"類似投稿を検出: ハミング距離 {distance}")
+            return True
+    except Exception as e:
+        logger.warning(f"類似チェックエラー: {e}")
+    
+    return False
+
+async def is_near_duplicate_tweet_async(tweet_text: str, window_hours: int = 24, user_id: Optional[int] = None) -> bool:
+    """類似投稿チェック（非同期版）"""
+    if not settings.ENABLE_NEAR_DUPLICATE_CHECK:
+        return False
+    try:
+        distance = await near_duplicate.find_near_duplicate_async(tweet_text, user_id, window_hours)
+        if distance is not None:
+            logger.info(f"類似投稿を検出: ハミング距離 {distance}")
+            return True
+    except Exception as e:
+        logger.warning(f"類似チェックエラー: {e}")
+    
+    return False
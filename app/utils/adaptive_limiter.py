@@ -0,0 +1,61 @@
+"""
+適応的な同時実行数制御（AIMD）
+
+上流APIのレート制限（429）を受けたら同時実行数を半減し、Retry-After の間は新規実行を止める。
+成功が同時実行数ぶん続くたびに1ずつ戻し、上限（max_limit）まで回復させる。
+"""
+import asyncio
+from typing import Any, Dict
+
+
+class AdaptiveLimiter:
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = self.max_limit
+        self._active = 0
+        self._successes = 0
+        self._resume_at = 0.0
+        self._cond = asyncio.Condition()
+        self.stats = {"throttled": 0, "decreases": 0, "increases": 0}
+
+    async def acquire(self):
+        """実行枠を取得（同時実行数の上限・429後の待機中はブロック）"""
+        loop = asyncio.get_running_loop()
+        async with self._cond:
+            while True:
+                delay = self._resume_at - loop.time()
+                if delay <= 0 and self._active < self.limit:
+                    self._active += 1
+                    return
+                try:
+                    await asyncio.wait_for(self._cond.wait(), timeout=delay if delay > 0 else None)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, success: bool = True):
+        """実行枠を返却（成功が同時実行数ぶん続いたら上限を1戻す）"""
+        async with self._cond:
+            self._active -= 1
+            if success and self.limit < self.max_limit:
+                self._successes += 1
+                if self._successes >= self.limit:
+                    self.limit += 1
+                    self._successes = 0
+                    self.stats["increases"] += 1
+            self._cond.notify_all()
+
+    async def throttle(self, retry_after: float):
+        """429を受けた: 同時実行数を半減し、retry_after 秒は新規実行を止める"""
+        loop = asyncio.get_running_loop()
+        async with self._cond:
+            self.stats["throttled"] += 1
+            if self.limit > self.min_limit:
+                self.limit = max(self.min_limit, self.limit // 2)
+                self.stats["decreases"] += 1
+            self._successes = 0
+            self._resume_at = max(self._resume_at, loop.time() + max(0.0, retry_after))
+            self._cond.notify_all()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"limit": self.limit, "max_limit": self.max_limit, "active": self._active, **self.stats}
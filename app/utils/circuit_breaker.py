@@ -0,0 +1,295 @@
+"""
+分散サーキットブレーカー（上流APIごと・全ワーカー共通）
+
+状態は Redis のハッシュ circuit:{name}（state / opened_at / probes / probe_successes）に、
+呼び出し結果はスライディングウィンドウ circuit:{name}:window（CIRCUIT_WINDOW_SECONDS を10分割した
+バケットごとの呼び出し数・失敗数）に保存する。どのワーカーで失敗しても同じウィンドウに数えるため、
+上流が落ちたときにワーカーごとに失敗を重ねてから遮断する必要がない。
+
+  CLOSED    : ウィンドウ内の失敗数が *_CIRCUIT_FAILURE_THRESHOLD 以上、かつ失敗率が
+              CIRCUIT_FAILURE_RATE 以上になったら OPEN
+  OPEN      : *_CIRCUIT_RECOVERY_TIMEOUT の間は呼び出さずに 503 を返す。経過後は HALF_OPEN
+  HALF_OPEN : CIRCUIT_HALF_OPEN_PROBES 件まで試験呼び出しを許可し、その回数成功したら CLOSED、
+              1件でも失敗したら OPEN に戻す
+
+状態の判定・遷移はLuaスクリプトで原子的に行う。Redis障害時はブレーカーを素通りさせる（上流呼び出しを止めない）。
+失敗として数えるのは上流の障害（接続エラー・タイムアウト・5xx・408）のみで、
+4xx（リポジトリが存在しない・レート制限など）は上流が応答できているため成功として数える。
+"""
+import logging
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+from app.config import settings
+from app.services.cache_store import cache_store, async_cache_store
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_KEY_PREFIX = "circuit:"
+# スライディングウィンドウの分割数
+WINDOW_BUCKETS = 10
+
+# 呼び出し可否（0: 許可、正の値: 遮断中であと何秒か）
+_ACQUIRE_SCRIPT = """
+local state = redis.call('hget', KEYS[1], 'state')
+if not state then
+    return 0
+end
+local now = tonumber(ARGV[1])
+if state == 'open' then
+    local remaining = tonumber(redis.call('hget', KEYS[1], 'opened_at')) + tonumber(ARGV[2]) - now
+    if remaining > 0 then
+        return math.max(1, math.ceil(remaining))
+    end
+    redis.call('hset', KEYS[1], 'state', 'half_open', 'probes', 0, 'probe_successes', 0, 'probe_started', 0)
+end
+local probes = tonumber(redis.call('hget', KEYS[1], 'probes') or '0')
+if probes >= tonumber(ARGV[3]) then
+    -- 結果が記録されないまま時間が経った試験呼び出しの枠は解放する
+    if now - tonumber(redis.call('hget', KEYS[1], 'probe_started') or '0') < tonumber(ARGV[4]) then
+        return 1
+    end
+    probes = 0
+end
+redis.call('hset', KEYS[1], 'probes', probes + 1, 'probe_started', now)
+redis.call('expire', KEYS[1], ARGV[5])
+return 0
+"""
+
+# 結果の記録（1: OPENに遷移、2: CLOSEDに復旧、0: 変化なし）
+_RECORD_SCRIPT = """
+local now = tonumber(ARGV[1])
+local failed = ARGV[2] == '1'
+local state = redis.call('hget', KEYS[1], 'state')
+if state == 'open' then
+    return 0
+end
+if state == 'half_open' then
+    if failed then
+        redis.call('hset', KEYS[1], 'state', 'open', 'opened_at', now, 'probes', 0, 'probe_successes', 0)
+        redis.call('expire', KEYS[1], ARGV[8])
+        return 1
+    end
+    local successes = redis.call('hincrby', KEYS[1], 'probe_successes', 1)
+    if successes >= tonumber(ARGV[7]) then
+        redis.call('del', KEYS[1], KEYS[2])
+        return 2
+    end
+    local probes = tonumber(redis.call('hget', KEYS[1], 'probes') or '0')
+    redis.call('hset', KEYS[1], 'probes', math.max(0, probes - 1))
+    return 0
+end
+local bucket_seconds = tonumber(ARGV[3])
+local bucket = math.floor(now / bucket_seconds)
+redis.call('hincrby', KEYS[2], bucket .. ':n', 1)
+if failed then
+    redis.call('hincrby', KEYS[2], bucket .. ':f', 1)
+end
+redis.call('expire', KEYS[2], math.ceil(tonumber(ARGV[4])) + 1)
+if not failed then
+    return 0
+end
+local oldest = bucket - math.ceil(tonumber(ARGV[4]) / bucket_seconds) + 1
+local fields = redis.call('hgetall', KEYS[2])
+local total, failures = 0, 0
+for i = 1, #fields, 2 do
+    local b, kind = string.match(fields[i], '^(%d+):(%a)$')
+    if tonumber(b) < oldest then
+        redis.call('hdel', KEYS[2], fields[i])
+    elseif kind == 'n' then
+        total = total + tonumber(fields[i + 1])
+    else
+        failures = failures + tonumber(fields[i + 1])
+    end
+end
+if failures >= tonumber(ARGV[5]) and failures >= total * tonumber(ARGV[6]) then
+    redis.call('hset', KEYS[1], 'state', 'open', 'opened_at', now, 'probes', 0, 'probe_successes', 0)
+    redis.call('expire', KEYS[1], ARGV[8])
+    redis.call('del', KEYS[2])
+    return 1
+end
+return 0
+"""
+
+
+class CircuitOpenError(HTTPException):
+    """遮断中の上流API（retry_after: 試験呼び出しを許可するまでの秒数）"""
+    def __init__(self, label: str, retry_after: int):
+        super().__init__(
+            status_code=503,
+            detail=f"{label} APIは一時的に利用できません（{retry_after}秒後に再試行してください）",
+            headers={"Retry-After": str(retry_after)}
+        )
+        self.retry_after = retry_after
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """上流の障害として数える例外か（ステータスのない例外・5xx・408）"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        return not isinstance(error, CircuitOpenError)
+    return status_code >= 500 or status_code == 408
+
+
+def _is_failed_response(result: Any) -> bool:
+    status_code = getattr(result, "status_code", None)
+    return status_code is not None and (status_code >= 500 or status_code == 408)
+
+
+class CircuitBreaker:
+    """上流API単位のサーキットブレーカー（状態はRedisで全ワーカー共有）"""
+    def __init__(self, name: str, label: str, failure_threshold: int, recovery_timeout: int):
+        self.name = name
+        self.label = label
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+
+    @property
+    def _keys(self):
+        key = CIRCUIT_KEY_PREFIX + self.name
+        return key, key + ":window"
+
+    def _acquire_args(self):
+        return (
+            time.time(), self.recovery_timeout, settings.CIRCUIT_HALF_OPEN_PROBES,
+            settings.CIRCUIT_PROBE_TIMEOUT, self._state_ttl()
+        )
+
+    def _record_args(self, failed: bool):
+        return (
+            time.time(), 1 if failed else 0, settings.CIRCUIT_WINDOW_SECONDS / WINDOW_BUCKETS,
+            settings.CIRCUIT_WINDOW_SECONDS, self.failure_threshold, settings.CIRCUIT_FAILURE_RATE,
+            settings.CIRCUIT_HALF_OPEN_PROBES, self._state_ttl()
+        )
+
+    def _state_ttl(self) -> int:
+        # 半開のまま放置された状態も残さない
+        return self.recovery_timeout + settings.CIRCUIT_PROBE_TIMEOUT + settings.CIRCUIT_WINDOW_SECONDS
+
+    def _log_transition(self, transition: int):
+        if transition == 1:
+            logger.warning(f"サーキットブレーカー作動: {self.label} APIを{self.recovery_timeout}秒間遮断します")
+        elif transition == 2:
+            logger.info(f"サーキットブレーカー復旧: {self.label} API")
+
+    def _acquire(self) -> int:
+        try:
+            return int(cache_store.client.eval(_ACQUIRE_SCRIPT, 1, self._keys[0], *self._acquire_args()))
+        except Exception as e:
+            logger.debug(f"サーキットブレーカー状態取得エラー: {e}")
+            return 0
+
+    async def _acquire_async(self) -> int:
+        try:
+            return int(await async_cache_store.client.eval(_ACQUIRE_SCRIPT, 1, self._keys[0], *self._acquire_args()))
+        except Exception as e:
+            logger.debug(f"サーキットブレーカー状態取得エラー: {e}")
+            return 0
+
+    def _record(self, failed: bool):
+        try:
+            self._log_transition(cache_store.client.eval(_RECORD_SCRIPT, 2, *self._keys, *self._record_args(failed)))
+        except Exception as e:
+            logger.debug(f"サーキットブレーカー記録エラー: {e}")
+
+    async def _record_async(self, failed: bool):
+        try:
+            self._log_transition(
+                await async_cache_store.client.eval(_RECORD_SCRIPT, 2, *self._keys, *self._record_args(failed))
+            )
+        except Exception as e:
+            logger.debug(f"サーキットブレーカー記録エラー: {e}")
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """fn を実行し結果を記録（遮断中は呼ばずに CircuitOpenError）"""
+        if not settings.ENABLE_CIRCUIT_BREAKER:
+            return fn()
+        retry_after = self._acquire()
+        if retry_after:
+            raise CircuitOpenError(self.label, retry_after)
+        try:
+            result = fn()
+        except Exception as e:
+            self._record(is_upstream_failure(e))
+            raise
+        self._record(_is_failed_response(result))
+        return result
+
+    async def call_async(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """fn を実行し結果を記録（非同期版）"""
+        if not settings.ENABLE_CIRCUIT_BREAKER:
+            return await fn()
+        retry_after = await self._acquire_async()
+        if retry_after:
+            raise CircuitOpenError(self.label, retry_after)
+        try:
+            result = await fn()
+        except Exception as e:
+            await self._record_async(is_upstream_failure(e))
+            raise
+        await self._record_async(_is_failed_response(result))
+        return result
+
+    def _open_for(self, state: Dict[str, str]) -> Optional[int]:
+        if not settings.ENABLE_CIRCUIT_BREAKER or state.get("state") != "open":
+            return None
+        remaining = float(state.get("opened_at", 0)) + self.recovery_timeout - time.time()
+        return max(1, math.ceil(remaining)) if remaining > 0 else None
+
+    def open_for(self) -> Optional[int]:
+        """遮断中なら試験呼び出しを許可するまでの秒数（試験呼び出しの枠は消費しない）"""
+        try:
+            return self._open_for(cache_store.client.hgetall(self._keys[0]))
+        except Exception as e:
+            logger.debug(f"サーキットブレーカー状態取得エラー: {e}")
+            return None
+
+    async def open_for_async(self) -> Optional[int]:
+        """遮断中なら試験呼び出しを許可するまでの秒数（非同期版）"""
+        try:
+            return self._open_for(await async_cache_store.client.hgetall(self._keys[0]))
+        except Exception as e:
+            logger.debug(f"サーキットブレーカー状態取得エラー: {e}")
+            return None
+
+    def get_statistics(self) -> Dict[str, Any]:
+        state_key, window_key = self._keys
+        state = cache_store.client.hgetall(state_key)
+        window = cache_store.client.hgetall(window_key)
+        oldest = math.floor(time.time() * WINDOW_BUCKETS / settings.CIRCUIT_WINDOW_SECONDS) - WINDOW_BUCKETS + 1
+        counts = {"n": 0, "f": 0}
+        for field, value in window.items():
+            bucket, kind = field.split(":")
+            if int(bucket) >= oldest:
+                counts[kind] += int(value)
+        return {
+            "state": state.get("state", "closed"),
+            "open_for": self._open_for(state),
+            "failure_threshold": self.failure_threshold,
+            "recovery_timeout": self.recovery_timeout,
+            "window_requests": counts["n"],
+            "window_failures": counts["f"]
+        }
+
+
+# 上流API別サーキットブレーカー
+github_circuit_breaker = CircuitBreaker(
+    "github", "GitHub", settings.GITHUB_CIRCUIT_FAILURE_THRESHOLD, settings.GITHUB_CIRCUIT_RECOVERY_TIMEOUT
+)
+openai_circuit_breaker = CircuitBreaker(
+    "openai", "OpenAI", settings.OPENAI_CIRCUIT_FAILURE_THRESHOLD, settings.OPENAI_CIRCUIT_RECOVERY_TIMEOUT
+)
+twitter_circuit_breaker = CircuitBreaker(
+    "twitter", "Twitter", settings.TWITTER_CIRCUIT_FAILURE_THRESHOLD, settings.TWITTER_CIRCUIT_RECOVERY_TIMEOUT
+)
+
+
+def get_circuit_breaker_statistics() -> Dict[str, Dict[str, Any]]:
+    """上流APIごとのブレーカー状態とウィンドウ内の呼び出し数・失敗数"""
+    return {
+        breaker.name: breaker.get_statistics()
+        for breaker in (github_circuit_breaker, openai_circuit_breaker, twitter_circuit_breaker)
+    }
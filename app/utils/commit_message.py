@@ -0,0 +1,124 @@
+"""
+コミットメッセージの正規化（OpenAIキャッシュキー・プロンプト用）
+
+ツイート内容に影響しない差分（末尾空白・改行コード・Unicode正規化形・トレーラー行・
+マージコミットの定型文）を取り除き、同じ変更内容が同じキャッシュキーになるようにする。
+長いメッセージ（スカッシュマージ等）は件名と情報量の多い本文行だけをトークン予算内に残す。
+"""
+import re
+import unicodedata
+from typing import List, Tuple
+
+from app.utils.token_counter import count_tokens, truncate_to_tokens
+
+# 正規化で変化した理由（キャッシュ統計の内訳に使う）
+REASON_UNICODE = "unicode"
+REASON_WHITESPACE = "whitespace"
+REASON_TRAILERS = "trailers"
+REASON_MERGE = "merge"
+
+_TRAILER = re.compile(
+    r"^(co-authored-by|signed-off-by|reviewed-by|acked-by|tested-by|reported-by|suggested-by|helped-by|cc|change-id)\s*:",
+    re.IGNORECASE
+)
+_MERGE_PULL_REQUEST = re.compile(r"^Merge pull request #\d+ from \S+$")
+_MERGE_BRANCH = re.compile(r"^Merge (remote-tracking )?branch '[^']+'( of \S+)?( into \S+)?$")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def canonicalize_commit_message(message: str) -> Tuple[str, List[str]]:
+    """正規化後のメッセージと、変化した理由のリストを返す"""
+    reasons = []
+    message = message or ""
+
+    normalized = unicodedata.normalize("NFC", message)
+    if normalized != message:
+        reasons.append(REASON_UNICODE)
+
+    text = normalized.replace("\r\n", "\n").replace("\r", "\n")
+    lines = [line.rstrip() for line in text.split("\n")]
+    text = _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+    if text != normalized:
+        reasons.append(REASON_WHITESPACE)
+
+    lines = text.split("\n")
+    kept = [line for line in lines if not _TRAILER.match(line)]
+    if len(kept) != len(lines):
+        reasons.append(REASON_TRAILERS)
+        text = _BLANK_LINES.sub("\n\n", "\n".join(kept)).strip()
+
+    # "Merge pull request #12 from owner/branch" + 本文 → 本文（PRタイトル）だけを使う
+    subject, _, body = text.partition("\n")
+    if (_MERGE_PULL_REQUEST.match(subject) or _MERGE_BRANCH.match(subject)) and body.strip():
+        reasons.append(REASON_MERGE)
+        text = body.strip()
+
+    return text, reasons
+
+
+def canonical_commit_message(message: str) -> str:
+    return canonicalize_commit_message(message)[0]
+
+
+_NOISE_LINE = re.compile(
+    r"^(merge (branch|pull request|remote-tracking)|fixup!|squash!|wip\b|\d+ files? changed)|^[-=*_#~\s]+$",
+    re.IGNORECASE
+)
+_BULLET = re.compile(r"^\s*([-*+]|\d+[.)])\s+")
+_CONVENTIONAL = re.compile(r"^(feat|fix|perf|refactor|revert)(\([^)]*\))?!?:", re.IGNORECASE)
+_KEYWORDS = re.compile(
+    r"(add|fix|improv|support|introduc|remov|optimi[sz]|faster|speed|security|"
+    r"追加|修正|改善|対応|高速|削除|導入|新機能)",
+    re.IGNORECASE
+)
+# 省略行がある場合に末尾へ付ける注記のために確保するトークン数
+_OMISSION_RESERVE = 8
+
+
+def _line_score(line: str) -> int:
+    """本文1行の情報量（大きいほど優先して残す）"""
+    stripped = _BULLET.sub("", line).strip()
+    if not stripped or _NOISE_LINE.match(stripped):
+        return 0
+    score = 1
+    if _CONVENTIONAL.match(stripped):
+        score += 2
+    if _KEYWORDS.search(stripped):
+        score += 1
+    if "BREAKING" in stripped:
+        score += 3
+    return score
+
+
+def fit_commit_message(message: str, max_tokens: int) -> Tuple[str, bool]:
+    """件名と情報量の多い本文行を max_tokens 以内に収める（切り詰めたかどうかも返す）"""
+    if count_tokens(message) <= max_tokens:
+        return message, False
+
+    subject, _, body = message.partition("\n")
+    subject = truncate_to_tokens(subject, max(1, max_tokens - _OMISSION_RESERVE))
+    budget = max_tokens - count_tokens(subject) - _OMISSION_RESERVE
+
+    candidates = []
+    seen = set()
+    for index, line in enumerate(body.split("\n")):
+        key = line.strip().lower()
+        score = _line_score(line)
+        if score and key not in seen:
+            seen.add(key)
+            candidates.append((score, index, line))
+
+    # 情報量の高い順（同点は元の順）に予算内で採用し、元の順に戻して連結
+    selected = []
+    for score, index, line in sorted(candidates, key=lambda c: (-c[0], c[1])):
+        tokens = count_tokens(line) + 1
+        if tokens <= budget:
+            selected.append((index, line))
+            budget -= tokens
+    selected.sort()
+
+    lines = [subject] + [line for _, line in selected]
+    omitted = sum(1 for line in body.split("\n") if line.strip()) - len(selected)
+    if omitted > 0:
+        lines.append(f"…(+{omitted} lines)")
+    return "\n".join(lines), True
@@ -7,9 +7,9 @@ import traceback
 from typing import Dict, Any, Optional
 from fastapi import HTTPException, Request
 from fastapi.responses import JSONResponse
-import redis
 import json
 from app.config import settings
+from app.services.redis_pool import redis_pools
 
 # ログ設定
 logging.basicConfig(
@@ -25,9 +25,7 @@ logger = logging.getLogger(__name__)
 
 # Redis接続（エラー統計用）
 try:
-    # Redis接続（本番環境対応）
-    redis_url = settings.get_redis_url()
-    redis_client = redis.from_url(redis_url, decode_responses=True)
+    redis_client = redis_pools.get_client()
 except Exception as e:
     logger.warning(f"Redis接続エラー（エラー統計無効）: {e}")
     redis_client = None
@@ -180,46 +178,3 @@ def get_error_statistics() -> Dict[str, Any]:
     except Exception as e:
         logger.warning(f"エラー統計取得失敗: {e}")
         return {"error": f"統計取得エラー: {str(e)}"}
-
-class CircuitBreaker:
-    """サーキットブレーカーパターン実装"""
-    def __init__(self, failure_threshold: int = 5, recovery_timeout: int = 60):
-        self.failure_threshold = failure_threshold
-        self.recovery_timeout = recovery_timeout
-        self.failure_count = 0
-        self.last_failure_time = None
-        self.state = "CLOSED"  # CLOSED, OPEN, HALF_OPEN
-    
-    def can_execute(self) -> bool:
-        """実行可能かチェック"""
-        if self.state == "CLOSED":
-            return True
-        
-        if self.state == "OPEN":
-            if time.time() - self.last_failure_time > self.recovery_timeout:
-                self.state = "HALF_OPEN"
-                return True
-            return False
-        
-        if self.state == "HALF_OPEN":
-            return True
-        
-        return False
-    
-    def on_success(self):
-        """成功時の処理"""
-        self.failure_count = 0
-        self.state = "CLOSED"
-    
-    def on_failure(self):
-        """失敗時の処理"""
-        self.failure_count += 1
-        self.last_failure_time = time.time()
-        
-        if self.failure_count >= self.failure_threshold:
-            self.state = "OPEN"
-
-# サービス別サーキットブレーカー
-github_circuit_breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=300)
-openai_circuit_breaker = CircuitBreaker(failure_threshold=5, recovery_timeout=60)
-twitter_circuit_breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=180)
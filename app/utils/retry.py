@@ -0,0 +1,302 @@
+"""
+上流API呼び出しの再試行（GitHub / OpenAI / Twitter 共通）
+
+- 待機時間: decorrelated jitter（sleep = min(max_delay, uniform(base_delay, 前回 * 3))）。
+  同時に失敗した多数のリクエストが同じ間隔で再送して負荷の山を作らないようにする
+  Retry-After などでサーバーが待機時間を指定した場合はその秒数だけ待つ（max_delay を超えるなら再試行しない）
+- 再試行の判定: 送信前に失敗した（接続できない・429・503）なら常に再試行、
+  処理されたか分からない失敗（読み取りタイムアウト・500/502/504）は冪等な呼び出しのみ再試行
+- 再試行予算: サービスごとのトークンバケット。リクエスト1件ごとに budget_ratio だけ貯まり、
+  再試行1回で1消費する（障害時に再試行がトラフィックの budget_ratio 割合を超えて負荷を増幅しない）。
+  低トラフィックでも再試行できるよう、時間経過で毎秒 budget_min_per_second だけ補充する
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+import openai
+import requests
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 処理されていない（再送しても二重実行にならない）応答
+RETRY_ALWAYS_STATUSES = {429, 503}
+# 処理されたか分からない応答（冪等な呼び出しのみ再試行）
+RETRY_IDEMPOTENT_STATUSES = {500, 502, 504}
+
+# リクエストが送信されていない例外
+_NOT_SENT_ERRORS = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.PoolTimeout,
+    requests.exceptions.ConnectionError,
+)
+# 送信後に失敗した可能性がある例外
+_AMBIGUOUS_ERRORS = (
+    httpx.TimeoutException,
+    httpx.NetworkError,
+    httpx.RemoteProtocolError,
+    requests.exceptions.Timeout,
+    openai.APIConnectionError,  # APITimeoutError を含む
+    openai.InternalServerError,
+)
+
+# 判定結果
+NOT_RETRYABLE = "not_retryable"
+RETRYABLE = "retryable"
+RETRYABLE_IF_IDEMPOTENT = "retryable_if_idempotent"
+
+_policies: Dict[str, "RetryPolicy"] = {}
+
+
+def header_retry_after(headers) -> Optional[float]:
+    """Retry-After / retry-after-ms（秒）"""
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def classify_status(status_code: int) -> str:
+    if status_code in RETRY_ALWAYS_STATUSES:
+        return RETRYABLE
+    if status_code in RETRY_IDEMPOTENT_STATUSES:
+        return RETRYABLE_IF_IDEMPOTENT
+    return NOT_RETRYABLE
+
+
+def is_permanent_status(status_code: Optional[int]) -> bool:
+    """再試行しても結果が変わらない応答（429・408以外の4xx）"""
+    return isinstance(status_code, int) and 400 <= status_code < 500 and status_code not in (408, 429)
+
+
+def classify_error(error: BaseException) -> str:
+    if isinstance(error, openai.RateLimitError):
+        # 利用枠の超過は待っても回復しない
+        return NOT_RETRYABLE if getattr(error, "code", None) == "insufficient_quota" else RETRYABLE
+    if isinstance(error, _NOT_SENT_ERRORS):
+        return RETRYABLE
+    if isinstance(error, _AMBIGUOUS_ERRORS):
+        return RETRYABLE_IF_IDEMPOTENT
+    return NOT_RETRYABLE
+
+
+class RetryBudget:
+    """再試行の予算（スレッドセーフなトークンバケット）"""
+    def __init__(self, ratio: float, min_per_second: float, capacity: float):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = capacity
+        self._balance = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._balance = min(self.capacity, self._balance + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self):
+        """リクエスト1件ぶん（ratio）を貯める"""
+        with self._lock:
+            self._refill()
+            self._balance = min(self.capacity, self._balance + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        """再試行1回ぶんを消費（足りなければFalse）"""
+        with self._lock:
+            self._refill()
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+    @property
+    def balance(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._balance
+
+
+class RetryPolicy:
+    """サービス単位の再試行ポリシー
+
+    call / call_async に渡す関数は1回分の呼び出しを行い、HTTPレスポンス（status_code を持つ）か
+    任意の戻り値を返す。再試行対象のステータスは試行回数が残っていれば再送し、
+    使い切った場合はそのレスポンスを返す（エラーへの変換は呼び出し側の既存処理に任せる）。
+    """
+    def __init__(
+        self,
+        name: str,
+        max_attempts: Optional[int] = None,
+        base_delay: Optional[float] = None,
+        max_delay: Optional[float] = None,
+        budget_ratio: Optional[float] = None
+    ):
+        self.name = name
+        self.max_attempts = max_attempts or settings.RETRY_MAX_ATTEMPTS
+        self.base_delay = base_delay if base_delay is not None else settings.RETRY_BASE_DELAY
+        self.max_delay = max_delay if max_delay is not None else settings.RETRY_MAX_DELAY
+        self.budget = RetryBudget(
+            budget_ratio if budget_ratio is not None else settings.RETRY_BUDGET_RATIO,
+            settings.RETRY_BUDGET_MIN_PER_SECOND,
+            settings.RETRY_BUDGET_CAPACITY
+        )
+        self._counters: Dict[str, int] = {}
+        self._counters_lock = threading.Lock()
+        _policies[name] = self
+
+    def _count(self, field: str):
+        with self._counters_lock:
+            self._counters[field] = self._counters.get(field, 0) + 1
+
+    def _next_delay(self, previous: float) -> float:
+        return min(self.max_delay, random.uniform(self.base_delay, max(self.base_delay, previous * 3)))
+
+    def _retry_delay(
+        self,
+        attempt: int,
+        previous: float,
+        kind: str,
+        idempotent: bool,
+        retry_after: Optional[float],
+        max_attempts: int
+    ) -> Optional[float]:
+        """再試行するなら待機秒数、しないならNone（理由をカウント）"""
+        if kind == NOT_RETRYABLE or (kind == RETRYABLE_IF_IDEMPOTENT and not idempotent):
+            self._count("not_retryable")
+            return None
+        if attempt >= max_attempts:
+            self._count("exhausted")
+            return None
+        if retry_after is not None and retry_after > self.max_delay:
+            self._count("retry_after_too_long")
+            return None
+        if not self.budget.try_withdraw():
+            self._count("budget_exhausted")
+            logger.warning(f"{self.name}: 再試行予算を使い切ったため再試行しません")
+            return None
+        self._count("retries")
+        # サーバーが待機時間を指定した場合はそれに従う（0 は呼び出し側が次の試行の中で待つ意味）
+        return retry_after if retry_after is not None else self._next_delay(previous)
+
+    def _on_error(
+        self,
+        error: Exception,
+        attempt: int,
+        previous: float,
+        idempotent: bool,
+        max_attempts: int
+    ) -> Optional[float]:
+        kind = classify_error(error)
+        headers = getattr(getattr(error, "response", None), "headers", None)
+        wait = self._retry_delay(attempt, previous, kind, idempotent, header_retry_after(headers), max_attempts)
+        if wait is None:
+            self._count("errors")
+        else:
+            logger.warning(f"{self.name}: {type(error).__name__} のため{wait:.2f}秒後に再試行 (試行 {attempt}/{max_attempts})")
+        return wait
+
+    def _on_result(
+        self,
+        result: Any,
+        attempt: int,
+        previous: float,
+        idempotent: bool,
+        retry_after: Callable[[Any], Optional[float]],
+        max_attempts: int
+    ) -> Optional[float]:
+        status_code = getattr(result, "status_code", None)
+        kind = classify_status(status_code) if status_code is not None else NOT_RETRYABLE
+        if kind == NOT_RETRYABLE:
+            self._count("completed")
+            return None
+        wait = self._retry_delay(attempt, previous, kind, idempotent, retry_after(result), max_attempts)
+        if wait is None:
+            self._count("gave_up")
+        else:
+            logger.warning(f"{self.name}: HTTP {status_code} のため{wait:.2f}秒後に再試行 (試行 {attempt}/{max_attempts})")
+        return wait
+
+    async def call_async(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        idempotent: bool,
+        retry_after: Callable[[Any], Optional[float]] = lambda response: header_retry_after(response.headers),
+        max_attempts: Optional[int] = None
+    ) -> Any:
+        """fn を再試行ポリシーに従って実行（非同期）"""
+        self.budget.deposit()
+        max_attempts = max_attempts or self.max_attempts
+        delay = self.base_delay
+        attempt = 0
+        while True:
+            attempt += 1
+            self._count("attempts")
+            try:
+                result = await fn()
+            except Exception as e:
+                delay = self._on_error(e, attempt, delay, idempotent, max_attempts)
+                if delay is None:
+                    raise
+            else:
+                delay = self._on_result(result, attempt, delay, idempotent, retry_after, max_attempts)
+                if delay is None:
+                    return result
+            if delay:
+                await asyncio.sleep(delay)
+
+    def call(
+        self,
+        fn: Callable[[], Any],
+        idempotent: bool,
+        retry_after: Callable[[Any], Optional[float]] = lambda response: header_retry_after(response.headers),
+        max_attempts: Optional[int] = None
+    ) -> Any:
+        """fn を再試行ポリシーに従って実行（同期）"""
+        self.budget.deposit()
+        max_attempts = max_attempts or self.max_attempts
+        delay = self.base_delay
+        attempt = 0
+        while True:
+            attempt += 1
+            self._count("attempts")
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._on_error(e, attempt, delay, idempotent, max_attempts)
+                if delay is None:
+                    raise
+            else:
+                delay = self._on_result(result, attempt, delay, idempotent, retry_after, max_attempts)
+                if delay is None:
+                    return result
+            if delay:
+                time.sleep(delay)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        with self._counters_lock:
+            counters = dict(self._counters)
+        return {
+            "max_attempts": self.max_attempts,
+            "budget_ratio": self.budget.ratio,
+            "budget_balance": round(self.budget.balance, 2),
+            **counters
+        }
+
+
+def get_retry_statistics() -> Dict[str, Dict[str, Any]]:
+    """サービスごとの試行・再試行・結果の回数（プロセス内）"""
+    return {name: policy.get_statistics() for name, policy in _policies.items()}
@@ -0,0 +1,153 @@
+"""
+シングルフライト（同一キーの同時リクエスト集約）
+
+同じリポジトリ・同じコミットに対するキャッシュミスが同時に発生した場合、
+上流API（GitHub / OpenAI）を呼ぶのは1回だけにする。
+
+  プロセス内 : 実行中の Future を共有し、後続の呼び出しはその結果を await する
+  ワーカー間 : Redis の短期ロック（SET NX PX）を取得したリーダーだけが上流を呼び、
+               フォロワーはリーダーが書き込んだキャッシュをポーリングして待つ
+"""
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.config import settings
+from app.services.cache_store import cache_store, async_cache_store
+
+logger = logging.getLogger(__name__)
+
+# 集約統計（全ワーカー共通のRedisハッシュ）
+SINGLE_FLIGHT_STATS_KEY = "single_flight_stats"
+
+# 自分が取得したロックのみ解放する
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """キー単位で上流呼び出しを1回に集約する"""
+    def __init__(self, name: str, lock_ttl: float, wait_timeout: Optional[float] = None):
+        self.name = name
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout if wait_timeout is not None else lock_ttl
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _lock_key(self, key: str) -> str:
+        return f"single_flight:{self.name}:{key}"
+
+    async def _record(self, event: str):
+        await async_cache_store.incr_counter(SINGLE_FLIGHT_STATS_KEY, f"{self.name}:{event}")
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        lookup: Callable[[], Awaitable[Optional[Any]]]
+    ) -> Any:
+        """
+        fn を集約して実行する
+
+        key    : 集約単位（リポジトリ名やキャッシュキー）
+        fn     : 上流APIを呼び、結果をキャッシュに保存するコルーチン関数
+        lookup : キャッシュ済みの結果を返す（未保存ならNone）コルーチン関数
+        """
+        if not settings.ENABLE_SINGLE_FLIGHT:
+            return await fn()
+
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight.get_loop() is loop and not inflight.done():
+            # プロセス内で実行中のリクエストに相乗り
+            await self._record("local_coalesced")
+            return await asyncio.shield(inflight)
+
+        future = loop.create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._run_distributed(key, fn, lookup)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # 相乗りがいない場合の "exception was never retrieved" 警告を抑止
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _run_distributed(self, key, fn, lookup) -> Any:
+        """Redisロックでワーカー間のリーダーを1つに絞る"""
+        client = async_cache_store.client
+        lock_key = self._lock_key(key)
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.wait_timeout
+
+        while True:
+            try:
+                acquired = await client.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+            except Exception as e:
+                # Redis障害時は集約せずに実行
+                logger.warning(f"シングルフライトロック取得エラー（集約なしで実行）: {e}")
+                return await fn()
+
+            if acquired:
+                break
+
+            # フォロワー: リーダーの結果がキャッシュに入るまで待つ
+            result = await self._wait_for_leader(lock_key, lookup, deadline)
+            if result is not None:
+                await self._record("remote_coalesced")
+                return result
+            if time.monotonic() >= deadline:
+                logger.warning(f"シングルフライト待機タイムアウト（自ワーカーで実行）: {lock_key}")
+                await self._record("wait_timeouts")
+                return await fn()
+            # リーダーが結果を残さずにロックを解放した（失敗）→ ロック取得からやり直す
+
+        try:
+            # ロック取得までの間に他ワーカーが保存していれば再利用
+            result = await lookup()
+            if result is not None:
+                await self._record("remote_coalesced")
+                return result
+            await self._record("leader")
+            return await fn()
+        finally:
+            try:
+                await client.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+            except Exception as e:
+                logger.debug(f"シングルフライトロック解放エラー: {e}")
+
+    async def _wait_for_leader(self, lock_key, lookup, deadline) -> Optional[Any]:
+        """キャッシュに結果が入るか、ロックが消えるか、期限まで待つ"""
+        client = async_cache_store.client
+        while time.monotonic() < deadline:
+            await asyncio.sleep(settings.SINGLE_FLIGHT_POLL_INTERVAL)
+            result = await lookup()
+            if result is not None:
+                return result
+            try:
+                if not await client.exists(lock_key):
+                    return await lookup()
+            except Exception:
+                return None
+        return None
+
+
+def get_single_flight_statistics() -> Dict[str, Dict[str, int]]:
+    """集約統計を名前ごとに整形（leader / local_coalesced / remote_coalesced / wait_timeouts）"""
+    stats: Dict[str, Dict[str, int]] = {}
+    for field, value in cache_store.get_counters(SINGLE_FLIGHT_STATS_KEY).items():
+        name, _, event = field.partition(":")
+        stats.setdefault(name, {})[event] = value
+    for counters in stats.values():
+        counters["coalesced_total"] = counters.get("local_coalesced", 0) + counters.get("remote_coalesced", 0)
+    return stats
@@ -0,0 +1,78 @@
+"""
+ローカルでのトークン数計算（ネットワーク不要）
+
+tiktoken とエンコーディングファイル（TIKTOKEN_CACHE_DIR に事前配置、Dockerイメージのビルド時に取得）が
+あれば正確に数え、なければ文字種ごとの近似で見積もる。どちらもリクエスト時に外部通信はしない。
+"""
+import logging
+import math
+import os
+import re
+from typing import Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_encoding = None
+_encoding_loaded = False
+
+# 英数字の連続 / 数字 / その他1文字（CJK・記号は概ね1トークン）
+_APPROX_PATTERN = re.compile(r"[A-Za-z]+|\d+|\S")
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if _encoding_loaded:
+        return _encoding
+    _encoding_loaded = True
+    try:
+        import tiktoken
+        # キャッシュ未配置の環境ではダウンロードが発生するため使わない
+        if not os.environ.get("TIKTOKEN_CACHE_DIR"):
+            raise RuntimeError("TIKTOKEN_CACHE_DIR が未設定です")
+        _encoding = tiktoken.get_encoding(settings.OPENAI_TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.info(f"tiktokenを使用できないため近似でトークン数を計算します: {e}")
+        _encoding = None
+    return _encoding
+
+
+def _approximate_tokens(text: str) -> int:
+    count = 0
+    for piece in _APPROX_PATTERN.findall(text):
+        if piece[0].isascii() and piece[0].isalpha():
+            count += math.ceil(len(piece) / 4)
+        elif piece[0].isdigit():
+            count += math.ceil(len(piece) / 3)
+        else:
+            count += 1
+    return count
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """テキストのトークン数"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return _approximate_tokens(text)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """先頭から max_tokens 以内に収まるよう切り詰める"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+    # 近似: 二分探索で収まる最長の先頭部分を求める
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if _approximate_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
@@ -0,0 +1,198 @@
+"""
+ツイートの重み付き文字数（Twitterの文字数カウント）と上限への切り詰め
+
+Twitter（twitter-text v3）はラテン文字などを1、日本語・絵文字などを2として数え、合計280までを許可する。
+URLは長さに関係なく23、絵文字（肌色・ZWJ結合・国旗を含む1シーケンス）は2として数える。
+
+文字数の計算はインポート時に用意した表で行う:
+- 合計: UTF-8の先頭バイト→重み2かどうかの256バイト表で bytes.translate し、重み2の文字数を数える
+  （先頭バイトだけでは決まらない U+1000〜U+1FFF・U+2000〜U+2FFF の一部は正規表現で補正）
+- 切り詰め位置の探索: 基本多言語面（BMP）65536要素の重み表を1文字ずつ引く
+ASCIIのみの本文は len() だけで済ませる。
+"""
+import re
+import unicodedata
+from typing import List, Optional, Tuple
+
+MAX_WEIGHTED_LENGTH = 280
+URL_WEIGHT = 23
+EMOJI_WEIGHT = 2
+DEFAULT_WEIGHT = 2
+ELLIPSIS = "…"
+
+# 重み1として数えるコードポイント範囲（twitter-text v3 の設定、残りはすべて重み2）
+_LIGHT_RANGES = (
+    (0x0000, 0x10FF),
+    (0x2000, 0x200D),
+    (0x2010, 0x201F),
+    (0x2032, 0x2037),
+)
+
+
+def _build_weight_table() -> bytes:
+    table = bytearray([DEFAULT_WEIGHT]) * 0x10000
+    for start, end in _LIGHT_RANGES:
+        table[start:end + 1] = b"\x01" * (end - start + 1)
+    return bytes(table)
+
+
+def _build_lead_byte_table() -> bytes:
+    """UTF-8の各バイト → b"H"（重み2の文字の先頭バイト）/ b"."（それ以外）"""
+    table = bytearray(b".") * 256
+    # 0xE1: U+1000〜U+1FFF、0xE2: U+2000〜U+2FFF（一部は重み1のため _LIGHT_MIXED で差し引く）
+    # 0xE3〜0xEF: U+3000〜U+FFFF、0xF0〜0xF4: U+10000以降（すべて重み2）
+    for byte in range(0xE1, 0xF5):
+        table[byte] = ord("H")
+    return bytes(table)
+
+
+_WEIGHT_TABLE = _build_weight_table()
+_LEAD_BYTE_TABLE = _build_lead_byte_table()
+# 先頭バイト 0xE1 / 0xE2 のうち重み1の範囲（U+1000〜U+10FF, U+2000〜U+200D, U+2010〜U+201F, U+2032〜U+2037）
+_LIGHT_MIXED = re.compile(rb"\xe1[\x80-\x83]|\xe2\x80[\x80-\x8d\x90-\x9f\xb2-\xb7]")
+
+_URL = re.compile(r"https?://[^\s　-ヿ一-鿿＀-￯]+", re.IGNORECASE)
+_EMOJI = re.compile(
+    "(?:[\U0001F1E6-\U0001F1FF]{2}"  # 国旗（地域指示記号のペア）
+    "|[©®‼⁉™ℹ↔-↪⌚-⏿Ⓜ▪-➿⤴⤵"
+    "⬅-⭕〰〽㊗㊙\U0001F000-\U0001FAFF]"
+    "[️\U0001F3FB-\U0001F3FF]*"
+    "(?:‍[☀-➿\U0001F000-\U0001FAFF][️\U0001F3FB-\U0001F3FF]*)*)"
+)
+# 切り詰め位置の候補（空白・句読点の直後）
+_BOUNDARY = re.compile(r"[\s、。，．！？!?,.]+")
+_TRAILING_HASHTAGS = re.compile(r"(?:\s+[#＃][^\s#＃]+)+\s*$")
+_HASHTAG = re.compile(r"[#＃][^\s#＃]+")
+
+
+def _text_weight(text: str) -> int:
+    """URL・絵文字シーケンスを含まない部分の重み"""
+    if text.isascii():
+        return len(text)
+    encoded = text.encode("utf-8")
+    heavy = encoded.translate(_LEAD_BYTE_TABLE).count(b"H")
+    if b"\xe1" in encoded or b"\xe2" in encoded:
+        heavy -= len(_LIGHT_MIXED.findall(encoded))
+    return len(text) + heavy
+
+
+def _has_special(text: str) -> bool:
+    """URL・絵文字シーケンス（ZWJ結合・異体字セレクタ・肌色・国旗）を含む可能性があるか"""
+    return (
+        "://" in text or "\u200d" in text or "\ufe0f" in text
+        or len(text.encode("utf-16-le")) != 2 * len(text)  # BMP外の文字（絵文字など）
+    )
+
+
+def _special_spans(text: str) -> List[Tuple[int, int, int]]:
+    """URL・絵文字の (開始, 終了, 重み)（出現順）"""
+    spans = [(m.start(), m.end(), URL_WEIGHT) for m in _URL.finditer(text)]
+    if not text.isascii():
+        spans.extend(
+            (m.start(), m.end(), EMOJI_WEIGHT) for m in _EMOJI.finditer(text)
+            if not any(start <= m.start() < end for start, end, _ in spans)
+        )
+        spans.sort()
+    return spans
+
+
+def weighted_length(text: str) -> int:
+    """Twitterの重み付き文字数"""
+    if not text:
+        return 0
+    if text.isascii():
+        if "://" not in text:
+            return len(text)
+    else:
+        text = unicodedata.normalize("NFC", text)
+        if not _has_special(text):
+            return _text_weight(text)
+
+    length = 0
+    position = 0
+    for start, end, weight in _special_spans(text):
+        length += _text_weight(text[position:start]) + weight
+        position = end
+    return length + _text_weight(text[position:])
+
+
+def is_within_limit(text: str, max_length: int = MAX_WEIGHTED_LENGTH) -> bool:
+    return weighted_length(text) <= max_length
+
+
+def _prefix_weights(text: str) -> List[int]:
+    """weights[i] = text[:i] の重み付き文字数（URL・絵文字の内側の位置は切れないため -1）"""
+    weights = [0] * (len(text) + 1)
+    spans = {start: (end, weight) for start, end, weight in _special_spans(text)}
+    table = _WEIGHT_TABLE
+    total = 0
+    i = 0
+    while i < len(text):
+        if i in spans:
+            end, weight = spans[i]
+            for inner in range(i + 1, end):
+                weights[inner] = -1
+            total += weight
+            i = end
+        else:
+            code = ord(text[i])
+            total += table[code] if code < 0x10000 else DEFAULT_WEIGHT
+            i += 1
+        weights[i] = total
+    return weights
+
+
+def _cut_at_boundary(text: str, weights: List[int], budget: int) -> Optional[str]:
+    """budget 以内に収まる最後の単語境界で切る（境界がなければNone）"""
+    best = None
+    for match in _BOUNDARY.finditer(text):
+        # 句読点は残し、空白は落とす
+        cut = match.start() + len(match.group().rstrip())
+        if 0 < cut and weights[cut] >= 0 and weights[cut] <= budget:
+            best = cut
+    return text[:best].rstrip() if best else None
+
+
+def trim_to_limit(text: str, max_length: int = MAX_WEIGHTED_LENGTH, min_keep_ratio: float = 0.5) -> Optional[str]:
+    """上限に収まるよう切り詰めた本文（収まっていればそのまま）
+
+    1. 末尾のハッシュタグを後ろから1つずつ外す（本文は削らない）
+    2. それでも超える場合は本文を単語・句読点の境界で切って「…」を付け、収まる範囲で先頭のハッシュタグを残す
+    本文の min_keep_ratio 未満しか残らない場合はNone（再生成した方がよい）。
+    """
+    text = unicodedata.normalize("NFC", text.strip())
+    if is_within_limit(text, max_length):
+        return text
+
+    match = _TRAILING_HASHTAGS.search(text)
+    body = text[:match.start()] if match else text
+    hashtags = _HASHTAG.findall(match.group()) if match else []
+
+    for count in range(len(hashtags) - 1, -1, -1):
+        candidate = " ".join([body] + hashtags[:count])
+        if is_within_limit(candidate, max_length):
+            return candidate
+
+    weights = _prefix_weights(body)
+    for count in range(min(len(hashtags), 2), -1, -1):
+        suffix = ELLIPSIS + "".join(" " + tag for tag in hashtags[:count])
+        cut = _cut_at_boundary(body, weights, max_length - weighted_length(suffix))
+        if cut and weights[len(cut)] >= weights[-1] * min_keep_ratio:
+            return cut + suffix
+    return None
+
+
+def truncate_to_limit(text: str, max_length: int = MAX_WEIGHTED_LENGTH) -> str:
+    """境界を無視して上限に収める（trim_to_limit・再生成のどちらでも収まらない場合の最終手段）"""
+    text = unicodedata.normalize("NFC", text.strip())
+    if is_within_limit(text, max_length):
+        return text
+    weights = _prefix_weights(text)
+    budget = max_length - weighted_length(ELLIPSIS)
+    cut = max(i for i, weight in enumerate(weights) if 0 <= weight <= budget)
+    return text[:cut].rstrip() + ELLIPSIS
+
+
+def fit_to_limit(text: str, max_length: int = MAX_WEIGHTED_LENGTH) -> str:
+    """境界での切り詰めを優先し、できなければ強制的に上限へ収める（再生成できない場合用）"""
+    return trim_to_limit(text, max_length) or truncate_to_limit(text, max_length)
@@ -0,0 +1,155 @@
+"""
+自動投稿ジョブワーカー
+
+使い方:
+    python -m app.worker
+
+auto_post_jobs ストリームをコンシューマーグループで読み、最大 WORKER_CONCURRENCY 件を同時に処理する。
+JOB_VISIBILITY_TIMEOUT 秒以上ACKされていないジョブ（ワーカー停止など）は他のワーカーが引き取る。
+投稿後はACK前に tweet_id をジョブに保存し、引き取ったジョブが投稿済みなら投稿せずに完了にする。
+再試行しても結果が変わらない失敗（重複・未認証・429/408以外の4xx）だけをその場で失敗として確定し、
+一時的な失敗（タイムアウト・5xx・レート制限・サーキット遮断など）はACKせずに残して
+JOB_VISIBILITY_TIMEOUT 後の引き取りで JOB_MAX_ATTEMPTS 回まで再試行する。
+"""
+import asyncio
+import logging
+import os
+import signal
+import socket
+from typing import Dict, Set
+
+from app.config import settings
+from app.services.auto_post_service import execute_auto_post_async, get_access_token_async
+from app.services.http_clients import http_clients
+from app.services.job_queue import AutoPostJobStore, JOB_FAILED, JOB_SUCCEEDED
+from app.services.post_history_writer import post_history_writer
+from app.services.redis_pool import redis_pools
+from app.utils.error_handler import ServiceError, log_error
+from app.utils.retry import is_permanent_status
+
+logger = logging.getLogger(__name__)
+
+
+def _is_permanent_failure(error: ServiceError) -> bool:
+    """ジョブ自体の失敗（重複）か、上流APIが再試行しても変わらない応答を返したか"""
+    return is_permanent_status(error.details.get("status_code")) or \
+        is_permanent_status(error.details.get("upstream_status"))
+
+
+class AutoPostWorker:
+    def __init__(self, concurrency: int = None):
+        self.concurrency = concurrency or settings.WORKER_CONCURRENCY
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self.store = AutoPostJobStore(self.consumer)
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        logger.info("ワーカー停止要求を受信（処理中のジョブ完了後に終了）")
+        self._stopping.set()
+
+    async def run(self):
+        await self.store.ensure_group()
+        logger.info(f"自動投稿ワーカー起動: {self.consumer}, 同時実行数: {self.concurrency}")
+        reclaim_at = 0.0
+        loop = asyncio.get_running_loop()
+
+        while not self._stopping.is_set():
+            # 空きスロットがあるまで待つ（同時実行数の上限）
+            await self._slots.acquire()
+            self._slots.release()
+            free = self.concurrency - len(self._tasks)
+
+            try:
+                messages = []
+                if loop.time() >= reclaim_at:
+                    messages = await self.store.reclaim(free)
+                    reclaim_at = loop.time() + settings.JOB_RECLAIM_INTERVAL
+                if not messages:
+                    messages = await self.store.read(free)
+            except Exception as e:
+                logger.warning(f"ジョブ取得エラー: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            for message_id, fields in messages:
+                await self._slots.acquire()
+                task = asyncio.create_task(self._process(message_id, fields))
+                self._tasks.add(task)
+                task.add_done_callback(self._on_done)
+
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _on_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        self._slots.release()
+
+    async def _process(self, message_id: str, fields: Dict[str, str]):
+        job_id = fields["job_id"]
+        context = {
+            "job_id": job_id,
+            "user_id": fields.get("user_id"),
+            "repository": fields.get("repository"),
+            "language": fields.get("language"),
+        }
+        try:
+            attempts, posted = await self.store.start_attempt(job_id)
+            if posted is not None:
+                # ACK前に停止したワーカーが投稿済み
+                await self.store.finish(message_id, job_id, JOB_SUCCEEDED, result=posted)
+                logger.info(f"自動投稿ジョブは投稿済みのため完了として記録: {job_id}")
+                return
+            if attempts > settings.JOB_MAX_ATTEMPTS:
+                await self.store.finish(message_id, job_id, JOB_FAILED, error="最大試行回数を超えました")
+                logger.error(f"自動投稿ジョブ破棄（試行回数超過）: {job_id}")
+                return
+
+            access_token = await get_access_token_async(int(fields["user_id"]))
+            if not access_token:
+                await self.store.finish(message_id, job_id, JOB_FAILED, error="Twitter認証が必要です")
+                return
+
+            result = await execute_auto_post_async(
+                access_token,
+                int(fields["user_id"]),
+                fields["repository"],
+                fields.get("language", "ja"),
+                fresh=fields.get("fresh") == "1",
+                context=context
+            )
+            await self.store.record_posted(job_id, result)
+            await self.store.finish(message_id, job_id, JOB_SUCCEEDED, result=result)
+            logger.info(f"自動投稿ジョブ完了: {job_id}")
+        except ServiceError as e:
+            log_error(e, context=context)
+            if _is_permanent_failure(e) or attempts >= settings.JOB_MAX_ATTEMPTS:
+                await self.store.finish(message_id, job_id, JOB_FAILED, error=str(e))
+                return
+            # ACKせずに残し、JOB_VISIBILITY_TIMEOUT 後に引き取って再試行する
+            await self.store.release(job_id, error=str(e))
+            logger.warning(f"自動投稿ジョブを再試行待ちに戻す（試行 {attempts}/{settings.JOB_MAX_ATTEMPTS}）: {job_id}")
+        except Exception as e:
+            # Redis障害などで状態を確定できない場合はACKせず、再取得に任せる
+            log_error(e, context=context)
+
+
+async def main():
+    worker = AutoPostWorker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+
+    await http_clients.startup()
+    post_history_writer.start()
+    try:
+        await worker.run()
+    finally:
+        await asyncio.to_thread(post_history_writer.stop)
+        await http_clients.shutdown()
+        await redis_pools.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+"""
+同時自動投稿時のイベントループ遅延ベンチマーク（同期Redis vs redis.asyncio）
+
+自動投稿1件分のRedisアクセス（GitHub/OpenAIキャッシュ参照・重複チェック・投稿履歴保存）と
+上流APIの待ち時間を模したコルーチンを同時実行し、その間のイベントループ遅延を計測する。
+
+  before: 同期クライアント（cache_store / is_duplicate_tweet）をコルーチン内から直接呼ぶ（従来の実装）
+  after : 非同期クライアント（async_cache_store / is_duplicate_tweet_async）を await する
+
+使い方:
+    REDIS_URL=redis://localhost:6379 PYTHONPATH=. python benchmarks/bench_event_loop_latency.py --concurrency 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.services.cache_store import cache_store, async_cache_store
+from app.services.redis_pool import redis_pools
+from app.services.twitter_service import is_duplicate_tweet, is_duplicate_tweet_async
+
+HISTORY_KEYS = 200  # 重複チェック対象の投稿履歴件数
+
+
+async def monitor_loop_lag(samples: list, stop: asyncio.Event, interval: float = 0.001):
+    """一定間隔でsleepし、予定より遅れて再開した時間をイベントループ遅延として記録"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+async def auto_post_before(index: int, upstream_latency: float):
+    """従来実装: 同期Redis呼び出しがイベントループをブロックする"""
+    cache_store.get_json(f"github_commit:bench/repo{index}")
+    await asyncio.sleep(upstream_latency)  # GitHub API
+    cache_store.set_json(f"github_commit:bench/repo{index}", {"commit_message": "bench", "timestamp": time.time()}, 60)
+    cache_store.get_json(f"openai_tweet:bench{index}")
+    await asyncio.sleep(upstream_latency)  # OpenAI API
+    cache_store.set_json(f"openai_tweet:bench{index}", {"tweet": "bench", "timestamp": time.time()}, 60)
+    is_duplicate_tweet(f"bench tweet {index}")
+    await asyncio.sleep(upstream_latency)  # Twitter API
+    cache_store.set_json(f"bench_history:{index}", {"text": f"bench tweet {index}", "timestamp": time.time()}, 60)
+
+
+async def auto_post_after(index: int, upstream_latency: float):
+    """新実装: redis.asyncio でRedis往復中も他のリクエストを処理できる"""
+    await async_cache_store.get_json(f"github_commit:bench/repo{index}")
+    await asyncio.sleep(upstream_latency)
+    await async_cache_store.set_json(f"github_commit:bench/repo{index}", {"commit_message": "bench", "timestamp": time.time()}, 60)
+    await async_cache_store.get_json(f"openai_tweet:bench{index}")
+    await asyncio.sleep(upstream_latency)
+    await async_cache_store.set_json(f"openai_tweet:bench{index}", {"tweet": "bench", "timestamp": time.time()}, 60)
+    await is_duplicate_tweet_async(f"bench tweet {index}")
+    await asyncio.sleep(upstream_latency)
+    await async_cache_store.set_json(f"bench_history:{index}", {"text": f"bench tweet {index}", "timestamp": time.time()}, 60)
+
+
+async def run_scenario(worker, concurrency: int, rounds: int, upstream_latency: float) -> dict:
+    samples: list = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop_lag(samples, stop))
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*(worker(i, upstream_latency) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+    samples.sort()
+    return {
+        "elapsed_s": elapsed,
+        "lag_p50_ms": statistics.median(samples) * 1000,
+        "lag_p99_ms": samples[int(len(samples) * 0.99) - 1] * 1000,
+        "lag_max_ms": samples[-1] * 1000,
+    }
+
+
+def seed_history():
+    """重複チェックが実際にRedisを走査するよう投稿履歴を投入"""
+    for i in range(HISTORY_KEYS):
+        cache_store.set_json(f"tweet_history:bench{i}", {"text": f"seed {i}", "timestamp": time.time()}, 300)
+
+
+def cleanup():
+    client = cache_store.client
+    for pattern in ("tweet_history:bench*", "bench_history:*", "github_commit:bench/*", "openai_tweet:bench*"):
+        keys = client.keys(pattern)
+        if keys:
+            client.delete(*keys)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50, help="同時自動投稿数")
+    parser.add_argument("--rounds", type=int, default=5, help="繰り返し回数")
+    parser.add_argument("--upstream-latency-ms", type=float, default=50.0, help="上流API1回あたりの模擬待ち時間")
+    args = parser.parse_args()
+
+    seed_history()
+    try:
+        latency = args.upstream_latency_ms / 1000
+        before = await run_scenario(auto_post_before, args.concurrency, args.rounds, latency)
+        after = await run_scenario(auto_post_after, args.concurrency, args.rounds, latency)
+    finally:
+        await redis_pools.aclose()
+        cleanup()
+
+    print(f"同時実行数={args.concurrency}, 繰り返し={args.rounds}, 上流待ち={args.upstream_latency_ms}ms")
+    print(f"{'':8}{'経過(s)':>10}{'p50遅延(ms)':>14}{'p99遅延(ms)':>14}{'最大遅延(ms)':>14}")
+    for name, result in (("before", before), ("after", after)):
+        print(f"{name:8}{result['elapsed_s']:>10.2f}{result['lag_p50_ms']:>14.2f}"
+              f"{result['lag_p99_ms']:>14.2f}{result['lag_max_ms']:>14.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""
+類似ツイート検出（SimHashバンド索引）ベンチマーク
+
+1ユーザーに大量の署名（既定100万件）を登録した状態で、類似検索1回あたりのレイテンシを計測する。
+検索の半分は登録済み署名から数ビット反転した類似署名、残りは無関係なランダム署名。
+あわせてSimHash計算そのもののコストも計測する。
+
+使い方:
+    REDIS_URL=redis://localhost:6379 PYTHONPATH=. python benchmarks/bench_near_duplicate.py --signatures 1000000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app.services import near_duplicate
+from app.services.cache_store import cache_store
+
+BENCH_USER_ID = 999999999
+SAMPLE_TWEET = "新機能: GitHubのコミットから自動でツイートを生成できるようになりました！ #開発 #Python 🚀"
+
+
+def seed_signatures(count: int, batch_size: int = 10000) -> list:
+    """ランダムな64ビット署名を登録し、一部を検索用に返す"""
+    client = cache_store.client
+    now = time.time()
+    samples = []
+    for start in range(0, count, batch_size):
+        pipe = client.pipeline(transaction=False)
+        for _ in range(min(batch_size, count - start)):
+            signature = random.getrandbits(near_duplicate.SIMHASH_BITS)
+            near_duplicate.add_signature_to_pipeline(pipe, BENCH_USER_ID, signature, now)
+            if len(samples) < 1000:
+                samples.append(signature)
+        pipe.execute()
+    return samples
+
+
+def flip_bits(signature: int, bits: int) -> int:
+    for bit in random.sample(range(near_duplicate.SIMHASH_BITS), bits):
+        signature ^= 1 << bit
+    return signature
+
+
+def lookup(signature: int):
+    pipe = cache_store.client.pipeline(transaction=False)
+    near_duplicate._queue_lookup(pipe, BENCH_USER_ID, signature, 24)
+    return near_duplicate._closest_distance(signature, pipe.execute())
+
+
+def cleanup():
+    client = cache_store.client
+    keys = []
+    for key in client.scan_iter(match=f"{near_duplicate.SIMHASH_KEY_PREFIX}{BENCH_USER_ID}:*", count=10000):
+        keys.append(key)
+        if len(keys) >= 10000:
+            client.delete(*keys)
+            keys = []
+    if keys:
+        client.delete(*keys)
+
+
+def percentile(samples: list, ratio: float) -> float:
+    return samples[max(0, int(len(samples) * ratio) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--signatures", type=int, default=1_000_000, help="登録する署名数")
+    parser.add_argument("--queries", type=int, default=2000, help="検索回数")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    samples = seed_signatures(args.signatures)
+    print(f"署名登録: {args.signatures}件, {time.perf_counter() - started:.1f}秒")
+
+    try:
+        latencies = []
+        hits = 0
+        for i in range(args.queries):
+            if i % 2 == 0:
+                query = flip_bits(random.choice(samples), random.randint(0, near_duplicate._max_distance()))
+            else:
+                query = random.getrandbits(near_duplicate.SIMHASH_BITS)
+            started = time.perf_counter()
+            if lookup(query) is not None:
+                hits += 1
+            latencies.append(time.perf_counter() - started)
+    finally:
+        cleanup()
+
+    rounds = 1000
+    started = time.perf_counter()
+    for _ in range(rounds):
+        near_duplicate.simhash(SAMPLE_TWEET)
+    simhash_ms = (time.perf_counter() - started) / rounds * 1000
+
+    latencies.sort()
+    print(f"検索: {args.queries}回, 類似検出 {hits}件（期待値 {args.queries // 2}件前後）")
+    print(f"検索レイテンシ p50={statistics.median(latencies) * 1000:.3f}ms "
+          f"p99={percentile(latencies, 0.99) * 1000:.3f}ms max={latencies[-1] * 1000:.3f}ms")
+    print(f"SimHash計算: {simhash_ms:.3f}ms/件")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+投稿履歴APIのページングベンチマーク（キーセット vs OFFSET）
+
+ベンチマーク用ユーザーに大量の post_history 行（既定100万件）を投入し、ページの深さごとに
+1ページ取得のレイテンシを計測する。キーセットは深さに関係なくほぼ一定、OFFSETは深さに比例して遅くなる。
+
+使い方（投入した行とユーザーは終了時に削除する）:
+    DATABASE_URL=postgresql://... PYTHONPATH=. python benchmarks/bench_post_history_pagination.py --rows 1000000
+    DATABASE_URL=sqlite:////tmp/bench.db PYTHONPATH=. python benchmarks/bench_post_history_pagination.py --rows 200000
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, delete, insert, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Base, PostHistory, User
+from app.services.post_history_service import build_history_query, encode_cursor
+
+BENCH_EMAIL = "bench-post-history@example.com"
+PAGE_SIZE = 20
+
+
+def seed(session: Session, rows: int, batch_size: int = 10000) -> int:
+    user = User(email=BENCH_EMAIL, username="bench-post-history")
+    session.add(user)
+    session.commit()
+
+    started_at = datetime.now(timezone.utc) - timedelta(seconds=rows)
+    statuses = ("posted", "posted", "posted", "failed")
+    for start in range(0, rows, batch_size):
+        session.execute(insert(PostHistory), [
+            {
+                "user_id": user.id,
+                "repository": f"bench/repo{i % 10}",
+                "commit_message": "bench",
+                "tweet_text": f"bench tweet {i}",
+                "language": "ja" if i % 3 else "en",
+                "status": statuses[i % len(statuses)],
+                "created_at": started_at + timedelta(seconds=i),
+            }
+            for i in range(start, min(start + batch_size, rows))
+        ])
+        session.commit()
+    return user.id
+
+
+def cursor_at(session: Session, user_id: int, depth: int, **filters) -> str:
+    """depthページ目の直前の行からカーソルを作る（計測対象外）"""
+    if depth == 0:
+        return None
+    query = build_history_query(user_id, 0, **filters).limit(1).offset(depth * PAGE_SIZE - 1)
+    row = session.execute(query).scalars().first()
+    return encode_cursor(row) if row else None
+
+
+def measure(session: Session, query, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        session.execute(query).scalars().all()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="投入する行数")
+    parser.add_argument("--repeat", type=int, default=20, help="深さごとの計測回数")
+    args = parser.parse_args()
+
+    engine = create_engine(settings.DATABASE_URL, future=True)
+    if engine.dialect.name == "sqlite":
+        Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        started = time.perf_counter()
+        user_id = seed(session, args.rows)
+        print(f"投入: {args.rows}件, {time.perf_counter() - started:.1f}秒")
+
+        try:
+            max_depth = args.rows // PAGE_SIZE
+            depths = [d for d in (0, 10, 100, 1000, 10000, 50000) if d < max_depth]
+            print(f"{'filter':>10}{'page':>8}{'keyset(ms)':>12}{'offset(ms)':>12}")
+            for label, filters in (("none", {}), ("failed", {"status": "failed"}), ("repo", {"repository": "bench/repo3"})):
+                for depth in depths:
+                    cursor = cursor_at(session, user_id, depth, **filters)
+                    if depth and cursor is None:
+                        continue
+                    keyset = build_history_query(user_id, PAGE_SIZE, cursor, **filters)
+                    offset = build_history_query(user_id, PAGE_SIZE, **filters).offset(depth * PAGE_SIZE)
+                    print(f"{label:>10}{depth:>8}{measure(session, keyset, args.repeat):>12.2f}"
+                          f"{measure(session, offset, args.repeat):>12.2f}")
+        finally:
+            session.rollback()
+            session.execute(delete(PostHistory).where(PostHistory.user_id == user_id))
+            session.execute(delete(User).where(User.id == user_id))
+            session.commit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+ツイート重み付き文字数・切り詰めのマイクロベンチマーク
+
+投稿前検証（weighted_length）と生成直後の切り詰め（trim_to_limit）が
+ツイート案1件あたり数マイクロ秒で済むことを確認する。Redis・ネットワークは不要。
+
+使い方:
+    PYTHONPATH=. python benchmarks/bench_tweet_length.py --number 20000
+"""
+import argparse
+import timeit
+
+from app.utils.tweet_length import trim_to_limit, weighted_length
+
+SAMPLES = {
+    "ascii": "Shipped keyset pagination for post history: deep pages are now as fast as the first one. #buildinpublic #python",
+    "ja": "投稿履歴APIをキーセットページングに変更しました。深いページでも1ページ目と同じ速さで返ります！ #個人開発 #Python",
+    "ja+url+emoji": "予約投稿の遅延をほぼゼロにしました🚀👍🏽 詳細はこちら https://example.com/changelog/2024/scheduler #個人開発",
+    "ja over limit": "スケジューラを刷新して投稿の遅延をほぼゼロにしました。" * 6 + " #個人開発 #Python #FastAPI",
+}
+
+
+def bench(number: int):
+    print(f"{'sample':<16}{'weight':>8}{'weighted_length':>18}{'trim_to_limit':>16}")
+    for name, text in SAMPLES.items():
+        length_us = timeit.timeit(lambda: weighted_length(text), number=number) / number * 1e6
+        trim_us = timeit.timeit(lambda: trim_to_limit(text), number=number) / number * 1e6
+        print(f"{name:<16}{weighted_length(text):>8}{length_us:>16.2f}us{trim_us:>14.2f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ツイート重み付き文字数ベンチマーク")
+    parser.add_argument("--number", type=int, default=20000, help="1サンプルあたりの試行回数")
+    args = parser.parse_args()
+    bench(args.number)
+
+
+if __name__ == "__main__":
+    main()
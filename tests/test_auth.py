@@ -41,4 +41,32 @@ def test_login_logout_me():
         assert res3.status_code == 200
         # ログアウト後は/meで401
         res4 = client.get("/api/auth/me")
-        assert res4.status_code == 401 
\ No newline at end of file
+        assert res4.status_code == 401 
+
+def test_malformed_session_user_id_is_unauthenticated():
+    from fastapi import HTTPException
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from app.models import Base, User
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        user = User(email="u@example.com", username="u")
+        db.add(user)
+        db.commit()
+
+        class Sessions:
+            values = {"valid": str(user.id), "malformed": "user_id_1"}
+
+            @classmethod
+            def get_user_id(cls, session_id):
+                return cls.values.get(session_id)
+
+        assert auth.get_optional_user("valid", Sessions, db).id == user.id
+        # 不正なuser_idは500ではなく未ログイン扱い
+        assert auth.get_optional_user("malformed", Sessions, db) is None
+        assert auth.get_optional_user("unknown", Sessions, db) is None
+        with pytest.raises(HTTPException) as exc_info:
+            auth.get_current_user("malformed", Sessions, db)
+        assert exc_info.value.status_code == 401
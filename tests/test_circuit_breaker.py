@@ -0,0 +1,101 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.utils import circuit_breaker
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def shared_redis(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(circuit_breaker, "cache_store",
+                        SimpleNamespace(client=fakeredis.FakeRedis(server=server, decode_responses=True)))
+    monkeypatch.setattr(circuit_breaker, "async_cache_store",
+                        SimpleNamespace(client=fakeredis.FakeAsyncRedis(server=server, decode_responses=True)))
+    monkeypatch.setattr(circuit_breaker.settings, "ENABLE_CIRCUIT_BREAKER", True)
+    monkeypatch.setattr(circuit_breaker.settings, "CIRCUIT_FAILURE_RATE", 0.5)
+    monkeypatch.setattr(circuit_breaker.settings, "CIRCUIT_HALF_OPEN_PROBES", 1)
+
+
+def _fail():
+    raise HTTPException(status_code=502, detail="bad gateway")
+
+
+def test_failures_from_all_workers_share_one_window(shared_redis):
+    # 同じ上流のブレーカーを別ワーカーに見立てた2インスタンス
+    worker_a = CircuitBreaker("test-shared", "Test", failure_threshold=3, recovery_timeout=60)
+    worker_b = CircuitBreaker("test-shared", "Test", failure_threshold=3, recovery_timeout=60)
+
+    for breaker in (worker_a, worker_b, worker_a):
+        with pytest.raises(HTTPException):
+            breaker.call(_fail)
+
+    calls = []
+    with pytest.raises(CircuitOpenError) as exc_info:
+        worker_b.call(lambda: calls.append(1))
+    assert calls == []
+    assert exc_info.value.status_code == 503 and 0 < exc_info.value.retry_after <= 60
+    assert worker_a.open_for() and worker_a.get_statistics()["state"] == "open"
+
+
+def test_client_errors_and_low_failure_rates_do_not_trip(shared_redis):
+    breaker = CircuitBreaker("test-rate", "Test", failure_threshold=2, recovery_timeout=60)
+
+    def not_found():
+        raise HTTPException(status_code=404, detail="not found")
+    for _ in range(5):
+        with pytest.raises(HTTPException):
+            breaker.call(not_found)
+
+    # 失敗数は閾値以上でも失敗率が CIRCUIT_FAILURE_RATE 未満なら遮断しない
+    for _ in range(3):
+        with pytest.raises(HTTPException):
+            breaker.call(_fail)
+    assert breaker.call(lambda: SimpleNamespace(status_code=200)).status_code == 200
+    stats = breaker.get_statistics()
+    assert stats["state"] == "closed"
+    assert stats["window_requests"] == 9 and stats["window_failures"] == 3
+
+
+def test_half_open_allows_limited_probes_and_recovers(shared_redis):
+    breaker = CircuitBreaker("test-probe", "Test", failure_threshold=1, recovery_timeout=0)
+
+    async def scenario():
+        async def fail():
+            raise ConnectionError("refused")
+        with pytest.raises(ConnectionError):
+            await breaker.call_async(fail)
+
+        # 復旧待ちが経過すると試験呼び出しは1件だけ通る
+        probe_started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_probe():
+            probe_started.set()
+            await release.wait()
+            return SimpleNamespace(status_code=200)
+        probe = asyncio.create_task(breaker.call_async(slow_probe))
+        await probe_started.wait()
+
+        async def ok():
+            return "ok"
+        with pytest.raises(CircuitOpenError):
+            await breaker.call_async(ok)
+
+        release.set()
+        await probe
+        assert await breaker.call_async(ok) == "ok"
+
+        # 試験呼び出しが失敗すると再び遮断する
+        with pytest.raises(ConnectionError):
+            await breaker.call_async(fail)
+        with pytest.raises(ConnectionError):
+            await breaker.call_async(fail)
+        assert breaker.get_statistics()["state"] == "open"
+
+    asyncio.run(scenario())
@@ -0,0 +1,60 @@
+import unicodedata
+
+from app.services.openai_service import _cache_stat_fields, _create_cache_key
+from app.utils.commit_message import canonicalize_commit_message, fit_commit_message
+from app.utils.token_counter import count_tokens, truncate_to_tokens
+
+
+def test_trivial_differences_share_one_cache_key():
+    base = "feat: カード表示を改善\n\nレイアウトを調整"
+    variants = [
+        base + "  \n",
+        base.replace("\n", "\r\n"),
+        base + "\n\nCo-authored-by: Bot <bot@example.com>\nSigned-off-by: Dev <dev@example.com>",
+        "Merge pull request #42 from owner/feature\n\n" + base,
+        unicodedata.normalize("NFD", base.replace("カード", "ガード")),
+    ]
+    key = _create_cache_key(base, "o/r", "ja")
+    assert all(_create_cache_key(variant, "o/r", "ja") == key for variant in variants[:4])
+    assert _create_cache_key(variants[4], "o/r", "ja") == _create_cache_key(base.replace("カード", "ガード"), "o/r", "ja")
+    assert _create_cache_key(base, "o/r", "en") != key
+
+
+def test_reasons_are_reported_for_stats():
+    text, reasons = canonicalize_commit_message("Merge pull request #1 from a/b\n\nfix bug \nSigned-off-by: x")
+    assert text == "fix bug"
+    assert reasons == ["whitespace", "trailers", "merge"]
+    assert _cache_stat_fields("plain message", hit=True) == ["hits", "hits:unchanged"]
+    assert canonicalize_commit_message("Merge branch 'main' into dev")[0] == "Merge branch 'main' into dev"
+
+
+def test_long_message_keeps_subject_and_informative_lines_within_budget():
+    body = ["Squashed commits:", "- wip", "- fixup! typo"] + [f"- update snapshot {i}" for i in range(200)]
+    body.insert(100, "- feat: 予約投稿の一括キャンセルを追加")
+    body.insert(150, "- BREAKING: remove legacy /api/v1 endpoints")
+    message = "Release v2.0 with scheduler overhaul\n\n" + "\n".join(body)
+
+    fitted, truncated = fit_commit_message(message, 60)
+    lines = fitted.split("\n")
+    assert truncated and count_tokens(fitted) <= 60
+    assert lines[0] == "Release v2.0 with scheduler overhaul"
+    assert lines[1:3] == ["- feat: 予約投稿の一括キャンセルを追加", "- BREAKING: remove legacy /api/v1 endpoints"]
+    assert "wip" not in fitted and lines[-1].startswith("…(+")
+    assert fit_commit_message("fix: typo", 60) == ("fix: typo", False)
+
+
+def test_cache_key_follows_the_commit_token_budget(monkeypatch):
+    from app.config import settings
+    message = "feat: scheduler\n\n" + "\n".join(f"- change {i}" for i in range(100))
+    monkeypatch.setattr(settings, "OPENAI_COMMIT_TOKEN_BUDGET", 300)
+    key = _create_cache_key(message, "o/r", "ja")
+    # 予算を変えると（プロセス内のキャッシュが残っていても）切り詰め結果とキーが変わる
+    monkeypatch.setattr(settings, "OPENAI_COMMIT_TOKEN_BUDGET", 40)
+    assert _create_cache_key(message, "o/r", "ja") != key
+
+
+def test_token_approximation_and_truncation():
+    assert count_tokens("") == 0
+    assert count_tokens("hello world") >= 2
+    assert count_tokens("日本語") == 3
+    assert count_tokens(truncate_to_tokens("a" * 1000, 10)) <= 10
@@ -0,0 +1,91 @@
+import time
+from app.services import duplicate_index
+
+
+class DummyPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def zadd(self, key, mapping):
+        self.commands.append(lambda: self.client.zsets.setdefault(key, {}).update(mapping))
+
+    def zremrangebyscore(self, key, low, high):
+        def run():
+            zset = self.client.zsets.get(key, {})
+            for member in [m for m, score in zset.items() if score <= high]:
+                del zset[member]
+        self.commands.append(run)
+
+    def expire(self, key, ttl):
+        self.commands.append(lambda: True)
+
+    def zscore(self, key, member):
+        self.commands.append(lambda: self.client.zsets.get(key, {}).get(member))
+
+    def execute(self):
+        self.client.round_trips += 1
+        return [command() for command in self.commands]
+
+
+class DummyRedis:
+    def __init__(self):
+        self.zsets = {}
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        return DummyPipeline(self)
+
+
+class DummyStore:
+    def __init__(self):
+        self.client = DummyRedis()
+
+
+def test_normalized_text_is_detected_in_one_round_trip(monkeypatch):
+    store = DummyStore()
+    monkeypatch.setattr(duplicate_index, "cache_store", store)
+
+    pipe = store.client.pipeline()
+    duplicate_index.add_to_pipeline(pipe, 1, "Hello  World #dev", time.time())
+    pipe.execute()
+    store.client.round_trips = 0
+
+    assert duplicate_index.is_duplicate("ｈｅｌｌｏ world #DEV", user_id=1)
+    assert not duplicate_index.is_duplicate("Hello World #dev", user_id=2)
+    assert store.client.round_trips == 2
+
+
+def test_entries_outside_window_are_ignored(monkeypatch):
+    store = DummyStore()
+    monkeypatch.setattr(duplicate_index, "cache_store", store)
+
+    pipe = store.client.pipeline()
+    duplicate_index.add_to_pipeline(pipe, None, "old tweet", time.time() - 25 * 3600)
+    pipe.execute()
+
+    assert not duplicate_index.is_duplicate("old tweet", user_id=1)
+    assert duplicate_index.is_duplicate("old tweet", user_id=1, window_hours=48)
+
+
+def test_simhash_ignores_hashtags_emoji_and_punctuation():
+    from app.services.near_duplicate import hamming_distance, simhash
+
+    base = simhash("新機能: コミットから自動でツイートを生成できるようになりました！ #開発 🚀")
+    variant = simhash("新機能：コミットから自動でツイートを生成できるようになりました #OSS ✨")
+    other = simhash("バグ修正: ログイン時のセッション切れを解消しました #bugfix")
+
+    assert hamming_distance(base, variant) == 0
+    assert hamming_distance(base, other) > 3
+
+
+def test_near_duplicate_distance_outside_band_guarantee_is_rejected():
+    import pytest
+    from pydantic import ValidationError
+    from app.config import Settings
+
+    assert Settings(NEAR_DUPLICATE_MAX_DISTANCE=0).NEAR_DUPLICATE_MAX_DISTANCE == 0
+    # 4バンドで取りこぼしなく検出できる距離（3）を超える設定は黙って丸めずにエラー
+    for distance in (-1, 4):
+        with pytest.raises(ValidationError):
+            Settings(NEAR_DUPLICATE_MAX_DISTANCE=distance)
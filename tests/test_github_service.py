@@ -0,0 +1,133 @@
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+from app.services import github_service
+
+
+class DummyResponse:
+    def __init__(self, status_code, json_data=None, headers=None):
+        self.status_code = status_code
+        self._json = json_data
+        self.headers = headers or {}
+        self.text = ""
+
+    def json(self):
+        return self._json
+
+
+class DummySession:
+    def __init__(self, response):
+        self.response = response
+        self.calls = []
+
+    def get(self, url, headers=None, params=None, timeout=None):
+        self.calls.append({"headers": headers, "params": params})
+        return self.response
+
+
+class DummyStore:
+    def __init__(self, entry=None):
+        self.entry = entry
+        self.counters = {}
+
+    def get_json(self, key):
+        return self.entry
+
+    def set_json(self, key, value, ttl):
+        self.entry = value
+        return True
+
+    def incr_counter(self, key, field, amount=1):
+        self.counters[field] = self.counters.get(field, 0) + amount
+
+
+def _setup(monkeypatch, response, entry=None):
+    store = DummyStore(entry)
+    session = DummySession(response)
+    monkeypatch.setattr(github_service, "cache_store", store)
+    monkeypatch.setattr(github_service.github_hit_counters, "_pending", Counter())
+    monkeypatch.setattr(github_service.http_clients, "get_session", lambda name: session)
+    return store, session
+
+
+def test_full_fetch_stores_validators(monkeypatch):
+    response = DummyResponse(200, [{"commit": {"message": "feat: 新機能"}}], {"ETag": '"abc"'})
+    store, session = _setup(monkeypatch, response)
+
+    assert github_service.fetch_latest_commit_message("user/repo") == "feat: 新機能"
+    assert session.calls[0]["params"] == {"per_page": 1}
+    assert "If-None-Match" not in session.calls[0]["headers"]
+    assert store.entry["etag"] == '"abc"'
+    assert store.counters == {"full_fetches": 1}
+
+
+def test_stale_entry_revalidates_with_etag(monkeypatch):
+    stale = {"commit_message": "fix: 古い", "etag": '"abc"', "timestamp": 0, "validated_at": 0}
+    store, session = _setup(monkeypatch, DummyResponse(304), stale)
+
+    assert github_service.fetch_latest_commit_message("user/repo") == "fix: 古い"
+    assert session.calls[0]["headers"]["If-None-Match"] == '"abc"'
+    assert store.entry["validated_at"] > 0
+    assert store.counters == {"revalidations": 1}
+
+
+def test_fresh_entry_skips_request(monkeypatch):
+    fresh = {"commit_message": "docs: 更新", "etag": '"abc"', "timestamp": time.time(), "validated_at": time.time()}
+    store, session = _setup(monkeypatch, DummyResponse(500), fresh)
+
+    assert github_service.fetch_latest_commit_message("user/repo") == "docs: 更新"
+    assert session.calls == []
+    # ヒット経路ではRedisに書かずプロセス内で数える
+    assert store.counters == {}
+    assert github_service.github_hit_counters.pending() == {"hits": 1}
+
+
+def test_stale_entry_is_served_and_refreshed_in_background(monkeypatch):
+    stale_at = time.time() - github_service.settings.CACHE_GITHUB_TTL - 1
+    stale = {"commit_message": "fix: 古い", "etag": '"abc"', "timestamp": stale_at, "validated_at": stale_at}
+    response = DummyResponse(200, [{"commit": {"message": "feat: 最新"}}], {"ETag": '"def"'})
+    store, session = _setup(monkeypatch, response, stale)
+    submitted = []
+    monkeypatch.setattr(github_service._refresh_executor, "submit", lambda fn: submitted.append(fn))
+
+    # 期限切れでもハードTTL内なら即時に返す
+    assert github_service.fetch_latest_commit_message("user/repo") == "fix: 古い"
+    assert session.calls == []
+    assert store.counters == {}
+    assert github_service.github_hit_counters.pending() == {"stale_hits": 1}
+
+    # バックグラウンド更新でキャッシュが最新になる
+    submitted[0]()
+    assert store.entry["commit_message"] == "feat: 最新"
+    assert store.counters["background_refreshes"] == 1
+
+
+def test_fresh_flag_bypasses_cache(monkeypatch):
+    cached = {"commit_message": "docs: 更新", "etag": '"abc"', "timestamp": time.time(), "validated_at": time.time()}
+    response = DummyResponse(200, [{"commit": {"message": "feat: 最新"}}], {"ETag": '"def"'})
+    store, session = _setup(monkeypatch, response, cached)
+
+    assert github_service.fetch_latest_commit_message("user/repo", fresh=True) == "feat: 最新"
+    assert session.calls[0]["headers"]["If-None-Match"] == '"abc"'
+
+
+def test_hit_counters_are_flushed_to_redis_in_batches(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    from app.services import stats_buffer
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    store = SimpleNamespace(client=redis_client, get_counters=lambda key: {
+        field: int(value) for field, value in redis_client.hgetall(key).items()
+    })
+    monkeypatch.setattr(stats_buffer, "cache_store", store)
+    counters = stats_buffer.BufferedCounters("test_hit_stats")
+    for _ in range(3):
+        counters.incr("hits")
+    assert redis_client.hgetall("test_hit_stats") == {}
+    assert counters.get_counters() == {"hits": 3}
+
+    counters.flush()
+    counters.incr("stale_hits")
+    assert redis_client.hgetall("test_hit_stats") == {"hits": "3"}
+    assert counters.get_counters() == {"hits": 3, "stale_hits": 1}
@@ -0,0 +1,106 @@
+import hashlib
+import hmac
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import github as github_api
+from app.services import github_service
+from app.services.local_cache import CACHE_INVALIDATION_CHANNEL
+from app.services.redis_pool import redis_pools
+
+SECRET = "test-secret"
+
+
+def _client(monkeypatch, stored):
+    monkeypatch.setattr(github_api.settings, "GITHUB_WEBHOOK_SECRET", SECRET)
+    monkeypatch.setattr(github_api, "store_push_commits", lambda payload: stored.append(payload))
+    app = FastAPI()
+    app.include_router(github_api.router, prefix="/api")
+    return TestClient(app)
+
+
+def _push_payload(count):
+    return {
+        "ref": "refs/heads/main",
+        "repository": {"full_name": "user/repo", "default_branch": "main"},
+        "commits": [{"id": f"{i:040x}", "message": f"fix: 修正 {i}"} for i in range(count)],
+        "head_commit": {"id": f"{count - 1:040x}", "message": f"fix: 修正 {count - 1}"},
+    }
+
+
+def _sign(body: bytes) -> str:
+    return "sha256=" + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+def test_push_with_valid_signature_is_accepted(monkeypatch):
+    stored = []
+    client = _client(monkeypatch, stored)
+    body = json.dumps(_push_payload(2000)).encode()
+
+    res = client.post("/api/github/webhook", content=body, headers={
+        "X-Hub-Signature-256": _sign(body),
+        "X-GitHub-Event": "push",
+        "X-GitHub-Delivery": "delivery-1",
+    })
+    assert res.status_code == 202
+    assert res.json() == {"status": "accepted", "delivery": "delivery-1"}
+    # レスポンス後のバックグラウンド処理で全コミットが保存される
+    assert len(stored[0]["commits"]) == 2000
+
+
+def test_invalid_signature_is_rejected(monkeypatch):
+    stored = []
+    client = _client(monkeypatch, stored)
+    body = json.dumps(_push_payload(1)).encode()
+
+    res = client.post("/api/github/webhook", content=body, headers={
+        "X-Hub-Signature-256": "sha256=" + "0" * 64,
+        "X-GitHub-Event": "push",
+    })
+    assert res.status_code == 401
+    assert stored == []
+
+
+def _fake_redis(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(redis_pools, "get_client", lambda db=0, decode_responses=True: client)
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+    pubsub.get_message(timeout=0.1)  # 購読確認を読み捨てる
+    return client, pubsub
+
+
+def test_store_push_commits_writes_sha_and_head_keys(monkeypatch):
+    client, pubsub = _fake_redis(monkeypatch)
+
+    assert github_service.store_push_commits(_push_payload(3)) == 3
+    for i in range(3):
+        entry = json.loads(client.get(f"github_commit:user/repo@{i:040x}"))
+        assert entry["commit_message"] == f"fix: 修正 {i}"
+        assert client.ttl(f"github_commit:user/repo@{i:040x}") > 0
+    head = json.loads(client.get("github_commit:user/repo"))
+    assert head["commit_message"] == "fix: 修正 2" and head["etag"] is None
+    # 他ワーカーのL1無効化を通知
+    message = pubsub.get_message(timeout=1)
+    assert json.loads(message["data"]) == {"prefixes": [], "keys": ["github_commit:user/repo"]}
+    assert client.hget(github_service.GITHUB_CACHE_STATS_KEY, "webhook_commits") == "3"
+
+
+def test_store_push_commits_skips_head_for_other_and_deleted_branches(monkeypatch):
+    client, pubsub = _fake_redis(monkeypatch)
+
+    feature = dict(_push_payload(1), ref="refs/heads/feature")
+    assert github_service.store_push_commits(feature) == 1
+    assert client.exists("github_commit:user/repo@" + f"{0:040x}")
+
+    # 既定ブランチの削除（after がゼロSHA、head_commit なし）
+    deleted = dict(_push_payload(1), commits=[], head_commit=None, deleted=True, after="0" * 40)
+    assert github_service.store_push_commits(deleted) == 0
+    # after がゼロSHAだけでも削除として扱う
+    assert github_service.store_push_commits(dict(_push_payload(1), after="0" * 40)) == 1
+
+    assert not client.exists("github_commit:user/repo")
+    assert pubsub.get_message(timeout=0.1) is None
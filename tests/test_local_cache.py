@@ -0,0 +1,19 @@
+import threading
+
+from app.services.local_cache import TierStats
+
+
+def test_tier_stats_do_not_lose_concurrent_increments():
+    stats = TierStats()
+
+    def record():
+        for _ in range(10000):
+            stats.hit()
+            stats.miss()
+
+    threads = [threading.Thread(target=record) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert stats.to_dict() == {"hits": 80000, "misses": 80000, "hit_ratio": 0.5}
@@ -0,0 +1,90 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+
+from app.config import settings
+from app.services import openai_service
+
+
+class DummyAsyncStore:
+    def __init__(self, cached=None):
+        self.data = dict(cached or {})
+        self.mget_calls = 0
+
+    async def get_many_json(self, keys):
+        self.mget_calls += 1
+        return [self.data.get(key) for key in keys]
+
+    async def set_json(self, key, value, ttl):
+        self.data[key] = value
+        return True
+
+
+class DummyOpenAI:
+    """同時実行数を記録し、最初の数回は429を返すクライアント"""
+    def __init__(self, rate_limited=2):
+        self.rate_limited = rate_limited
+        self.active = 0
+        self.max_active = 0
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def with_options(self, **kwargs):
+        return self
+
+    async def create(self, messages, **kwargs):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            if self.rate_limited > 0:
+                self.rate_limited -= 1
+                request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+                response = httpx.Response(429, headers={"retry-after-ms": "10"}, request=request)
+                raise openai.RateLimitError("rate limited", response=response, body=None)
+            prompt = messages[0]["content"]
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"tweet for {prompt.split()[-1]}"))])
+        finally:
+            self.active -= 1
+
+
+def _collect(requests, **kwargs):
+    async def run():
+        return [result async for result in openai_service.batch_generate_tweets_stream(requests, "en", **kwargs)]
+    return asyncio.run(run())
+
+
+def test_batch_uses_single_mget_bounds_concurrency_and_retries_429(monkeypatch):
+    requests = [{"commit_message": f"commit{i}", "repository": "o/r"} for i in range(12)]
+    cached_key = openai_service._create_cache_key("commit0", "o/r", "en")
+    store = DummyAsyncStore({cached_key: {"tweet": "cached tweet"}})
+    client = DummyOpenAI(rate_limited=2)
+    monkeypatch.setattr(openai_service, "async_cache_store", store)
+    monkeypatch.setattr(openai_service.http_clients, "get_async_openai", lambda api_key: client)
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test")
+
+    results = _collect(requests, max_concurrency=4)
+
+    assert store.mget_calls == 1
+    assert results[0] == {"index": 0, "repository": "o/r", "success": True, "tweet": "cached tweet", "cached": True}
+    assert sorted(result["index"] for result in results) == list(range(12))
+    assert all(result["success"] for result in results)
+    assert client.max_active <= 4
+    assert client.calls == 11 + 2
+    assert len(store.data) == 12
+
+
+def test_duplicate_items_are_generated_once(monkeypatch):
+    requests = [{"commit_message": "same", "repository": "o/r"}] * 3
+    client = DummyOpenAI(rate_limited=0)
+    monkeypatch.setattr(openai_service, "async_cache_store", DummyAsyncStore())
+    monkeypatch.setattr(openai_service.http_clients, "get_async_openai", lambda api_key: client)
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test")
+
+    results = _collect(requests)
+
+    assert client.calls == 1
+    assert [result["index"] for result in sorted(results, key=lambda r: r["index"])] == [0, 1, 2]
@@ -0,0 +1,132 @@
+"""Batch APIのローカル代替サーバーを使ったバルク生成テスト"""
+import json
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from openai import OpenAI
+
+from app.services import openai_service
+
+
+class BatchStubHandler(BaseHTTPRequestHandler):
+    files = {}
+    batches = {}
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, content_type="application/json"):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers["Content-Length"]))
+
+    def do_POST(self):
+        if self.path == "/v1/files":
+            raw = b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + self._body()
+            message = BytesParser(policy=HTTP).parsebytes(raw)
+            content = next(part for part in message.iter_parts() if part.get_filename()).get_payload(decode=True)
+            file_id = f"file-{len(self.files)}"
+            self.files[file_id] = content
+            return self._send({"id": file_id, "object": "file", "bytes": len(content), "created_at": 0,
+                               "filename": "input.jsonl", "purpose": "batch", "status": "processed"})
+        if self.path == "/v1/batches":
+            request = json.loads(self._body())
+            output = []
+            for line in self.files[request["input_file_id"]].decode().splitlines():
+                item = json.loads(line)
+                prompt = item["body"]["messages"][0]["content"]
+                if "FAIL" in prompt:
+                    output.append({"custom_id": item["custom_id"], "response": None,
+                                   "error": {"code": "server_error", "message": "failed"}})
+                    continue
+                body = {"choices": [{"index": 0, "message": {"role": "assistant", "content": f" draft {prompt.splitlines()[2]} "}}]}
+                output.append({"custom_id": item["custom_id"], "response": {"status_code": 200, "body": body}, "error": None})
+            output_id = f"file-{len(self.files)}"
+            self.files[output_id] = "\n".join(json.dumps(line) for line in output).encode()
+            batch_id = f"batch-{len(self.batches)}"
+            self.batches[batch_id] = {"polls": 0, "output_file_id": output_id, "input_file_id": request["input_file_id"]}
+            return self._send(self._batch(batch_id))
+        self.send_error(404)
+
+    def do_GET(self):
+        if self.path.startswith("/v1/batches/"):
+            batch_id = self.path.rsplit("/", 1)[1]
+            self.batches[batch_id]["polls"] += 1
+            return self._send(self._batch(batch_id))
+        if self.path.startswith("/v1/files/") and self.path.endswith("/content"):
+            return self._send(self.files[self.path.split("/")[3]], "application/jsonl")
+        self.send_error(404)
+
+    def _batch(self, batch_id):
+        state = self.batches[batch_id]
+        completed = state["polls"] >= 2
+        return {"id": batch_id, "object": "batch", "endpoint": "/v1/chat/completions", "completion_window": "24h",
+                "created_at": 0, "input_file_id": state["input_file_id"],
+                "status": "completed" if completed else "in_progress",
+                "output_file_id": state["output_file_id"] if completed else None}
+
+
+class DummyPipeline:
+    def __init__(self, store):
+        self.store = store
+        self.commands = []
+
+    def setex(self, key, ttl, value):
+        self.commands.append((key, json.loads(value)))
+
+    def execute(self):
+        self.store.data.update(self.commands)
+        self.commands = []
+
+
+class DummyStore:
+    def __init__(self, cached=None):
+        self.data = dict(cached or {})
+        self.client = self
+
+    def pipeline(self, transaction=True):
+        return DummyPipeline(self)
+
+    def get_many_json(self, keys):
+        return [self.data.get(key) for key in keys]
+
+
+@pytest.fixture
+def batch_client():
+    BatchStubHandler.files, BatchStubHandler.batches = {}, {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), BatchStubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield OpenAI(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}/v1", max_retries=0)
+    server.shutdown()
+
+
+def test_bulk_generation_streams_results_into_cache(monkeypatch, batch_client):
+    cached_key = openai_service._create_cache_key("cached", "o/r0", "en")
+    store = DummyStore({cached_key: {"tweet": "already"}})
+    monkeypatch.setattr(openai_service, "cache_store", store)
+    monkeypatch.setattr(openai_service.settings, "OPENAI_BULK_MAX_REQUESTS_PER_FILE", 3)
+
+    requests = iter(
+        [{"repository": "o/r0", "commit_message": "cached"}]
+        + [{"repository": f"o/r{i}", "commit_message": f"commit {i}"} for i in range(1, 6)]
+        + [{"repository": "o/r6", "commit_message": "FAIL"}]
+    )
+    summary = openai_service.run_bulk_generation(requests, "en", client=batch_client, poll_interval=0)
+
+    assert len(summary["batches"]) == 2
+    assert summary["submitted"] == 6
+    assert summary["stored"] == 5
+    assert summary["failed"] == 1
+    key = openai_service._create_cache_key("commit 3", "o/r3", "en")
+    assert store.data[key]["tweet"] == "draft Commit: commit 3"
+    assert store.data[cached_key] == {"tweet": "already"}
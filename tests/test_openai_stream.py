@@ -0,0 +1,82 @@
+import asyncio
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from app.api.auth import get_current_user
+from app.config import settings
+from app.main import app
+from app.services import github_service, openai_service
+
+
+class DummyAsyncStore:
+    def __init__(self, cached=None):
+        self.data = dict(cached or {})
+
+    async def get_json(self, key, local=True):
+        return self.data.get(key)
+
+    async def set_json(self, key, value, ttl):
+        self.data[key] = value
+        return True
+
+
+class DummyStreamingOpenAI:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+
+        async def stream():
+            for token in self.tokens:
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+        return stream()
+
+
+def _setup(monkeypatch, store, tokens=("Ship", "ped ", "v2 #dev")):
+    client = DummyStreamingOpenAI(tokens)
+    monkeypatch.setattr(openai_service, "async_cache_store", store)
+    monkeypatch.setattr(openai_service.http_clients, "get_async_openai", lambda api_key: client)
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test")
+
+    async def fetch(repository, fresh=False):
+        return "feat: v2"
+    monkeypatch.setattr(github_service, "fetch_latest_commit_message_async", fetch)
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=1)
+    return client
+
+
+def test_stream_tees_full_text_into_cache(monkeypatch):
+    store = DummyAsyncStore()
+    client = _setup(monkeypatch, store)
+
+    async def collect():
+        return [token async for token in openai_service.generate_tweet_stream_async("feat: v2", "o/r", "en")]
+
+    assert asyncio.run(collect()) == ["Ship", "ped ", "v2 #dev"]
+    key = openai_service._create_cache_key("feat: v2", "o/r", "en")
+    assert store.data[key]["tweet"] == "Shipped v2 #dev"
+    # 同じキーに保存する非ストリーミング版とサンプリング設定が一致する
+    request = dict(client.requests[0])
+    assert request.pop("stream") is True and request.pop("stream_options") == {"include_usage": True}
+    assert request == openai_service._completion_params("feat: v2", "o/r", "en")
+
+
+def test_sse_endpoint_streams_tokens_then_replays_cache_hit(monkeypatch):
+    store = DummyAsyncStore()
+    _setup(monkeypatch, store)
+    client = TestClient(app)
+    try:
+        first = client.get("/api/generate_tweet/stream", params={"repository": "o/r", "language": "en"})
+        assert first.headers["content-type"].startswith("text/event-stream")
+        assert first.text.count("event: token") == 3
+        assert '"tweet": "Shipped v2 #dev"' in first.text and '"cached": false' in first.text
+
+        second = client.get("/api/generate_tweet/stream", params={"repository": "o/r", "language": "en"})
+        assert second.text.count("event: ") == 1
+        assert second.text.startswith("event: done") and '"cached": true' in second.text
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
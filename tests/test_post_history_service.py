@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.models import Base, PostHistory
+from app.services.post_history_service import list_post_history
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        base = datetime(2026, 1, 1)
+        for i in range(7):
+            session.add(PostHistory(
+                user_id=1, repository="o/r", commit_message="c", tweet_text=f"t{i}",
+                status="failed" if i % 2 else "posted",
+                created_at=base + timedelta(minutes=i // 2)  # created_at が同じ行を含める
+            ))
+        session.add(PostHistory(user_id=2, repository="o/r", commit_message="c", tweet_text="other",
+                                status="posted", created_at=base))
+        session.commit()
+        yield session
+
+
+def test_keyset_pages_cover_all_rows_once(db):
+    seen, cursor = [], None
+    while True:
+        rows, cursor = list_post_history(db, 1, limit=3, cursor=cursor)
+        seen.extend(row.tweet_text for row in rows)
+        if cursor is None:
+            break
+    assert seen == ["t6", "t5", "t4", "t3", "t2", "t1", "t0"]
+
+
+def test_status_filter_and_invalid_cursor(db):
+    rows, cursor = list_post_history(db, 1, limit=10, status="failed")
+    assert [row.tweet_text for row in rows] == ["t5", "t3", "t1"]
+    assert cursor is None
+    with pytest.raises(ValueError):
+        list_post_history(db, 1, cursor="not-a-cursor")
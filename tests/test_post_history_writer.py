@@ -0,0 +1,32 @@
+from app.config import settings
+from app.services.post_history_writer import PostHistoryWriter
+
+
+def test_flush_inserts_in_batches_and_requeues_on_failure(monkeypatch):
+    monkeypatch.setattr(settings, "POST_HISTORY_BATCH_SIZE", 2)
+    writer = PostHistoryWriter()
+    writer._thread = object()  # バックグラウンドスレッドを起動しない
+    batches = []
+    monkeypatch.setattr(writer, "_insert", lambda rows: batches.append(rows))
+
+    for i in range(5):
+        writer.record(1, f"tweet {i}", "posted", tweet_id=str(i), history={"repository": "o/r"})
+    writer.record(None, "no user", "posted")
+
+    assert writer.flush() == 5
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert batches[0][0]["repository"] == "o/r"
+    assert batches[0][0]["posted_at"] is not None
+    # created_at は書き込み時刻ではなく記録時刻（投稿順）
+    assert [row["created_at"] for row in batches[0]] == sorted(row["created_at"] for row in batches[0])
+    assert batches[0][0]["created_at"] == batches[0][0]["updated_at"]
+    assert writer.get_statistics()["skipped_no_user"] == 1
+
+    def fail(rows):
+        raise RuntimeError("db down")
+
+    monkeypatch.setattr(writer, "_insert", fail)
+    writer.record(1, "retry me", "failed", error_message="boom")
+    assert writer.flush() == 0
+    assert writer.pending() == 1
+    assert writer.get_statistics()["flush_errors"] == 1
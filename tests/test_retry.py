@@ -0,0 +1,89 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+
+from app.utils import retry
+from app.utils.retry import RetryPolicy
+
+
+def _policy(monkeypatch, name, **kwargs):
+    monkeypatch.setattr(retry.time, "sleep", lambda seconds: None)
+    return RetryPolicy(name, base_delay=0.1, max_delay=2.0, **kwargs)
+
+
+def _responses(*status_codes):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        return SimpleNamespace(status_code=status_codes[len(calls) - 1], headers={})
+    return fn, calls
+
+
+def test_decorrelated_jitter_stays_within_bounds():
+    policy = RetryPolicy("test-jitter", base_delay=0.1, max_delay=2.0)
+    delay = policy.base_delay
+    for _ in range(200):
+        previous = delay
+        delay = policy._next_delay(previous)
+        assert 0.1 <= delay <= min(2.0, max(0.1, previous * 3))
+
+
+def test_non_idempotent_calls_only_retry_when_request_was_not_processed(monkeypatch):
+    policy = _policy(monkeypatch, "test-idempotency", max_attempts=3)
+
+    fn, calls = _responses(500, 201)
+    assert policy.call(fn, idempotent=False).status_code == 500
+    assert len(calls) == 1
+
+    fn, calls = _responses(503, 201)
+    assert policy.call(fn, idempotent=False).status_code == 201
+    assert len(calls) == 2
+
+    fn, calls = _responses(502, 502, 200)
+    assert policy.call(fn, idempotent=True).status_code == 200
+    assert len(calls) == 3
+
+    stats = policy.get_statistics()
+    assert stats["attempts"] == 6 and stats["retries"] == 3
+    assert stats["not_retryable"] == 1 and stats["completed"] == 2
+
+
+def test_connect_errors_are_retried_but_read_timeouts_only_when_idempotent(monkeypatch):
+    policy = _policy(monkeypatch, "test-errors", max_attempts=2)
+    errors = [httpx.ConnectError("refused"), httpx.ReadTimeout("slow")]
+
+    async def fn():
+        if errors:
+            raise errors.pop(0)
+        return SimpleNamespace(status_code=201, headers={})
+
+    async def no_sleep(seconds):
+        return None
+    monkeypatch.setattr(retry.asyncio, "sleep", no_sleep)
+
+    try:
+        asyncio.run(policy.call_async(fn, idempotent=False))
+    except httpx.ReadTimeout:
+        pass
+    else:
+        raise AssertionError("読み取りタイムアウトは非冪等な呼び出しでは再試行しない")
+    assert errors == []
+    assert policy.get_statistics()["errors"] == 1
+
+
+def test_budget_caps_retries_and_long_retry_after_is_not_waited(monkeypatch):
+    policy = _policy(monkeypatch, "test-budget", max_attempts=5)
+    policy.budget = retry.RetryBudget(ratio=0.0, min_per_second=0.0, capacity=2.0)
+
+    fn, calls = _responses(*[503] * 5)
+    assert policy.call(fn, idempotent=True).status_code == 503
+    assert len(calls) == 3
+    assert policy.get_statistics()["budget_exhausted"] == 1
+
+    policy.budget = retry.RetryBudget(ratio=0.0, min_per_second=0.0, capacity=2.0)
+    calls = []
+    response = SimpleNamespace(status_code=429, headers={"retry-after": "120"})
+    assert policy.call(lambda: calls.append(1) or response, idempotent=True) is response
+    assert len(calls) == 1 and policy.get_statistics()["retry_after_too_long"] == 1
@@ -0,0 +1,49 @@
+import asyncio
+
+from fastapi import HTTPException
+
+from app.services import scheduler_service, twitter_service
+from app.services.scheduler_service import POST_FAILED, POST_PENDING, POST_POSTED, ScheduledPostRunner
+
+
+def _run_batch(monkeypatch, posts, post_tweet, duplicates=()):
+    applied = []
+    monkeypatch.setattr(scheduler_service, "claim_due_posts", lambda limit: posts)
+    monkeypatch.setattr(scheduler_service, "load_access_tokens", lambda user_ids: {1: "token"})
+    monkeypatch.setattr(scheduler_service, "apply_results", applied.extend)
+
+    async def is_duplicate(tweet_text, window_hours=24, user_id=None):
+        return tweet_text in duplicates
+
+    async def is_near_duplicate(tweet_text, window_hours=24, user_id=None):
+        return False
+
+    monkeypatch.setattr(twitter_service, "is_duplicate_tweet_async", is_duplicate)
+    monkeypatch.setattr(twitter_service, "is_near_duplicate_tweet_async", is_near_duplicate)
+    monkeypatch.setattr(twitter_service, "post_tweet_v2_async", post_tweet)
+    asyncio.run(ScheduledPostRunner(batch_size=10, concurrency=2).run_once())
+    return {result["id"]: result for result in applied}
+
+
+def test_duplicates_and_permanent_errors_fail_without_retry(monkeypatch):
+    posted = []
+
+    async def post_tweet(access_token, tweet_text, **kwargs):
+        if tweet_text == "too long":
+            raise HTTPException(status_code=400, detail="文字数上限超過")
+        if tweet_text == "server error":
+            raise HTTPException(status_code=503, detail="一時的なエラー")
+        posted.append(tweet_text)
+        return {"data": {"id": "100"}}
+
+    posts = [{"id": i, "user_id": 1, "tweet_text": text, "retry_count": 0}
+             for i, text in enumerate(["ok", "already posted", "too long", "server error"])]
+    results = _run_batch(monkeypatch, posts, post_tweet, duplicates={"already posted"})
+
+    assert posted == ["ok"]
+    assert results[0]["status"] == POST_POSTED
+    # 重複は投稿せず、4xx は再予約しない
+    assert results[1]["status"] == POST_FAILED and "重複" in results[1]["error_message"]
+    assert results[2]["status"] == POST_FAILED
+    # 5xx はバックオフで再予約
+    assert results[3]["status"] == POST_PENDING and results[3]["retry_count"] == 1
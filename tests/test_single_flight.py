@@ -0,0 +1,81 @@
+import asyncio
+from app.utils import single_flight
+from app.utils.single_flight import SingleFlight
+
+
+class DummyRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def exists(self, key):
+        return int(key in self.data)
+
+    async def eval(self, script, numkeys, key, token):
+        if self.data.get(key) == token:
+            del self.data[key]
+            return 1
+        return 0
+
+
+class DummyAsyncStore:
+    def __init__(self):
+        self.client = DummyRedis()
+        self.counters = {}
+
+    async def incr_counter(self, key, field, amount=1):
+        self.counters[field] = self.counters.get(field, 0) + amount
+
+
+def test_concurrent_calls_share_one_upstream_call(monkeypatch):
+    store = DummyAsyncStore()
+    monkeypatch.setattr(single_flight, "async_cache_store", store)
+    flight = SingleFlight("test", lock_ttl=5)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def lookup():
+        return None
+
+    async def run():
+        return await asyncio.gather(*(flight.do("user/repo", fetch, lookup) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["result"] * 5
+    assert len(calls) == 1
+    assert store.counters == {"test:leader": 1, "test:local_coalesced": 4}
+    # リーダー終了後はロックが解放されている
+    assert store.client.data == {}
+
+
+def test_follower_uses_leader_result_from_cache(monkeypatch):
+    store = DummyAsyncStore()
+    monkeypatch.setattr(single_flight, "async_cache_store", store)
+    monkeypatch.setattr(single_flight.settings, "SINGLE_FLIGHT_POLL_INTERVAL", 0.01)
+    flight = SingleFlight("test", lock_ttl=5)
+    cache = {}
+
+    async def fetch():
+        raise AssertionError("フォロワーは上流を呼ばない")
+
+    async def lookup():
+        return cache.get("user/repo")
+
+    async def run():
+        # 別ワーカーのリーダーがロックを保持している状態
+        store.client.data[flight._lock_key("user/repo")] = "other-worker"
+        follower = asyncio.create_task(flight.do("user/repo", fetch, lookup))
+        await asyncio.sleep(0.03)
+        cache["user/repo"] = "leader result"
+        return await follower
+
+    assert asyncio.run(run()) == "leader result"
+    assert store.counters == {"test:remote_coalesced": 1}
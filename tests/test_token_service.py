@@ -0,0 +1,92 @@
+import base64
+
+import pytest
+from cryptography.fernet import Fernet
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Base, OAuthToken, User
+from app.services import token_service
+from app.services.token_service import TokenService, reencrypt_oauth_tokens
+
+OLD_KEY = "old-encryption-key-for-tests-0001"
+NEW_KEY = "new-encryption-key-for-tests-0002"
+
+
+def _legacy_encrypt(secret_key: str, token: str) -> str:
+    """キー入れ替え前の形式（Fernetトークンをさらにbase64化）"""
+    encrypted = Fernet(token_service._derive_key(secret_key)).encrypt(token.encode())
+    return base64.urlsafe_b64encode(encrypted).decode()
+
+
+def test_key_is_derived_once_per_process(monkeypatch):
+    monkeypatch.setattr(settings, "ENCRYPTION_KEY", "derive-once-key-for-tests-000003")
+    monkeypatch.setattr(settings, "ENCRYPTION_OLD_KEYS", "")
+    misses = token_service._derive_key.cache_info().misses
+    services = [TokenService() for _ in range(5)]
+    assert token_service._derive_key.cache_info().misses == misses + 1
+    assert services[0].decrypt_token(services[4].encrypt_token("secret")) == "secret"
+
+
+def test_rotated_keys_still_decrypt_old_and_legacy_ciphertexts(monkeypatch):
+    monkeypatch.setattr(settings, "ENCRYPTION_KEY", OLD_KEY)
+    monkeypatch.setattr(settings, "ENCRYPTION_OLD_KEYS", "")
+    old_ciphertext = TokenService().encrypt_token("access-1")
+    legacy_ciphertext = _legacy_encrypt(OLD_KEY, "access-2")
+
+    monkeypatch.setattr(settings, "ENCRYPTION_KEY", NEW_KEY)
+    monkeypatch.setattr(settings, "ENCRYPTION_OLD_KEYS", OLD_KEY)
+    service = TokenService()
+    assert service.decrypt_token(old_ciphertext) == "access-1"
+    assert service.decrypt_token(legacy_ciphertext) == "access-2"
+
+    new_ciphertext = service.encrypt_token("access-3")
+    assert new_ciphertext.startswith(service.keyring.prefix) and not service.needs_reencryption(new_ciphertext)
+    assert service.needs_reencryption(old_ciphertext) and service.needs_reencryption(legacy_ciphertext)
+
+    # 以前のキーを外すと古い暗号文は読めない
+    monkeypatch.setattr(settings, "ENCRYPTION_OLD_KEYS", "")
+    assert TokenService().decrypt_token(old_ciphertext) is None
+
+
+def test_reencryption_job_rewrites_rows_in_batches(monkeypatch):
+    monkeypatch.setattr(settings, "ENCRYPTION_KEY", OLD_KEY)
+    monkeypatch.setattr(settings, "ENCRYPTION_OLD_KEYS", "")
+    old_service = TokenService()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        for i in range(5):
+            user = User(email=f"u{i}@example.com", username=f"u{i}")
+            session.add(user)
+            session.flush()
+            access = _legacy_encrypt(OLD_KEY, f"a{i}") if i % 2 else old_service.encrypt_token(f"a{i}")
+            session.add(OAuthToken(user_id=user.id, provider="twitter", access_token=access,
+                                   refresh_token=old_service.encrypt_token(f"r{i}") if i < 4 else None))
+        session.commit()
+
+    monkeypatch.setattr(settings, "ENCRYPTION_KEY", NEW_KEY)
+    monkeypatch.setattr(settings, "ENCRYPTION_OLD_KEYS", OLD_KEY)
+    stats = reencrypt_oauth_tokens(engine, batch_size=2)
+    assert stats == {"scanned": 5, "reencrypted": 5, "skipped": 0, "failed": 0}
+    # 2回目は対象の行がない
+    assert reencrypt_oauth_tokens(engine, batch_size=2)["scanned"] == 0
+
+    monkeypatch.setattr(settings, "ENCRYPTION_OLD_KEYS", "")
+    service = TokenService()
+    with Session(engine) as session:
+        rows = session.query(OAuthToken).order_by(OAuthToken.id).all()
+        assert [service.decrypt_token(row.access_token) for row in rows] == [f"a{i}" for i in range(5)]
+        assert [service.decrypt_token(row.refresh_token) for row in rows] == ["r0", "r1", "r2", "r3", None]
+
+
+def test_old_key_set_only_in_settings_decrypts_v1_tokens(monkeypatch):
+    # .env からのみ読み込まれた設定（環境変数にはない）でも入れ替え前のトークンを読める
+    monkeypatch.delenv("ENCRYPTION_KEY", raising=False)
+    monkeypatch.delenv("ENCRYPTION_OLD_KEYS", raising=False)
+    legacy_ciphertext = _legacy_encrypt(OLD_KEY, "access-v1")
+    monkeypatch.setattr(settings, "ENCRYPTION_KEY", NEW_KEY)
+    monkeypatch.setattr(settings, "ENCRYPTION_OLD_KEYS", OLD_KEY)
+    assert TokenService().decrypt_token(legacy_ciphertext) == "access-v1"
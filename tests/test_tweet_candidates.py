@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+from app.config import settings
+from app.services import openai_service
+from app.services.tweet_ranking import rank_candidates
+from app.utils.tweet_length import weighted_length
+
+
+class DummyStore:
+    def __init__(self):
+        self.data = {}
+
+    def get_json(self, key):
+        return self.data.get(key)
+
+    def set_json(self, key, value, ttl):
+        self.data[key] = value
+        return True
+
+
+class DummyOpenAI:
+    def __init__(self, contents):
+        self.contents = contents
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        choices = [SimpleNamespace(message=SimpleNamespace(content=text)) for text in self.contents[:kwargs.get("n", 1)]]
+        return SimpleNamespace(choices=choices, usage=None)
+
+
+def test_candidates_use_one_request_and_one_cache_key(monkeypatch):
+    store = DummyStore()
+    client = DummyOpenAI(["案A #dev", "案B #dev", "案A #dev", "案C"])
+    monkeypatch.setattr(openai_service, "cache_store", store)
+    monkeypatch.setattr(openai_service.http_clients, "get_sync_openai", lambda api_key: client)
+    monkeypatch.setattr(openai_service, "_record_cache_lookups", lambda lookups: None)
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test")
+
+    assert openai_service.generate_tweet_candidates("feat: x", "o/r", "ja", n=4) == ["案A #dev", "案B #dev", "案C"]
+    assert len(client.calls) == 1 and client.calls[0]["n"] == 4
+    assert list(store.data) == [openai_service._create_candidates_cache_key("feat: x", "o/r", "ja")]
+
+    # 同じ候補数以下はキャッシュから返す（重複除去で件数が減っていても再生成しない）
+    assert openai_service.generate_tweet_candidates("feat: x", "o/r", "ja", n=2) == ["案A #dev", "案B #dev"]
+    assert openai_service.generate_tweet_candidates("feat: x", "o/r", "ja", n=4) == ["案A #dev", "案B #dev", "案C"]
+    assert len(client.calls) == 1
+
+
+def test_ranking_prefers_fitting_length_hashtags_and_fresh_content():
+    recent = ["予約投稿の一括キャンセル機能を追加しました。これで管理が楽になります #個人開発"]
+    fresh = "スケジューラを刷新して投稿の遅延をほぼゼロにしました。地味だけど効く改善です #個人開発 #Python"
+    repeated = "予約投稿の一括キャンセル機能を追加しました。これで管理が楽になります #個人開発"
+    too_long = "長" * 150 + " #dev"
+    no_tags = "スケジューラを刷新して投稿の遅延をほぼゼロにしました。地味だけど効く改善です"
+
+    ranked = rank_candidates([too_long, repeated, no_tags, fresh], recent)
+    assert [item["tweet"] for item in ranked] == [fresh, no_tags, repeated, too_long]
+    assert ranked[-1]["weighted_length"] > 280
+    assert ranked[2]["overlap"] == 1.0
+
+
+def test_weighted_length_counts_cjk_double_and_urls_as_23():
+    assert weighted_length("hello") == 5
+    assert weighted_length("日本語") == 6
+    assert weighted_length("see https://example.com/a/very/long/path/that/is/shortened") == 4 + 23
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from app.config import settings
+from app.schemas.twitter import PostTweetRequest
+from app.services import openai_service, twitter_service
+from app.utils.tweet_length import trim_to_limit, truncate_to_limit, weighted_length
+
+
+def test_emoji_sequences_and_urls_have_fixed_weights():
+    assert weighted_length("👍🏽") == 2
+    assert weighted_length("👨‍👩‍👧") == 2
+    assert weighted_length("🇯🇵") == 2
+    assert weighted_length("詳細 https://example.com/changelog/2024") == 4 + 1 + 23
+    # 140字の日本語は280ちょうど、141字目で超過
+    assert weighted_length("あ" * 140) == 280 and weighted_length("あ" * 141) == 282
+
+
+def test_trim_drops_trailing_hashtags_before_touching_the_body():
+    body = "あ" * 134
+    text = body + " #個人開発 #Python #FastAPI"
+    assert trim_to_limit(text) == body + " #個人開発"
+
+
+def test_trim_cuts_at_sentence_boundary_and_keeps_first_hashtag():
+    text = "スケジューラを刷新しました。" * 12 + " #個人開発 #Python"
+    trimmed = trim_to_limit(text)
+    assert weighted_length(trimmed) <= 280
+    assert trimmed.endswith("しました。… #個人開発 #Python")
+
+
+def test_trim_gives_up_without_boundary_and_truncate_never_splits_urls():
+    text = "あ" * 200
+    assert trim_to_limit(text) is None
+    truncated = truncate_to_limit("い" * 130 + " https://example.com/" + "x" * 50)
+    assert truncated == "い" * 130 + "…"
+
+
+def test_over_length_draft_is_regenerated_once(monkeypatch):
+    drafts = ["あ" * 200, "短い案 #dev"]
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=drafts[len(calls) - 1]))], usage=None)
+
+    store = SimpleNamespace(get_json=lambda key: None, set_json=lambda key, value, ttl: True)
+    monkeypatch.setattr(openai_service, "cache_store", store)
+    monkeypatch.setattr(openai_service, "_record_cache_lookups", lambda lookups: None)
+    monkeypatch.setattr(openai_service, "_record_usage", lambda *args: None)
+    monkeypatch.setattr(openai_service.http_clients, "get_sync_openai",
+                        lambda api_key: SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test")
+
+    assert openai_service.generate_tweet_with_openai("feat: x", "o/r") == "短い案 #dev"
+    assert len(calls) == 2
+
+
+def test_over_length_tweet_is_rejected_before_posting():
+    with pytest.raises(ValidationError):
+        PostTweetRequest(tweet_text="あ" * 141)
+    with pytest.raises(HTTPException) as exc_info:
+        twitter_service._post_tweet_v2("token", "あ" * 141, None)
+    assert exc_info.value.status_code == 400
@@ -0,0 +1,116 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import twitter_rate_limit, twitter_service
+from app.services.twitter_rate_limit import TwitterRateLimitExceeded
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def _headers(remaining, reset, limit=100):
+    return {"x-rate-limit-limit": str(limit), "x-rate-limit-remaining": str(remaining), "x-rate-limit-reset": str(reset)}
+
+
+def test_budget_is_reserved_per_token_and_never_rolled_back(monkeypatch):
+    monkeypatch.setattr(twitter_rate_limit, "cache_store", SimpleNamespace(client=fakeredis.FakeRedis(decode_responses=True)))
+    reset = int(time.time()) + 600
+
+    assert twitter_rate_limit.reserve("token-a") is None  # ウィンドウ不明は通す
+    twitter_rate_limit.record_response("token-a", _headers(2, reset))
+    assert twitter_rate_limit.reserve("token-a") is None
+    # 予約後に届いた同じウィンドウの古いヘッダーで残り回数を戻さない
+    twitter_rate_limit.record_response("token-a", _headers(2, reset))
+    assert twitter_rate_limit.reserve("token-a") is None
+    assert twitter_rate_limit.reserve("token-a") == reset
+    assert twitter_rate_limit.reserve("token-b") is None
+
+    # 新しいウィンドウのヘッダーで予算が戻る
+    twitter_rate_limit.record_response("token-a", _headers(99, reset + 900))
+    assert twitter_rate_limit.reserve("token-a") is None
+
+
+def test_first_reservation_after_reset_seeds_the_new_window(monkeypatch):
+    redis = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(twitter_rate_limit, "cache_store", SimpleNamespace(client=redis))
+    monkeypatch.setattr(twitter_rate_limit.settings, "TWITTER_RATE_LIMIT_WINDOW", 900)
+    now = int(time.time())
+    twitter_rate_limit.record_response("token-e", _headers(0, now - 1, limit=2))
+
+    # リセット後の最初の予約で上限 - 1 から新しいウィンドウを始め、上限を超えて通さない
+    assert twitter_rate_limit.reserve("token-e") is None
+    assert twitter_rate_limit.reserve("token-e") is None
+    estimated_reset = twitter_rate_limit.reserve("token-e")
+    assert estimated_reset is not None and estimated_reset >= now + 900
+
+    # 推定前のウィンドウのヘッダーは無視し、新しいウィンドウのヘッダーで置き換える
+    twitter_rate_limit.record_response("token-e", _headers(1, now - 1, limit=2))
+    assert twitter_rate_limit.reserve("token-e") == estimated_reset
+    twitter_rate_limit.record_response("token-e", _headers(1, now + 300, limit=2))
+    assert redis.hget(twitter_rate_limit._key("token-e"), "reset") == str(now + 300)
+    assert twitter_rate_limit.reserve("token-e") == now + 300
+
+
+class DummyAsyncClient:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.posted_at = []
+
+    async def post(self, url, headers=None, json=None):
+        self.posted_at.append(time.time())
+        status, response_headers = self.responses.pop(0)
+        return SimpleNamespace(status_code=status, headers=response_headers, text="",
+                               json=lambda: {"data": {"id": "1"}})
+
+
+def test_async_post_waits_until_reset_epoch_instead_of_sleeping_the_epoch(monkeypatch):
+    monkeypatch.setattr(twitter_rate_limit, "async_cache_store", SimpleNamespace(client=fakeredis.FakeAsyncRedis(decode_responses=True)))
+    monkeypatch.setattr(twitter_rate_limit.settings, "TWITTER_RATE_LIMIT_RESET_MARGIN", 0.0)
+    reset = int(time.time()) + 2
+    client = DummyAsyncClient([(429, _headers(0, reset)), (201, _headers(99, reset + 900))])
+    monkeypatch.setattr(twitter_service.http_clients, "get_async_client", lambda name: client)
+
+    async def noop(*args, **kwargs):
+        return None
+    monkeypatch.setattr(twitter_service, "_record_post_async", noop)
+
+    # 投稿枠のリセット待ちはサーキットブレーカーの外で行う
+    in_breaker = []
+
+    async def call_async(fn):
+        in_breaker.append(True)
+        try:
+            return await fn()
+        finally:
+            in_breaker.pop()
+    monkeypatch.setattr(twitter_service.twitter_circuit_breaker, "call_async", call_async)
+
+    slept = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(seconds):
+        assert not in_breaker
+        slept.append(seconds)
+        await real_sleep(seconds)
+    monkeypatch.setattr(twitter_service.asyncio, "sleep", fake_sleep)
+
+    result = asyncio.run(twitter_service._post_tweet_v2_async("token-c", "hello", 3, None, max_rate_limit_wait=60))
+    assert result == {"data": {"id": "1"}}
+    assert len(slept) == 1 and 0 < slept[0] <= 2.0
+    assert client.posted_at[1] >= reset
+
+    # 待機上限を超える場合は投稿せずにリセット時刻付きで返す
+    async def exhausted():
+        await twitter_rate_limit.record_response_async("token-d", _headers(0, reset + 900))
+        await twitter_service._post_tweet_v2_async("token-d", "hello", 3, None, max_rate_limit_wait=0)
+    with pytest.raises(TwitterRateLimitExceeded) as exc_info:
+        asyncio.run(exhausted())
+    assert exc_info.value.reset_at == reset + 900
+    assert exc_info.value.headers["Retry-After"]
+
+
+def test_async_post_rejects_non_positive_retry_count():
+    with pytest.raises(ValueError):
+        asyncio.run(twitter_service._post_tweet_v2_async("token-f", "hello", 0, None, max_rate_limit_wait=60))
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from app import worker as worker_module
+from app.services.job_queue import (
+    AUTO_POST_GROUP, AUTO_POST_STREAM, JOB_FAILED, JOB_QUEUED, JOB_SUCCEEDED, enqueue_auto_post, get_job_status
+)
+from app.services.redis_pool import redis_pools
+from app.utils.error_handler import TwitterAPIError
+
+fakeredis = pytest.importorskip("fakeredis")
+
+RESULT = {"commit_message": "fix", "tweet_text": "hello", "tweet_response": {"data": {"id": "123"}}}
+
+
+def _setup(monkeypatch, outcomes):
+    """outcomes: execute_auto_post_async が順に返す結果（例外なら送出）"""
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    async_client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    monkeypatch.setattr(redis_pools, "get_client", lambda db=0, decode_responses=True: client)
+    monkeypatch.setattr(redis_pools, "get_async_client", lambda db=0, decode_responses=True: async_client)
+
+    posts = []
+
+    async def get_access_token(user_id):
+        return "token"
+
+    async def execute_auto_post(access_token, user_id, repository, language, fresh=False, context=None):
+        posts.append(repository)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(worker_module, "get_access_token_async", get_access_token)
+    monkeypatch.setattr(worker_module, "execute_auto_post_async", execute_auto_post)
+    return client, posts
+
+
+def _deliver(worker):
+    """コンシューマーグループ経由で1件受け取る"""
+    async def read():
+        await worker.store.ensure_group()
+        (message,) = await worker.store.read(1)
+        return message
+    return asyncio.run(read())
+
+
+def test_reclaimed_job_is_not_posted_twice(monkeypatch):
+    client, posts = _setup(monkeypatch, [RESULT])
+    job_id = enqueue_auto_post(1, "user/repo")
+    (message_id, fields), = client.xrange(AUTO_POST_STREAM)
+    worker = worker_module.AutoPostWorker(concurrency=1)
+
+    finish = worker.store.finish
+    crashed = []
+
+    async def finish_once_crashing(*args, **kwargs):
+        # 1回目は投稿後・ACK前にワーカーが停止した扱い
+        if not crashed:
+            crashed.append(True)
+            raise ConnectionError("worker stopped")
+        await finish(*args, **kwargs)
+    monkeypatch.setattr(worker.store, "finish", finish_once_crashing)
+
+    async def run():
+        await worker._process(message_id, fields)
+        # 別のワーカーが引き取る
+        await worker._process(message_id, fields)
+
+    asyncio.run(run())
+    assert posts == ["user/repo"]
+    status = get_job_status(job_id)
+    assert status["status"] == JOB_SUCCEEDED and status["tweet_id"] == "123"
+    assert status["result"]["tweet_response"] == {"data": {"id": "123"}}
+
+
+def test_transient_failures_are_retried_and_duplicates_are_not(monkeypatch):
+    transient = TwitterAPIError("投稿失敗: 一時的なエラー", upstream_status=503)
+    client, posts = _setup(monkeypatch, [transient, RESULT])
+    job_id = enqueue_auto_post(1, "user/repo")
+    worker = worker_module.AutoPostWorker(concurrency=1)
+    message_id, fields = _deliver(worker)
+
+    # 一時的な失敗はACKせずに残す（引き取りで再配信される）
+    asyncio.run(worker._process(message_id, fields))
+    assert get_job_status(job_id)["status"] == JOB_QUEUED
+    assert client.xpending(AUTO_POST_STREAM, AUTO_POST_GROUP)["pending"] == 1
+
+    asyncio.run(worker._process(message_id, fields))
+    assert posts == ["user/repo", "user/repo"]
+    assert get_job_status(job_id)["status"] == JOB_SUCCEEDED
+    assert client.xpending(AUTO_POST_STREAM, AUTO_POST_GROUP)["pending"] == 0
+
+    # 重複は再試行しても変わらないため1回で失敗として確定
+    client, posts = _setup(monkeypatch, [TwitterAPIError("重複する内容のツイートが検出されました", status_code=409)])
+    job_id = enqueue_auto_post(1, "user/repo")
+    message_id, fields = _deliver(worker)
+    asyncio.run(worker._process(message_id, fields))
+    assert get_job_status(job_id)["status"] == JOB_FAILED
+    assert client.xpending(AUTO_POST_STREAM, AUTO_POST_GROUP)["pending"] == 0